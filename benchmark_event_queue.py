@@ -0,0 +1,63 @@
+import random
+import time
+from sec11b.EventQueue import BinaryHeapEventQueue, CalendarEventQueue
+from sec11b.NetworkEventScheduler import NetworkEventScheduler
+from sec11b.Node import Node
+from sec11b.Switch import Switch
+from sec11b.Router import Router
+from sec11b.Link import Link
+
+# 二分ヒープとカレンダーキューを同じシナリオで比較するベンチマーク
+
+def hold_model(event_queue, queue_size, operations):
+    # ホールドモデル：キューサイズを一定に保ちながらpopとpushを繰り返す
+    rng = random.Random(1)
+    event_id = 0
+    for _ in range(queue_size):
+        event_queue.push((rng.expovariate(1.0), event_id, None, ()))
+        event_id += 1
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        event_time, _, _, _ = event_queue.pop()
+        event_queue.push((event_time + rng.expovariate(1.0), event_id, None, ()))
+        event_id += 1
+    return time.perf_counter() - start
+
+def network_scenario(event_queue, num_pairs, duration):
+    # ルータ2台の間に複数のUDPフローを流すシナリオ
+    random.seed(1)
+    network_event_scheduler = NetworkEventScheduler(event_queue=event_queue)
+    router1 = Router(node_id="r1", ip_addresses=["192.168.1.254/24", "10.1.1.1/24"], network_event_scheduler=network_event_scheduler)
+    router2 = Router(node_id="r2", ip_addresses=["192.168.2.254/24", "10.1.1.2/24"], network_event_scheduler=network_event_scheduler)
+    switch1 = Switch(node_id="s1", ip_address="192.168.1.11/24", network_event_scheduler=network_event_scheduler)
+    switch2 = Switch(node_id="s2", ip_address="192.168.2.11/24", network_event_scheduler=network_event_scheduler)
+    Link(switch1, router1, bandwidth=1000000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+    Link(router1, router2, bandwidth=1000000000, delay=0.01, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+    Link(router2, switch2, bandwidth=1000000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+
+    for i in range(num_pairs):
+        source = Node(node_id=f"a{i}", ip_address=f"192.168.1.{i + 1}/24", network_event_scheduler=network_event_scheduler)
+        destination = Node(node_id=f"b{i}", ip_address=f"192.168.2.{i + 1}/24", network_event_scheduler=network_event_scheduler)
+        Link(source, switch1, bandwidth=100000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+        Link(destination, switch2, bandwidth=100000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+        source.set_udp_traffic(destination.ip_address, bitrate=1000000, start_time=0.0, duration=duration, header_size=28, payload_size=1000)
+
+    start = time.perf_counter()
+    network_event_scheduler.run_until(duration)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    event_queues = {
+        "BinaryHeapEventQueue": BinaryHeapEventQueue,
+        "CalendarEventQueue": CalendarEventQueue,
+    }
+
+    for queue_size in [1000, 100000, 1000000]:
+        for name, event_queue_class in event_queues.items():
+            elapsed = hold_model(event_queue_class(), queue_size, 200000)
+            print(f"Hold model (queue size {queue_size}): {name}: {elapsed:.3f} s")
+
+    for name, event_queue_class in event_queues.items():
+        elapsed = network_scenario(event_queue_class(), num_pairs=50, duration=2.0)
+        print(f"Network scenario: {name}: {elapsed:.3f} s")
@@ -0,0 +1,38 @@
+import tracemalloc
+from sec11b.NetworkEventScheduler import NetworkEventScheduler
+from sec11b.Packet import TCPPacket, UDPPacket, ARPPacket, BPDU, HelloPacket, LSAPacket
+
+# パケット1つあたりのメモリ使用量を計測するベンチマーク
+
+def create_packets(network_event_scheduler):
+    # パケットの種類ごとに、パケットを1つ生成する関数
+    ip_kwargs = dict(
+        source_mac="00:00:00:00:00:01", destination_mac="00:00:00:00:00:02",
+        source_ip="192.168.1.1/24", destination_ip="192.168.2.1/24", ttl=64,
+        fragment_flags={"more_fragments": False}, fragment_offset=0,
+        header_size=28, payload_size=1000, network_event_scheduler=network_event_scheduler
+    )
+    return {
+        "UDPPacket": lambda: UDPPacket(source_port=5000, destination_port=6000, **ip_kwargs),
+        "TCPPacket": lambda: TCPPacket(source_port=5000, destination_port=80, sequence_number=0, acknowledgment_number=0, flags="ACK", **ip_kwargs),
+        "ARPPacket": lambda: ARPPacket("00:00:00:00:00:01", "FF:FF:FF:FF:FF:FF", "192.168.1.1/24", "192.168.1.254/24", "request", network_event_scheduler),
+        "BPDU": lambda: BPDU("00:00:00:00:00:01", "01:80:C2:00:00:00", "s1", "s1", 0, network_event_scheduler),
+        "HelloPacket": lambda: HelloPacket("00:00:00:00:00:01", "192.168.1.254/24", "255.255.255.0", "r1", 10, [], network_event_scheduler),
+        "LSAPacket": lambda: LSAPacket("00:00:00:00:00:01", "192.168.1.254/24", "r1", 1, {}, network_event_scheduler),
+    }
+
+def measure(create_packet, num_packets):
+    # num_packets個のパケットを保持したときに増えたメモリをパケット数で割る（共有される引数の値は含まない）
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    packets = [create_packet() for _ in range(num_packets)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # パケットを保持するリスト自体の分を除く
+    return (end - start - packets.__sizeof__()) / num_packets
+
+if __name__ == '__main__':
+    network_event_scheduler = NetworkEventScheduler()
+    for name, create_packet in create_packets(network_event_scheduler).items():
+        bytes_per_packet = measure(create_packet, 100000)
+        print(f"{name}: {bytes_per_packet:.0f} bytes/packet")
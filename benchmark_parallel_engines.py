@@ -0,0 +1,90 @@
+import math
+import random
+import sys
+import time
+from sec11b.NetworkEventScheduler import NetworkEventScheduler
+from sec11b.ConservativeParallelEngine import ConservativeParallelEngine
+from sec11b.TimeWarpEngine import TimeWarpEngine
+from sec11b.Node import Node
+from sec11b.Switch import Switch
+from sec11b.Router import Router
+from sec11b.Link import Link
+
+# 逐次実行と並列実行エンジン（保守的方式・Time Warp方式）を同じシナリオで比較し、集計結果が一致することを確認するベンチマーク
+
+# ルータ3台をr1とr2の間で2つのパーティションに分ける
+PARTITIONS = {"r1": 0, "s1": 0, "h1": 0, "h2": 0, "r2": 1, "r3": 1, "s3": 1, "h3": 1, "h4": 1}
+
+def build_scenario(network_event_scheduler):
+    # ルータ3台を直列につなぎ、両端のネットワークの間に双方向のUDPフローを流すシナリオ
+    router1 = Router(node_id="r1", ip_addresses=["192.168.1.254/24", "10.1.1.1/24"], network_event_scheduler=network_event_scheduler)
+    router2 = Router(node_id="r2", ip_addresses=["10.1.1.2/24", "10.2.2.1/24"], network_event_scheduler=network_event_scheduler)
+    router3 = Router(node_id="r3", ip_addresses=["10.2.2.2/24", "192.168.3.254/24"], network_event_scheduler=network_event_scheduler)
+    switch1 = Switch(node_id="s1", ip_address="192.168.1.11/24", network_event_scheduler=network_event_scheduler)
+    switch3 = Switch(node_id="s3", ip_address="192.168.3.11/24", network_event_scheduler=network_event_scheduler)
+    Link(router1, router2, bandwidth=10000000, delay=0.005, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+    Link(router2, router3, bandwidth=10000000, delay=0.005, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+    Link(switch1, router1, bandwidth=100000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+    Link(switch3, router3, bandwidth=100000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+
+    hosts = {}
+    for node_id, ip_address, switch in [("h1", "192.168.1.1/24", switch1), ("h2", "192.168.1.2/24", switch1), ("h3", "192.168.3.1/24", switch3), ("h4", "192.168.3.2/24", switch3)]:
+        hosts[node_id] = Node(node_id=node_id, ip_address=ip_address, network_event_scheduler=network_event_scheduler)
+        Link(hosts[node_id], switch, bandwidth=10000000, delay=0.001, loss_rate=0.0, network_event_scheduler=network_event_scheduler)
+
+    for source, destination, bitrate in [("h1", "h3", 2000000), ("h2", "h4", 3000000), ("h4", "h1", 4000000), ("h3", "h2", 2500000)]:
+        hosts[source].set_udp_traffic(hosts[destination].ip_address, bitrate=bitrate, start_time=0.5, duration=2.0, header_size=28, payload_size=1000)
+
+def run_scenario(parallel_engine, time_resolution, end_time):
+    random.seed(1)
+    network_event_scheduler = NetworkEventScheduler(log_enabled=True, parallel_engine=parallel_engine, time_resolution=time_resolution)
+    build_scenario(network_event_scheduler)
+
+    start = time.perf_counter()
+    # 途中で一度止めて、実行の再開（並列実行ではワーカーへのイベントの引き継ぎ）も含めて比較する
+    network_event_scheduler.run_until(end_time / 2)
+    network_event_scheduler.run_until(end_time)
+    elapsed = time.perf_counter() - start
+    if parallel_engine is not None:
+        parallel_engine.close()
+    return elapsed, network_event_scheduler.summarize_packet_logs(network_event_scheduler.packet_logs)
+
+def summaries_match(summary, expected):
+    # パケットログの並び順が異なるため、遅延の合計などの浮動小数点の値は丸め誤差を許して比較する
+    if summary.keys() != expected.keys():
+        return False
+    for packet_type, groups in expected.items():
+        if summary[packet_type].keys() != groups.keys():
+            return False
+        for key, values in groups.items():
+            for name, expected_value in values.items():
+                value = summary[packet_type][key][name]
+                if name == "delay_sketch":
+                    if (value.counts, value.zero_count, value.count) != (expected_value.counts, expected_value.zero_count, expected_value.count):
+                        return False
+                elif isinstance(expected_value, float):
+                    if not math.isclose(value, expected_value, rel_tol=1e-9):
+                        return False
+                elif value != expected_value:
+                    return False
+    return True
+
+if __name__ == '__main__':
+    parallel_engines = {
+        "ConservativeParallelEngine": lambda: ConservativeParallelEngine(partitions=PARTITIONS),
+        "TimeWarpEngine": lambda: TimeWarpEngine(partitions=PARTITIONS, checkpoint_interval=50, events_per_round=300, optimism_window=0.005),
+    }
+
+    mismatches = []
+    for time_resolution in [None, 1e-9]:
+        elapsed, expected = run_scenario(None, time_resolution, 3.0)
+        print(f"Sequential (time_resolution={time_resolution}): {elapsed:.3f} s")
+        for name, create_engine in parallel_engines.items():
+            elapsed, summary = run_scenario(create_engine(), time_resolution, 3.0)
+            match = summaries_match(summary, expected)
+            print(f"{name} (time_resolution={time_resolution}): {elapsed:.3f} s, summary {'matches' if match else 'DIFFERS from'} sequential")
+            if not match:
+                mismatches.append((name, time_resolution))
+
+    if mismatches:
+        sys.exit(f"Summaries differ from the sequential run: {mismatches}")
@@ -0,0 +1,86 @@
+import gc
+import os
+import pickle
+import random
+import sys
+import traceback
+from sec11b.PacketLogSink import PacketLogSink
+
+def fork_branches(network_event_scheduler, branch_time, perturbations, end_time, collect=None, max_processes=None):
+    """
+    branch_time（秒）までシミュレーションを実行してから、perturbationsの関数ごとにos.forkで子プロセスを生成する（what-if分析）。
+    子プロセスはSTP/OSPF/DHCPなどが収束した状態をコピーオンライトで共有し、perturbation(network_event_scheduler)で
+    リンク障害（link.set_active(False)）やloss_rateの変更、トラフィックの追加などの摂動を加えてからend_time（秒）まで実行する。
+    各子プロセスのcollect(network_event_scheduler)の結果（既定ではpacket_logs）をperturbationsと同じ順のリストで返す。
+    親プロセスのシミュレーションはbranch_timeの状態のまま残る。
+    """
+    if network_event_scheduler.parallel_engine is not None:
+        raise ValueError("並列実行エンジンを使用している場合は分岐できません。")
+    if isinstance(network_event_scheduler.packet_logs, PacketLogSink):
+        raise ValueError("パケットログをファイルに出力している場合は分岐できません。")
+    if collect is None:
+        collect = lambda branch_scheduler: branch_scheduler.packet_logs
+    max_processes = max_processes or os.cpu_count()
+
+    network_event_scheduler.run_until(branch_time)
+
+    # 分岐前のオブジェクトをGCの追跡対象から外し、子プロセスでのコピーオンライトによる複製を減らす
+    gc.freeze()
+    try:
+        results = [None] * len(perturbations)
+        running = []  # (分岐番号, プロセスID, 読み出し用パイプ)
+        for index, perturbation in enumerate(perturbations):
+            if len(running) >= max_processes:
+                branch = running.pop(0)
+                results[branch[0]] = receive_branch_result(*branch)
+            running.append(start_branch(network_event_scheduler, index, perturbation, end_time, collect))
+        for branch in running:
+            results[branch[0]] = receive_branch_result(*branch)
+    finally:
+        gc.unfreeze()
+    return results
+
+def start_branch(network_event_scheduler, index, perturbation, end_time, collect):
+    read_fd, write_fd = os.pipe()
+    random_state = random.getstate()
+    # 親のバッファに残った出力を子プロセスが重複して書き出さないように、フォークの前に書き出しておく
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        # 子プロセス：摂動を加えて実行し、結果をパイプで親に返す
+        exit_status = 1
+        try:
+            os.close(read_fd)
+            # randomモジュールはフォーク後に子プロセスで初期化し直されるので、分岐時点の状態に戻す
+            random.setstate(random_state)
+            try:
+                perturbation(network_event_scheduler)
+                network_event_scheduler.run_until(end_time)
+                data = pickle.dumps(("ok", collect(network_event_scheduler)), protocol=pickle.HIGHEST_PROTOCOL)
+                exit_status = 0
+            except BaseException:
+                data = pickle.dumps(("error", traceback.format_exc()))
+            with os.fdopen(write_fd, "wb") as pipe:
+                pipe.write(data)
+        finally:
+            # os._exitはバッファを書き出さないので、分岐中のprintの出力が失われないように先に書き出す
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(exit_status)
+
+    os.close(write_fd)
+    return index, pid, read_fd
+
+def receive_branch_result(index, pid, read_fd):
+    with os.fdopen(read_fd, "rb") as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    if not data:
+        raise RuntimeError(f"分岐 {index} の子プロセスが結果を返さずに終了しました。")
+    status, result = pickle.loads(data)
+    if status == "error":
+        raise RuntimeError(f"分岐 {index} の実行中にエラーが発生しました。\n{result}")
+    return result
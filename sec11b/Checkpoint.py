@@ -0,0 +1,31 @@
+import os
+import pickle
+import random
+
+def save_checkpoint(network_event_scheduler, path):
+    """
+    シミュレーションの状態（イベントキュー、リンクのキュー、ARP・ルーティング・転送テーブル、TCPの状態、乱数の状態など）をファイルに保存する。
+    スケジューラから辿れるオブジェクトを1つのpickleにまとめるため、Linkをキーとする辞書なども参照関係を保ったまま保存される。
+    書き込み途中でクラッシュしても前回のチェックポイントが壊れないよう、一時ファイルに書いてから置き換える。
+    """
+    if network_event_scheduler.parallel_engine is not None or network_event_scheduler.partition is not None:
+        raise ValueError("並列実行エンジンを使用している場合はチェックポイントを保存できません。")
+
+    state = {
+        "network_event_scheduler": network_event_scheduler,
+        "random_state": random.getstate()
+    }
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+
+def load_checkpoint(path):
+    """
+    save_checkpointで保存した状態を復元し、スケジューラを返す。
+    ノードはnetwork_event_scheduler.nodes[ノードID]、リンクはnetwork_event_scheduler.linksから取得できる。
+    """
+    with open(path, "rb") as file:
+        state = pickle.load(file)
+    random.setstate(state["random_state"])
+    return state["network_event_scheduler"]
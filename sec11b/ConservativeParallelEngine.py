@@ -0,0 +1,83 @@
+import math
+from collections import defaultdict
+from sec11b.Partition import PartitionWorker, PartitionedEngine, get_cut_links
+
+class ConservativePartitionWorker(PartitionWorker):
+    """ワーカープロセス内で1つのパーティションを担当し、ウィンドウ単位でイベントを実行する。"""
+    def __init__(self, network_event_scheduler, index, node_partitions):
+        super().__init__(network_event_scheduler, index, node_partitions)
+        self.outbox = defaultdict(list)  # 宛先パーティション -> 送出するパケットのリスト
+
+    def send(self, event_time, event_key, node, packet, link):
+        self.outbox[self.node_partitions[node.node_id]].append((event_time, event_key, node, packet, link))
+
+    def receive(self, data):
+        for event_time, event_key, node, packet, link in self.partition_objects.loads(data):
+            self.push_event(event_time, event_key, node.receive_packet, (packet, link))
+
+    def advance(self, window_end, end_time, inbox):
+        for data in inbox:
+            self.receive(data)
+
+        # ウィンドウの終端より前（かつend_time以下）のイベントを実行する
+        if self.network_event_scheduler.time_resolution is None:
+            window_last = math.nextafter(window_end, -math.inf)
+        else:
+            window_last = window_end - 1
+        self.run_until_tick(min(window_last, end_time))
+
+        outgoing = {}
+        for destination, messages in self.outbox.items():
+            outgoing[destination] = (min(message[0] for message in messages), self.partition_objects.dumps(messages))
+        self.outbox.clear()
+
+        events = self.network_event_scheduler.events
+        next_event_time = events.peek()[0] if events else None
+        return next_event_time, self.network_event_scheduler.current_tick, outgoing
+
+class ConservativeParallelEngine(PartitionedEngine):
+    """
+    保守的並列離散イベントシミュレーション（ウィンドウ同期方式）。
+    トポロジをパーティションに分割してワーカープロセスに割り当て、パーティション間リンクの最小遅延をルックアヘッドとする。
+    全パーティションの最小イベント時刻Tから[T, T + ルックアヘッド)のウィンドウ内のイベントは他パーティションの影響を受けないため、
+    各ワーカーが並列に実行し、パーティション間のパケットはウィンドウごとにまとめて交換する。
+
+    NetworkEventScheduler(parallel_engine=ConservativeParallelEngine(...))として使う。
+    """
+    def __init__(self, num_partitions=None, partitions=None, seed=0):
+        super().__init__(num_partitions, partitions, seed)
+        self.inboxes = []  # パーティションごとの未配送メッセージ
+        self.lookahead = None
+
+    def create_worker(self, network_event_scheduler, index, node_partitions):
+        return ConservativePartitionWorker(network_event_scheduler, index, node_partitions)
+
+    def prepare(self, network_event_scheduler, node_partitions):
+        cut_links = get_cut_links(network_event_scheduler.links, node_partitions)
+        self.lookahead = min((link.get_propagation_delay() for link in cut_links), default=math.inf)
+        if self.lookahead <= 0:
+            raise ValueError("遅延0のリンクをパーティション間で分割することはできません。")
+
+    def start(self, network_event_scheduler):
+        super().start(network_event_scheduler)
+        self.inboxes = [[] for _ in self.workers]
+
+    def advance_until_tick(self, network_event_scheduler, end_time):
+        window_end = network_event_scheduler.current_tick
+        while True:
+            results = self.broadcast("advance", [(window_end, end_time, [data for _, data in inbox]) for inbox in self.inboxes])
+            self.inboxes = [[] for _ in self.workers]
+
+            next_event_times = []
+            for next_event_time, current_tick, outgoing in results:
+                if next_event_time is not None:
+                    next_event_times.append(next_event_time)
+                network_event_scheduler.current_tick = max(network_event_scheduler.current_tick, current_tick)
+                for destination, (message_time, data) in outgoing.items():
+                    self.inboxes[destination].append((message_time, data))
+                    next_event_times.append(message_time)
+
+            # 未処理イベントと配送中のパケットの最小時刻から次のウィンドウを決める
+            if not next_event_times or min(next_event_times) > end_time:
+                break
+            window_end = min(next_event_times) + self.lookahead
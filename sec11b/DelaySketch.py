@@ -0,0 +1,89 @@
+import math
+import numpy as np
+
+class DelaySketch:
+    """
+    遅延の分布を対数間隔のバケットで数えるストリーミングスケッチ（HDRヒストグラムと同様に相対誤差を保証する）。
+    分位点の相対誤差はrelative_accuracy以下で、バケット数は値の範囲の対数に比例するためパケット数によらずメモリは一定に収まる。
+    同じrelative_accuracyのスケッチはバケットごとの数を足し合わせて統合できる（並列実行のワーカーやレプリケーションの集約）。
+    """
+    def __init__(self, relative_accuracy=0.01, min_delay=1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracyは0より大きく1より小さい値を指定してください。")
+        self.relative_accuracy = relative_accuracy
+        self.min_delay = min_delay  # これ以下の遅延は0として数える
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.counts = {}  # バケット番号 -> 数（バケットiは(gamma^(i-1), gamma^i]の値）
+        self.zero_count = 0
+        self.count = 0
+
+    def bucket_index(self, delay):
+        return math.ceil(math.log(delay) / self.log_gamma)
+
+    def add(self, delay, count=1):
+        # countに負の値を指定すると以前に加えた値を取り除く
+        if delay <= self.min_delay:
+            self.zero_count += count
+        else:
+            index = self.bucket_index(delay)
+            self.counts[index] = self.counts.get(index, 0) + count
+            if not self.counts[index]:
+                del self.counts[index]
+        self.count += count
+
+    def remove(self, delay):
+        self.add(delay, -1)
+
+    def add_array(self, delays):
+        # 遅延の配列をまとめて加える
+        delays = np.asarray(delays, dtype=float)
+        positive = delays[delays > self.min_delay]
+        self.zero_count += len(delays) - len(positive)
+        indices, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+        for index, count in zip(indices.tolist(), counts.tolist()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += len(delays)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy or other.min_delay != self.min_delay:
+            raise ValueError("relative_accuracyまたはmin_delayが異なるスケッチは統合できません。")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def copy(self):
+        sketch = DelaySketch(self.relative_accuracy, self.min_delay)
+        sketch.counts = dict(self.counts)
+        sketch.zero_count = self.zero_count
+        sketch.count = self.count
+        return sketch
+
+    def bucket_value(self, index):
+        # バケット内の値との相対誤差がrelative_accuracy以下になる代表値
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def buckets(self):
+        # (代表値の配列, 数の配列)を値の小さい順に返す
+        indices = sorted(self.counts)
+        values = [0.0] * bool(self.zero_count) + [self.bucket_value(index) for index in indices]
+        counts = [self.zero_count] * bool(self.zero_count) + [self.counts[index] for index in indices]
+        return np.array(values), np.array(counts)
+
+    def quantile(self, q):
+        # q分位点（値が1つもなければNone）
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if rank < cumulative:
+            return 0.0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if rank < cumulative:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.counts))
+
+    def quantiles(self, qs=(0.5, 0.99, 0.999)):
+        return {q: self.quantile(q) for q in qs}
@@ -0,0 +1,160 @@
+import heapq
+
+DEFAULT_BUCKET_WIDTH = 0.001  # カレンダーキューのバケット幅の初期値（秒）
+
+class EventHandle:
+    """
+    schedule_eventが返すイベントのハンドル。
+    cancel()で取り消されたイベントはキューに残り、取り出し時に読み飛ばされる（遅延削除）。
+    """
+    __slots__ = ("network_event_scheduler", "event_time", "event_id", "cancelled", "fired")
+
+    def __init__(self, network_event_scheduler, event_time, event_id):
+        self.network_event_scheduler = network_event_scheduler
+        self.event_time = event_time
+        self.event_id = event_id
+        self.cancelled = False
+        self.fired = False
+
+    @property
+    def pending(self):
+        return not self.cancelled and not self.fired
+
+    def cancel(self):
+        # 実行済み・取り消し済みのイベントに対しては何もしない
+        if self.pending:
+            self.cancelled = True
+            self.network_event_scheduler.on_event_cancelled()
+
+class BinaryHeapEventQueue:
+    """
+    heapqによる二分ヒープのイベント集合（デフォルト）。
+    イベントは (event_time, event_id, callback, args, handle) のタプルで、時刻とイベントIDの順に取り出される。
+    """
+    def __init__(self):
+        self.heap = []
+
+    def attach(self, network_event_scheduler):
+        pass
+
+    def push(self, event):
+        heapq.heappush(self.heap, event)
+
+    def pop(self):
+        return heapq.heappop(self.heap)
+
+    def peek(self):
+        return self.heap[0]
+
+    def rebuild(self, keep):
+        # keep(event)がTrueのイベントだけでヒープを再構築する
+        self.heap = [event for event in self.heap if keep(event)]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+class CalendarEventQueue:
+    """
+    カレンダーキュー（R. Brown, 1988）によるイベント集合。
+    時刻軸を幅bucket_widthのスロットに区切り、スロット番号をバケット数で割った余りのバケットにイベントを格納する。
+    バケット数と幅をイベント数・イベント間隔に合わせて調整することで、push/popを償却O(1)で行う。
+    bucket_widthはイベントキューの時刻単位で、省略した場合はDEFAULT_BUCKET_WIDTH秒をスケジューラの時刻単位に換算した幅にする。
+    """
+    def __init__(self, bucket_count=16, bucket_width=None, min_bucket_count=16, sample_size=25):
+        self.size = 0
+        self.min_bucket_count = min_bucket_count
+        self.sample_size = sample_size  # バケット幅の推定に用いる先頭イベント数
+        self.bucket_count = bucket_count
+        self.default_bucket_width = bucket_width is None
+        self.bucket_width = DEFAULT_BUCKET_WIDTH if bucket_width is None else bucket_width
+        self.buckets = [[] for _ in range(bucket_count)]
+        self.current_slot = 0  # 現在走査中のスロット番号
+        self.min_bucket = None  # peekで見つけた最小イベントのバケット（直後のpopで再利用）
+
+    def attach(self, network_event_scheduler):
+        # スケジューラの時刻単位（整数ティックモードではティック）に合わせて既定のバケット幅を換算する
+        if self.default_bucket_width and self.size == 0:
+            self.bucket_width = network_event_scheduler.to_duration_ticks(DEFAULT_BUCKET_WIDTH)
+
+    def push(self, event):
+        slot = int(event[0] // self.bucket_width)
+        heapq.heappush(self.buckets[slot % self.bucket_count], event)
+        self.size += 1
+        self.min_bucket = None
+        # 現在のスロットより過去のイベントが追加された場合は走査位置を戻す
+        if slot < self.current_slot:
+            self.current_slot = slot
+        if self.size > 2 * self.bucket_count:
+            self.resize(2 * self.bucket_count)
+
+    def pop(self):
+        bucket = self.min_bucket or self.find_min_bucket()
+        event = heapq.heappop(bucket)
+        self.size -= 1
+        self.min_bucket = None
+        if self.size < self.bucket_count // 2 and self.bucket_count > self.min_bucket_count:
+            self.resize(self.bucket_count // 2)
+        return event
+
+    def peek(self):
+        if self.min_bucket is None:
+            self.min_bucket = self.find_min_bucket()
+        return self.min_bucket[0]
+
+    def find_min_bucket(self):
+        if self.size == 0:
+            raise IndexError("pop from empty event queue")
+
+        # 現在のスロットから1周分（1年分）のバケットを順に調べる
+        slot = self.current_slot
+        for _ in range(self.bucket_count):
+            bucket = self.buckets[slot % self.bucket_count]
+            if bucket and bucket[0][0] // self.bucket_width <= slot:
+                self.current_slot = slot
+                return bucket
+            slot += 1
+
+        # 1周して見つからない場合は、全バケットの先頭から最小のイベントを直接探す
+        bucket = min((bucket for bucket in self.buckets if bucket), key=lambda bucket: bucket[0])
+        self.current_slot = int(bucket[0][0] // self.bucket_width)
+        return bucket
+
+    def resize(self, new_bucket_count):
+        events = [event for bucket in self.buckets for event in bucket]
+        self.bucket_width = self.estimate_bucket_width(events)
+        self.bucket_count = new_bucket_count
+        self.buckets = [[] for _ in range(new_bucket_count)]
+        self.min_bucket = None
+        for event in events:
+            self.buckets[int(event[0] // self.bucket_width) % new_bucket_count].append(event)
+        for bucket in self.buckets:
+            heapq.heapify(bucket)
+        if events:
+            self.current_slot = int(min(events)[0] // self.bucket_width)
+
+    def rebuild(self, keep):
+        # keep(event)がTrueのイベントだけで各バケットを再構築する
+        self.size = 0
+        self.min_bucket = None
+        for i, bucket in enumerate(self.buckets):
+            bucket = [event for event in bucket if keep(event)]
+            heapq.heapify(bucket)
+            self.buckets[i] = bucket
+            self.size += len(bucket)
+
+    def estimate_bucket_width(self, events):
+        # 先頭のイベント間隔の平均から、外れ値（平均の2倍超）を除いて幅を再計算する
+        sample = heapq.nsmallest(self.sample_size, events)
+        gaps = [b[0] - a[0] for a, b in zip(sample, sample[1:])]
+        if not gaps:
+            return self.bucket_width
+        average_gap = sum(gaps) / len(gaps)
+        gaps = [gap for gap in gaps if gap <= 2 * average_gap]
+        average_gap = sum(gaps) / len(gaps) if gaps else 0
+        if average_gap <= 0:
+            return self.bucket_width  # 同時刻のイベントばかりの場合は現在の幅を維持
+        return 3 * average_gap
+
+    def __len__(self):
+        return self.size
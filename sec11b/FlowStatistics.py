@@ -0,0 +1,96 @@
+import math
+from sec11b.DelaySketch import DelaySketch
+
+class FlowStatistics:
+    """
+    パケットごとのログを残さず、(パケットタイプ, 送信元IP, 宛先IP)のフローごとの集計値だけを記録する
+    （NetworkEventScheduler(log_enabled=FlowStatistics())として使う）。メモリ使用量はフロー数に比例する。
+    パケットは最初に記録されたときのヘッダでフローに割り当て、packet.flow_keyに覚えておく（同じパケットを二重に数えない）。
+    遅延の分布はフローごとのDelaySketchに記録する（relative_accuracyは分位点の相対誤差）。
+    summarize()はシミュレーションの途中でも呼び出せる。
+    """
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        # フロー -> [送信パケット数, 送信バイト数, 受信パケット数, 受信バイト数, 遅延の合計, 最小生成時刻, 最大到着時刻, 遅延のスケッチ]
+        self.flows = {}
+
+    def create_counters(self):
+        return [0, 0, 0, 0, 0, math.inf, 0, DelaySketch(self.relative_accuracy)]
+
+    def log(self, packet, event_type, node_id, time):
+        flow_key = packet.flow_key
+        if flow_key is None:
+            header = packet.header
+            flow_key = packet.flow_key = (type(packet).__name__, header.source_ip, header.destination_ip)
+            counters = self.flows.get(flow_key)
+            if counters is None:
+                counters = self.flows[flow_key] = self.create_counters()
+            counters[0] += 1
+            counters[1] += packet.size
+            counters[5] = min(counters[5], packet.creation_time)
+
+        if event_type == "arrived":
+            counters = self.flows.get(flow_key)
+            if counters is None:
+                # 他のプロセスで送信されたパケット
+                counters = self.flows[flow_key] = self.create_counters()
+            # "arrived"はset_arrivedより前に記録されるので、arrival_timeは前回の到着時刻（ブロードキャストで複数のノードに届いた場合）
+            if packet.arrival_time is None or packet.arrival_time == -1:
+                counters[2] += 1
+                counters[3] += packet.size
+                counters[4] += time - packet.creation_time
+            else:
+                # 最後の到着時刻までの遅延に置き換える
+                counters[4] += time - packet.arrival_time
+                counters[7].remove(packet.arrival_time - packet.creation_time)
+            counters[7].add(time - packet.creation_time)
+            counters[6] = max(counters[6], time)
+
+    def create_empty(self):
+        return FlowStatistics(self.relative_accuracy)
+
+    def merge(self, other):
+        """他のプロセス（並列実行のワーカーやレプリケーション）の集計値を加える"""
+        for flow_key, other_counters in other.flows.items():
+            counters = self.flows.get(flow_key)
+            if counters is None:
+                counters = self.flows[flow_key] = self.create_counters()
+            for index in range(5):
+                counters[index] += other_counters[index]
+            counters[5] = min(counters[5], other_counters[5])
+            counters[6] = max(counters[6], other_counters[6])
+            counters[7].merge(other_counters[7])
+
+    def enable_undo(self):
+        pass
+
+    def mark(self):
+        # 現在の集計値の複製（truncateでこの時点の値に戻せる）
+        return {flow_key: counters[:7] + [counters[7].copy()] for flow_key, counters in self.flows.items()}
+
+    def truncate(self, mark):
+        self.flows = {flow_key: counters[:7] + [counters[7].copy()] for flow_key, counters in mark.items()}
+
+    def discard_undo_log(self, mark):
+        pass
+
+    def summarize(self):
+        """NetworkEventScheduler.summarize_packet_logsと同じ形式の集計結果を返す"""
+        summary_data = {}
+        for (packet_type, source_ip, destination_ip), counters in self.flows.items():
+            sent_packets, sent_bytes, received_packets, received_bytes, total_delay, min_creation_time, max_arrival_time, delay_sketch = counters
+            duration = max_arrival_time - min_creation_time
+            summary_data.setdefault(packet_type, {})[(source_ip, destination_ip)] = {
+                "sent_packets": sent_packets,
+                "sent_bytes": sent_bytes,
+                "received_packets": received_packets,
+                "received_bytes": received_bytes,
+                "total_delay": total_delay,
+                "lost_packets": sent_packets - received_packets,  # 到着していないパケット（送信中のものを含む）
+                "min_creation_time": min_creation_time,
+                "max_arrival_time": max_arrival_time,
+                "average_throughput": received_bytes * 8 / duration if duration > 0 else 0,
+                "average_delay": total_delay / received_packets if received_packets > 0 else 0,
+                "delay_sketch": delay_sketch.copy()
+            }
+        return summary_data
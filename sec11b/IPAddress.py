@@ -0,0 +1,41 @@
+# IPv4アドレス（"192.168.1.1"またはCIDR表記"192.168.1.1/24"）と整数の変換
+# 転送処理で同じ文字列を何度も解析しないよう、解析結果を文字列ごとにキャッシュする
+
+parsed_addresses = {}  # アドレス文字列 -> (整数のアドレス, 整数のサブネットマスク)
+
+def ip_to_int(ip_address):
+    octets = ip_address.split('.')
+    return sum(int(octet) << (8 * i) for i, octet in enumerate(reversed(octets)))
+
+def int_to_ip(value):
+    return f"{(value >> 24) & 0xff}.{(value >> 16) & 0xff}.{(value >> 8) & 0xff}.{value & 0xff}"
+
+def mask_length_to_int(mask_length):
+    mask_length = int(mask_length)
+    return (0xffffffff >> (32 - mask_length)) << (32 - mask_length)
+
+def parse_ip(address):
+    """
+    アドレス文字列を(整数のアドレス, 整数のサブネットマスク)に変換する。マスク長のないアドレスは/32として扱う。
+    結果はキャッシュされるので、2回目以降は辞書を1回引くだけで済む。
+    """
+    parsed = parsed_addresses.get(address)
+    if parsed is None:
+        ip_address, _, mask_length = address.partition('/')
+        parsed = parsed_addresses[address] = (ip_to_int(ip_address), mask_length_to_int(mask_length or 32))
+    return parsed
+
+def parse_network(cidr):
+    # CIDR表記を(整数のネットワークアドレス, 整数のサブネットマスク)に変換する
+    address, mask = parse_ip(cidr)
+    return address & mask, mask
+
+def parse_prefix(cidr):
+    # CIDR表記を(整数のネットワークアドレス, プレフィックス長)に変換する
+    network, mask = parse_network(cidr)
+    return network, bin(mask).count("1")
+
+def normalize_cidr(cidr):
+    # CIDR表記をネットワークアドレスの表記にする（"192.168.1.1/24" -> "192.168.1.0/24"）
+    network, prefix_length = parse_prefix(cidr)
+    return f"{int_to_ip(network)}/{prefix_length}"
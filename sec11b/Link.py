@@ -1,5 +1,4 @@
 import heapq
-import random
 from sec11b.Switch import Switch
 from sec11b.Router import Router
 from sec11b.Packet import Packet, TCPPacket, UDPPacket
@@ -13,10 +12,13 @@ class Link:
         self.loss_rate = loss_rate
         self.is_active = True
         self.network_event_scheduler = network_event_scheduler
+        # パケットロス判定用の乱数系列（方向ごとに分けて、並列実行時も各方向を担当するプロセスだけが使うようにする）
+        self.loss_random_xy = network_event_scheduler.get_random_stream(f"link/{node_x.node_id}/{node_y.node_id}/loss")
+        self.loss_random_yx = network_event_scheduler.get_random_stream(f"link/{node_y.node_id}/{node_x.node_id}/loss")
 
         self.packet_queue_xy = []
         self.packet_queue_yx = []
-        self.current_queue_time_xy = 0
+        self.current_queue_time_xy = 0  # キューの残り送信時間（イベントキューの時刻単位）
         self.current_queue_time_yx = 0
 
         # IPアドレスの選択とリンクの設定
@@ -27,7 +29,7 @@ class Link:
         node_y.add_link(self, ip_y)
         
         label = f'{bandwidth/1000000} Mbps, {delay} s'
-        self.network_event_scheduler.add_link(node_x.node_id, node_y.node_id, label, self.bandwidth, self.delay)
+        self.network_event_scheduler.add_link(node_x.node_id, node_y.node_id, label, self.bandwidth, self.delay, link=self)
 
     def set_active(self, active):
         # リンクの状態を設定する
@@ -128,8 +130,8 @@ class Link:
             queue = self.packet_queue_yx
             current_queue_time = self.current_queue_time_yx
 
-        packet_transfer_time = (packet.size * 8) / self.bandwidth
-        dequeue_time = self.network_event_scheduler.current_time + current_queue_time
+        packet_transfer_time = self.get_transfer_time(packet)
+        dequeue_time = self.network_event_scheduler.current_tick + current_queue_time
         heapq.heappush(queue, (dequeue_time, packet, from_node))
         self.add_to_queue_time(from_node, packet_transfer_time)
         if len(queue) == 1:
@@ -143,10 +145,10 @@ class Link:
 
         if queue:
             dequeue_time, packet, _ = heapq.heappop(queue)
-            packet_transfer_time = (packet.size * 8) / self.bandwidth
+            packet_transfer_time = self.get_transfer_time(packet)
 
-            # ドロップ判断
-            if self.should_drop_packet(packet):
+            # ドロップ判断（障害中のリンクではすべてのパケットを失う）
+            if not self.is_active or self.should_drop_packet(packet, from_node):
                 if self.network_event_scheduler.verbose:
                     print(f"{self.network_event_scheduler.current_time:.6f}: Packet dropped at Link {self.node_x}-{self.node_y}.")
                 packet.set_arrived(-1)
@@ -154,21 +156,30 @@ class Link:
                 pass
 
             next_node = self.node_x if from_node != self.node_x else self.node_y
-            self.network_event_scheduler.schedule_event(self.network_event_scheduler.current_time + self.delay, next_node.receive_packet, packet, self)
+            self.network_event_scheduler.deliver_packet(self.network_event_scheduler.current_tick + self.get_propagation_delay(), next_node, packet, self)
             self.network_event_scheduler.schedule_event(dequeue_time + packet_transfer_time, self.subtract_from_queue_time, from_node, packet_transfer_time)
 
             if queue:
                 next_packet_time = queue[0][0]
                 self.network_event_scheduler.schedule_event(next_packet_time, self.transfer_packet, from_node)
 
-    def should_drop_packet(self, packet):
+    def get_transfer_time(self, packet):
+        # パケットの送信時間（イベントキューの時刻単位）
+        return self.network_event_scheduler.to_duration_ticks((packet.size * 8) / self.bandwidth)
+
+    def get_propagation_delay(self):
+        # 伝搬遅延（イベントキューの時刻単位）
+        return self.network_event_scheduler.to_duration_ticks(self.delay)
+
+    def should_drop_packet(self, packet, from_node):
         """パケットがドロップされるべきかどうかを判断するメソッド"""
+        loss_random = self.loss_random_xy if from_node == self.node_x else self.loss_random_yx
         # パケットがUDPPacketの場合、ロス率に応じてドロップする
         if isinstance(packet, UDPPacket):
-            return random.random() < self.loss_rate
+            return loss_random.random() < self.loss_rate
         # パケットがTCPPacketでフラグがPSHの場合、ロス率に応じてドロップする
-        elif isinstance(packet, TCPPacket) and "PSH" in packet.header.get('flags', ''):
-            return random.random() < self.loss_rate
+        elif isinstance(packet, TCPPacket) and "PSH" in packet.header.flags:
+            return loss_random.random() < self.loss_rate
         # それ以外の場合はドロップしない
         return False
 
@@ -1,15 +1,34 @@
 import matplotlib.pyplot as plt
 import networkx as nx
-import heapq
 import numpy as np
-from collections import defaultdict
+from sec11b.EventQueue import BinaryHeapEventQueue, EventHandle
+from sec11b.Checkpoint import save_checkpoint
+from sec11b.RandomStreams import RandomStreams, GlobalRandomStream
+from sec11b.PacketLogStore import PacketLogStore
+from sec11b.PacketLogSink import PacketLogSink, PacketLogReader
+from sec11b.FlowStatistics import FlowStatistics
+from sec11b.DelaySketch import DelaySketch
 
 class NetworkEventScheduler:
-    def __init__(self, log_enabled=False, verbose=False, stp_verbose=False, routing_verbose=False, nat_verbose=False, tcp_verbose=False):
-        self.current_time = 0
-        self.events = []
+    def __init__(self, log_enabled=False, verbose=False, stp_verbose=False, routing_verbose=False, nat_verbose=False, tcp_verbose=False, event_queue=None, compaction_ratio=0.5, batch_dispatch=False, group_by_target=False, time_resolution=None, parallel_engine=None, seed=None):
+        self.time_resolution = time_resolution  # 整数ティック1つあたりの秒数（例: 1e-9）。Noneの場合は浮動小数点の秒で時刻を管理
+        self.current_time = 0  # 現在時刻（秒）
+        self.current_tick = 0  # イベントキューで用いる現在時刻（ティック、浮動小数点モードでは秒）
+        self.events = event_queue if event_queue is not None else BinaryHeapEventQueue()  # イベント集合（デフォルトは二分ヒープ）
+        self.events.attach(self)
         self.event_id = 0
-        self.packet_logs = {}
+        self.next_packet_id = 0  # 次に割り当てるパケットID
+        self.packet_id_step = 1  # パケットIDの増分（並列実行のワーカーではパーティション数）
+        self.cancelled_events = 0  # キューに残っている取り消し済みイベントの数
+        self.compaction_ratio = compaction_ratio  # 取り消し済みイベントがこの割合を超えたらキューを再構築
+        self.batch_dispatch = batch_dispatch  # 同時刻のイベントをまとめて取り出して実行するモード
+        self.group_by_target = group_by_target  # バッチ内のイベントを対象オブジェクトごとにまとめて実行
+        # log_enabledにはTrue/Falseのほか、ログの記録先（PacketLogSink、FlowStatisticsなど）を指定できる
+        if hasattr(log_enabled, "log"):
+            self.packet_logs = log_enabled
+            log_enabled = True
+        else:
+            self.packet_logs = PacketLogStore()  # 列指向のパケットログ
         self.log_enabled = log_enabled
         self.verbose = verbose
         self.stp_verbose = stp_verbose
@@ -17,12 +36,27 @@ class NetworkEventScheduler:
         self.nat_verbose = nat_verbose
         self.tcp_verbose = tcp_verbose
         self.graph = nx.Graph()
-
-    def add_node(self, node_id, label, ip_addresses=None):
+        self.links = []  # 生成されたLinkオブジェクト（生成順）
+        self.nodes = {}  # ノードID -> Node/Router/Switch/Serverオブジェクト
+        self.parallel_engine = parallel_engine  # 並列実行エンジン（Noneの場合は逐次実行）
+        self.partition = None  # 並列実行時にこのプロセスが担当するパーティション
+        self.random_streams = RandomStreams(seed) if seed is not None else None  # コンポーネントごとの乱数系列（Noneの場合はrandomモジュールを共有）
+
+    def generate_packet_id(self):
+        # 単調増加する整数のパケットID（チェックポイントやロールバックではスケジューラとともに保存・復元される）
+        packet_id = self.next_packet_id
+        self.next_packet_id += self.packet_id_step
+        return packet_id
+
+    def add_node(self, node_id, label, ip_addresses=None, node=None):
         self.graph.add_node(node_id, label=label, ip_addresses=ip_addresses)
+        if node is not None:
+            self.nodes[node_id] = node
 
-    def add_link(self, node1_id, node2_id, label, bandwidth, delay):
+    def add_link(self, node1_id, node2_id, label, bandwidth, delay, link=None):
         self.graph.add_edge(node1_id, node2_id, label=label, bandwidth=bandwidth, delay=delay)
+        if link is not None:
+            self.links.append(link)
 
     def draw(self):
         def get_edge_width(bandwidth):
@@ -85,69 +119,143 @@ class NetworkEventScheduler:
                         return switch.link_states.get(link, 'unknown')
         return 'unknown'
 
+    def get_random_stream(self, name):
+        # コンポーネント用の乱数系列を返す（シード未指定の場合はグローバルなrandomモジュールに委譲する系列）
+        if self.random_streams is None:
+            return GlobalRandomStream()
+        return self.random_streams.stream(name)
+
+    def to_ticks(self, seconds):
+        # 秒をイベントキューの時刻単位に変換する
+        if self.time_resolution is None:
+            return seconds
+        return round(seconds / self.time_resolution)
+
+    def to_duration_ticks(self, seconds):
+        # 正の時間の長さ（送信時間・伝搬遅延など）を時刻単位に変換する（整数ティックモードでも0ティックには丸めず最低1ティックにする）
+        ticks = self.to_ticks(seconds)
+        if self.time_resolution is not None and seconds > 0:
+            return max(ticks, 1)
+        return ticks
+
+    def to_seconds(self, ticks):
+        # イベントキューの時刻単位を秒に変換する
+        if self.time_resolution is None:
+            return ticks
+        return ticks * self.time_resolution
+
     def schedule_event(self, event_time, callback, *args):
-        event = (event_time, self.event_id, callback, args)
-        heapq.heappush(self.events, event)
+        # event_timeはイベントキューの時刻単位（整数ティックモードではティック）
+        # 並列実行のワーカーではイベントIDの代わりにパーティションによらず実行順が決まるイベントキーを使う
+        event_id = self.event_id if self.partition is None else self.partition.get_event_key(self.event_id)
+        handle = EventHandle(self, event_time, event_id)
+        event = (event_time, event_id, callback, args, handle)
+        self.events.push(event)
         self.event_id += 1
+        return handle
+
+    def deliver_packet(self, event_time, node, packet, link):
+        # リンクを渡ったパケットの受信イベントをスケジュール（受信ノードが別パーティションの場合は送出）
+        if self.partition is not None and self.partition.is_remote(node):
+            self.partition.send(event_time, self.partition.next_event_key(), node, packet, link)
+        else:
+            self.schedule_event(event_time, node.receive_packet, packet, link)
+
+    def on_event_cancelled(self):
+        self.cancelled_events += 1
+        if self.cancelled_events > self.compaction_ratio * len(self.events):
+            self.compact_events()
+
+    def compact_events(self):
+        # 取り消し済みイベントをキューから取り除く（実行待ちのバッチ内で取り消されたものは数に残す）
+        queue_length = len(self.events)
+        self.events.rebuild(lambda event: not event[4].cancelled)
+        self.cancelled_events -= queue_length - len(self.events)
 
     def log_packet_info(self, packet, event_type, node_id=None):
         if self.log_enabled:
-            if packet.id not in self.packet_logs:
-                self.packet_logs[packet.id] = {
-                    "packet_type": type(packet).__name__,  # パケットのクラス名を記録
-                    "source_mac": packet.header["source_mac"],
-                    "destination_mac": packet.header["destination_mac"],
-                    "source_ip": packet.header["source_ip"],
-                    "destination_ip": packet.header["destination_ip"],
-                    "size": packet.size,
-                    "creation_time": packet.creation_time,
-                    "arrival_time": packet.arrival_time,
-                    "events": []
-                }
-
-            if event_type == "arrived":
-                self.packet_logs[packet.id]["arrival_time"] = self.current_time
-
-            event_info = {
-                "time": self.current_time,
-                "event": event_type,
-                "node_id": node_id,
-                "packet_id": packet.id,
-                "src": packet.header["source_ip"],
-                "dst": packet.header["destination_ip"]
-            }
-            self.packet_logs[packet.id]["events"].append(event_info)
+            self.packet_logs.log(packet, event_type, node_id, self.current_time)
 
             if self.verbose:
-                print(f"Time: {self.current_time} Node: {node_id}, Event: {event_type}, Packet: {packet.id}, Src: {packet.header['source_ip']}, Dst: {packet.header['destination_ip']}")
+                print(f"Time: {self.current_time} Node: {node_id}, Event: {event_type}, Packet: {packet.id}, Src: {packet.header.source_ip}, Dst: {packet.header.destination_ip}")
+
+    def merge_packet_logs(self, packet_logs):
+        # 他のプロセスで記録されたパケットログを統合する
+        self.packet_logs.merge(packet_logs)
 
     def print_packet_logs(self):
-        for packet_id, log in self.packet_logs.items():
+        packet_logs = self.packet_logs
+        if isinstance(packet_logs, FlowStatistics):
+            raise ValueError("集計のみのモード（FlowStatistics）ではパケットごとのログがないため、パケットログを出力できません（generate_summaryを使ってください）。")
+        if isinstance(packet_logs, PacketLogSink):
+            # ファイルに書き出したログを読み直す
+            packet_logs.flush()
+            packet_logs = PacketLogReader(packet_logs.path)
+        for packet_id, log in packet_logs.items():
             print(f"Packet ID: {packet_id} Src: {log['source_ip']} {log['creation_time']} -> Dst: {log['destination_ip']} {log['arrival_time']}")
             for event in log['events']:
                 print(f"Time: {event['time']}, Event: {event['event']}")
 
-    def generate_summary(self, packet_logs):
-        # パケットタイプとソース宛先ペアでの集計データを保持するための辞書
-        summary_data = defaultdict(lambda: defaultdict(lambda: {"sent_packets": 0, "sent_bytes": 0, "received_packets": 0, "received_bytes": 0, "total_delay": 0, "lost_packets": 0, "min_creation_time": float('inf'), "max_arrival_time": 0}))
+    def summarize_packet_logs(self, packet_logs):
+        """
+        パケットログ（PacketLogStore、PacketLogSink、PacketLogReader、FlowStatistics）をパケットタイプ、送信元・宛先ペアごとに集計して返す。
+        {パケットタイプ: {(送信元IP, 宛先IP): 集計値}} の辞書で、集計値には送受信数・バイト数・遅延・損失数と平均スループット・平均遅延、
+        遅延の分布（"delay_sketch"、DelaySketch）を含む。
+        """
+        if isinstance(packet_logs, FlowStatistics):
+            return packet_logs.summarize()
+
+        packets = packet_logs.packet_array()
+        keys = np.stack([packets["packet_type"], packets["source_ip"], packets["destination_ip"]], axis=1)
+        unique_keys, first_indices, groups = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        groups = groups.reshape(-1)
+        num_groups = len(unique_keys)
+
+        # arrival_timeが-1のパケットはリンク上で失われたもの（NaNは未到着）
+        arrival_times = packets["arrival_time"]
+        received = ~np.isnan(arrival_times) & (arrival_times != -1)
+        sizes = packets["size"]
+        sent_packets = np.bincount(groups, minlength=num_groups)
+        sent_bytes = np.bincount(groups, weights=sizes, minlength=num_groups)
+        received_packets = np.bincount(groups, weights=received, minlength=num_groups)
+        received_bytes = np.bincount(groups, weights=np.where(received, sizes, 0), minlength=num_groups)
+        total_delay = np.bincount(groups, weights=np.where(received, arrival_times - packets["creation_time"], 0), minlength=num_groups)
+        min_creation_time = np.full(num_groups, np.inf)
+        np.minimum.at(min_creation_time, groups, packets["creation_time"])
+        max_arrival_time = np.zeros(num_groups)
+        np.maximum.at(max_arrival_time, groups[received], arrival_times[received])
+
+        # 到着したパケットの遅延をグループ順に並べ、グループごとにスケッチへ加える
+        received_groups = groups[received]
+        order = np.argsort(received_groups, kind="stable")
+        delays = (arrival_times - packets["creation_time"])[received][order]
+        bounds = np.searchsorted(received_groups[order], np.arange(num_groups + 1))
+
+        # 最初に記録された順に並べる
+        summary_data = {}
+        for group in np.argsort(first_indices):
+            packet_type, source_ip, destination_ip = unique_keys[group]
+            data = {
+                "sent_packets": int(sent_packets[group]),
+                "sent_bytes": int(sent_bytes[group]),
+                "received_packets": int(received_packets[group]),
+                "received_bytes": int(received_bytes[group]),
+                "total_delay": float(total_delay[group]),
+                "lost_packets": int(sent_packets[group] - received_packets[group]),
+                "min_creation_time": float(min_creation_time[group]),
+                "max_arrival_time": float(max_arrival_time[group]),
+                "delay_sketch": DelaySketch()
+            }
+            data["delay_sketch"].add_array(delays[bounds[group]:bounds[group + 1]])
+            duration = data["max_arrival_time"] - data["min_creation_time"]
+            data["average_throughput"] = data["received_bytes"] * 8 / duration if duration > 0 else 0
+            data["average_delay"] = data["total_delay"] / data["received_packets"] if data["received_packets"] > 0 else 0
+            src_dst_pair = (packet_logs.addresses[source_ip], packet_logs.addresses[destination_ip])
+            summary_data.setdefault(packet_logs.packet_types[packet_type], {})[src_dst_pair] = data
+        return summary_data
 
-        # ログエントリを反復処理してデータを集計
-        for packet_id, log in packet_logs.items():
-            packet_type = log["packet_type"]
-            src_dst_pair = (log["source_ip"], log["destination_ip"])
-            data = summary_data[packet_type][src_dst_pair]
-
-            data["sent_packets"] += 1
-            data["sent_bytes"] += log["size"]
-            data["min_creation_time"] = min(data["min_creation_time"], log["creation_time"])
-
-            if "arrival_time" in log and log["arrival_time"] is not None:
-                data["received_packets"] += 1
-                data["received_bytes"] += log["size"]
-                data["total_delay"] += log["arrival_time"] - log["creation_time"]
-                data["max_arrival_time"] = max(data["max_arrival_time"], log["arrival_time"])
-            else:
-                data["lost_packets"] += 1
+    def generate_summary(self, packet_logs):
+        summary_data = self.summarize_packet_logs(packet_logs)
 
         # 集計結果をパケットタイプごと、ソース宛先ペアごとに出力
         for packet_type, src_dst_data in summary_data.items():
@@ -158,62 +266,71 @@ class NetworkEventScheduler:
                 print(f"    Total Sent Bytes: {data['sent_bytes']}")
                 print(f"    Total Received Packets: {data['received_packets']}")
                 print(f"    Total Received Bytes: {data['received_bytes']}")
-                avg_throughput = (data["received_bytes"] * 8 / (data["max_arrival_time"] - data["min_creation_time"])) if (data["max_arrival_time"] - data["min_creation_time"]) > 0 else 0
-                avg_delay = data["total_delay"] / data["received_packets"] if data["received_packets"] > 0 else 0
-                print(f"    Average Throughput (bps): {avg_throughput}")
-                print(f"    Average Delay (s): {avg_delay}")
+                print(f"    Average Throughput (bps): {data['average_throughput']}")
+                print(f"    Average Delay (s): {data['average_delay']}")
+                quantiles = data["delay_sketch"].quantiles((0.5, 0.99, 0.999))
+                print(f"    Delay p50/p99/p99.9 (s): {quantiles[0.5]} / {quantiles[0.99]} / {quantiles[0.999]}")
                 print(f"    Lost Packets: {data['lost_packets']}\n")
 
-    def generate_throughput_graph(self, packet_logs):
-        time_slot = 1.0  # 時間スロットを1秒に固定
-
-        max_time = max(log['arrival_time'] for log in packet_logs.values() if log['arrival_time'] is not None)
-        min_time = min(log['creation_time'] for log in packet_logs.values())
-        num_slots = int((max_time - min_time) / time_slot) + 1  # スロットの総数を計算
-
-        throughput_data = defaultdict(list)
-        for packet_id, log in packet_logs.items():
-            if log['arrival_time'] is not None:
-                src_dst_pair = (log['source_ip'], log['destination_ip'])
-                slot_index = int((log['arrival_time'] - min_time) / time_slot)
-                throughput_data[src_dst_pair].append((slot_index, log['size']))
-
-        aggregated_throughput = defaultdict(lambda: defaultdict(int))
-        for src_dst, packets in throughput_data.items():
-            for slot_index in range(num_slots):
-                slot_throughput = sum(size * 8 for i, size in packets if i == slot_index)
-                aggregated_throughput[src_dst][slot_index] = slot_throughput / time_slot
-
-        for src_dst, slot_data in aggregated_throughput.items():
-            time_slots = list(range(num_slots))
-            throughputs = [slot_data[slot] for slot in time_slots]
-            times = [min_time + slot * time_slot for slot in time_slots]
+        return summary_data
+
+    def compute_throughput_series(self, packet_logs, time_slot=1.0):
+        """
+        到着したパケットのビット数を最初のパケットの生成時刻からtime_slot秒ごとのスロットに集計し、
+        (各スロットの開始時刻の配列, {(送信元IP, 宛先IP): スループット（bps）の配列}) を返す。
+        """
+        if isinstance(packet_logs, FlowStatistics):
+            raise ValueError("集計のみのモード（FlowStatistics）ではパケットごとのログがないため、スループットの時系列を求められません。")
+        packets = packet_logs.packet_array()
+        arrival_times = packets["arrival_time"]
+        received = ~np.isnan(arrival_times) & (arrival_times != -1)
+        if not received.any():
+            return np.empty(0), {}
+
+        min_time = packets["creation_time"].min()
+        packets = packets[received]
+        slot_indices = ((packets["arrival_time"] - min_time) / time_slot).astype(np.int64)
+        num_slots = int(slot_indices.max()) + 1  # スロットの総数
+
+        # (送信元IP, 宛先IP)ごとに番号を振り、ペアとスロットの組ごとにビット数を足し合わせる
+        pairs, pair_indices = np.unique(packets["source_ip"].astype(np.int64) << 32 | packets["destination_ip"], return_inverse=True)
+        bits = np.bincount(pair_indices * num_slots + slot_indices, weights=packets["size"] * 8, minlength=len(pairs) * num_slots)
+        throughputs = bits.reshape(len(pairs), num_slots) / time_slot
+
+        times = min_time + np.arange(num_slots) * time_slot
+        return times, {(packet_logs.addresses[pair >> 32], packet_logs.addresses[pair & 0xFFFFFFFF]): throughputs[index] for index, pair in enumerate(pairs.tolist())}
+
+    def generate_throughput_graph(self, packet_logs, time_slot=1.0):
+        times, throughput_data = self.compute_throughput_series(packet_logs, time_slot)
+
+        for src_dst, throughputs in throughput_data.items():
             plt.step(times, throughputs, label=f'{src_dst[0]} -> {src_dst[1]}', where='post', linestyle='-', alpha=0.5, marker='o')
 
         plt.xlabel('Time (s)')
         plt.ylabel('Throughput (bps)')
         plt.title('Throughput over time')
-        plt.xlim(0, max_time)
+        plt.xlim(0, times[-1] + time_slot if len(times) else 0)
         plt.legend()
         plt.show()
 
     def generate_delay_histogram(self, packet_logs):
-        delay_data = defaultdict(list)
-        for packet_id, log in packet_logs.items():
-            if log['arrival_time'] is not None:
-                src_dst_pair = (log['source_ip'], log['destination_ip'])
-                delay = log['arrival_time'] - log['creation_time']
-                delay_data[src_dst_pair].append(delay)
+        # 送信元・宛先ペアごとに遅延のスケッチを統合し、バケットの代表値と数からヒストグラムを描く（遅延を個別に保持しない）
+        delay_sketches = {}
+        for src_dst_data in self.summarize_packet_logs(packet_logs).values():
+            for src_dst, data in src_dst_data.items():
+                if data["delay_sketch"].count:
+                    delay_sketches.setdefault(src_dst, DelaySketch()).merge(data["delay_sketch"])
+        delay_data = {src_dst: sketch.buckets() for src_dst, sketch in delay_sketches.items()}
 
         num_plots = len(delay_data)
         num_bins = 20
         fig, axs = plt.subplots(num_plots, figsize=(6, 2 * num_plots))
-        max_delay = max(max(delays) for delays in delay_data.values())
+        max_delay = max(delays.max() for delays, _ in delay_data.values())
         bin_width = max_delay / num_bins
 
-        for i, (src_dst, delays) in enumerate(delay_data.items()):
+        for i, (src_dst, (delays, counts)) in enumerate(delay_data.items()):
             ax = axs[i] if num_plots > 1 else axs
-            ax.hist(delays, bins=np.arange(0, max_delay + bin_width, bin_width), alpha=0.5, color='royalblue', label=f'{src_dst[0]} -> {src_dst[1]}')
+            ax.hist(delays, bins=np.arange(0, max_delay + bin_width, bin_width), weights=counts, alpha=0.5, color='royalblue', label=f'{src_dst[0]} -> {src_dst[1]}')
             ax.set_xlabel('Delay (s)')
             ax.set_ylabel('Frequency')
             ax.set_title(f'Delay histogram for {src_dst[0]} -> {src_dst[1]}')
@@ -223,14 +340,106 @@ class NetworkEventScheduler:
         plt.tight_layout()
         plt.show()
 
+    def dispatch_batch(self):
+        # 先頭のイベントと同時刻のイベントをすべて取り出す（イベントID順）
+        event_time = self.events.peek()[0]
+        batch = []
+        while self.events and self.events.peek()[0] == event_time:
+            event = self.events.pop()
+            if event[4].cancelled:
+                self.cancelled_events -= 1
+            else:
+                batch.append(event)
+
+        if self.group_by_target:
+            batch = self.group_events_by_target(batch)
+
+        self.current_tick = event_time
+        self.current_time = self.to_seconds(event_time)
+        for _, _, callback, args, handle in batch:
+            # バッチ内の先行イベントによって取り消された場合は実行しない
+            if handle.cancelled:
+                self.cancelled_events -= 1
+                continue
+            handle.fired = True
+            callback(*args)
+
+    def group_events_by_target(self, batch):
+        # 同じオブジェクト（バウンドメソッドの__self__）宛てのイベントを連続させる
+        # グループは最小のイベントID順、グループ内はイベントID順に並ぶため実行順序は決定的
+        groups = {}
+        for event in batch:
+            target = getattr(event[2], "__self__", event[2])
+            groups.setdefault(id(target), []).append(event)
+        return [event for group in groups.values() for event in group]
+
+    def save_checkpoint(self, path):
+        # シミュレーションの状態をファイルに保存する（load_checkpointで復元できる）
+        save_checkpoint(self, path)
+
+    def schedule_checkpoint(self, time, path, interval=None):
+        # time（秒）にチェックポイントを保存する。intervalを指定した場合はその間隔（秒）で保存し続ける
+        self.schedule_event(self.to_ticks(time), self.save_scheduled_checkpoint, path, self.to_ticks(interval) if interval is not None else None)
+
+    def save_scheduled_checkpoint(self, path, interval):
+        # 次回の保存を先にスケジュールして、復元後も定期的な保存が続くようにする
+        if interval is not None:
+            self.schedule_event(self.current_tick + interval, self.save_scheduled_checkpoint, path, interval)
+        self.save_checkpoint(path)
+
+    def step(self):
+        # 先頭のイベントを1つ取り出して実行する（取り消し済みの場合は実行せずに捨てる）
+        event_time, event_id, callback, args, handle = self.events.pop()
+        if handle.cancelled:
+            self.cancelled_events -= 1
+            return
+        handle.fired = True
+        self.current_tick = event_time
+        self.current_time = self.to_seconds(event_time)
+        callback(*args)
+
     def run(self):
+        if self.parallel_engine is not None:
+            self.parallel_engine.run(self)
+            return
+
+        if self.batch_dispatch:
+            while self.events:
+                self.dispatch_batch()
+            return
+
+        resolution = self.time_resolution
         while self.events:
-            event_time, _, callback, args = heapq.heappop(self.events)
-            self.current_time = event_time
+            event_time, _, callback, args, handle = self.events.pop()
+            if handle.cancelled:
+                self.cancelled_events -= 1
+                continue
+            handle.fired = True
+            self.current_tick = event_time
+            self.current_time = event_time * resolution if resolution else event_time
             callback(*args)
 
     def run_until(self, end_time):
-        while self.events and self.events[0][0] <= end_time:
-            event_time, event_id, callback, args = heapq.heappop(self.events)
-            self.current_time = event_time
+        if self.parallel_engine is not None:
+            self.parallel_engine.run_until(self, end_time)
+            return
+
+        self.run_until_tick(self.to_ticks(end_time))
+
+    def run_until_tick(self, end_time):
+        # end_timeはイベントキューの時刻単位
+        if self.batch_dispatch:
+            while self.events and self.events.peek()[0] <= end_time:
+                self.dispatch_batch()
+            return
+
+        resolution = self.time_resolution
+        while self.events and self.events.peek()[0] <= end_time:
+            event_time, event_id, callback, args, handle = self.events.pop()
+            if handle.cancelled:
+                self.cancelled_events -= 1
+                continue
+            handle.fired = True
+            self.current_tick = event_time
+            self.current_time = event_time * resolution if resolution else event_time
             callback(*args)
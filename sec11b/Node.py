@@ -1,11 +1,10 @@
 import uuid
 import re
-import random
-from random import randint
 from ipaddress import ip_interface, ip_network
 from sec11b.Switch import Switch
 from sec11b.Router import Router
 from sec11b.Packet import Packet, UDPPacket, TCPPacket, ARPPacket, DNSPacket, DHCPPacket
+from sec11b.Payload import VirtualPayload, as_payload, join_payloads
 
 class Node:
     def __init__(self, node_id, ip_address, network_event_scheduler, mac_address=None, dns_server=None, mtu=1500, default_route=None):
@@ -31,10 +30,14 @@ class Node:
         self.mtu = mtu  # Maximum Transmission Unit (MTU)
         self.fragmented_packets = {}  # フラグメントされたパケットの一時格納用
         self.default_route = default_route
+        # 用途ごとの乱数系列（ポート選択、DHCP開始のジッタ、TCPの初期シーケンス番号）
+        self.port_random = network_event_scheduler.get_random_stream(f"node/{node_id}/port")
+        self.dhcp_random = network_event_scheduler.get_random_stream(f"node/{node_id}/dhcp")
+        self.tcp_random = network_event_scheduler.get_random_stream(f"node/{node_id}/tcp")
         label = f'Node {node_id}\n{mac_address}'
 
         self.schedule_dhcp_packet()
-        self.network_event_scheduler.add_node(node_id, label, ip_addresses=[ip_address])
+        self.network_event_scheduler.add_node(node_id, label, ip_addresses=[ip_address], node=self)
 
     def is_valid_mac_address(self, mac_address):
         """MACアドレスが有効な形式かどうかをチェックする関数"""
@@ -81,7 +84,7 @@ class Node:
         ランダムにポート番号を選択します。
         一般的には、1024以上49151以下の範囲で選択します（ウェルノウンポートとダイナミックポートを避けるため）。
         """
-        return random.randint(1024, 49151)
+        return self.port_random.randint(1024, 49151)
 
     def assign_destination_port(self, source_port):
         """
@@ -102,9 +105,9 @@ class Node:
 
     def schedule_dhcp_packet(self):
         if self.is_network_address(self.ip_address):
-            initial_delay = random.uniform(0.5, 0.6)
+            initial_delay = self.dhcp_random.uniform(0.5, 0.6)
             self.network_event_scheduler.schedule_event(
-                self.network_event_scheduler.current_time + initial_delay,
+                self.network_event_scheduler.current_tick + self.network_event_scheduler.to_ticks(initial_delay),
                 self.send_dhcp_discover
             )
 
@@ -158,14 +161,14 @@ class Node:
         print(f"{self.node_id} DNS record added: {domain_name} -> {ip_address}")
 
     def process_ARP_packet(self, packet):
-        if packet.header["destination_mac"] == "FF:FF:FF:FF:FF:FF":  # ブロードキャスト
+        if packet.header.destination_mac == "FF:FF:FF:FF:FF:FF":  # ブロードキャスト
             self.network_event_scheduler.log_packet_info(packet, "arrived", self.node_id)
             packet.set_arrived(self.network_event_scheduler.current_time)
             if packet.payload.get("operation") == "request" and packet.payload["destination_ip"] == self.ip_address:
                 self._send_arp_reply(packet)
                 return
 
-        if packet.header["destination_mac"] == self.mac_address:
+        if packet.header.destination_mac == self.mac_address:
             if packet.payload.get("operation") == "reply" and packet.payload["destination_ip"] == self.ip_address:
                 # ARPリプライを受信した場合の処理
                 self.network_event_scheduler.log_packet_info(packet, "ARP reply received", self.node_id)
@@ -176,7 +179,7 @@ class Node:
                 return
 
     def process_DHCP_packet(self, packet):
-        if packet.header["destination_mac"] == self.mac_address:
+        if packet.header.destination_mac == self.mac_address:
             self.network_event_scheduler.log_packet_info(packet, "arrived", self.node_id)
             packet.set_arrived(self.network_event_scheduler.current_time)
             if packet.message_type == "OFFER":
@@ -205,7 +208,7 @@ class Node:
                 return
 
     def process_DNS_packet(self, packet):
-        if packet.header["destination_mac"] == self.mac_address:
+        if packet.header.destination_mac == self.mac_address:
             self.network_event_scheduler.log_packet_info(packet, "arrived", self.node_id)
             packet.set_arrived(self.network_event_scheduler.current_time)
             # DNSレスポンスの処理
@@ -216,8 +219,8 @@ class Node:
                 return
 
     def process_UDP_packet(self, packet):
-        if packet.header["destination_mac"] == self.mac_address:
-            if packet.header["destination_ip"] == self.ip_address:
+        if packet.header.destination_mac == self.mac_address:
+            if packet.header.destination_ip == self.ip_address:
                 # Log
                 self.network_event_scheduler.log_packet_info(packet, "arrived", self.node_id)
                 packet.set_arrived(self.network_event_scheduler.current_time)
@@ -227,14 +230,14 @@ class Node:
                 self.network_event_scheduler.log_packet_info(packet, "dropped", self.node_id)
 
     def process_TCP_packet(self, packet):
-        if packet.header["destination_mac"] == self.mac_address:
-            if packet.header["destination_ip"] == self.ip_address:
+        if packet.header.destination_mac == self.mac_address:
+            if packet.header.destination_ip == self.ip_address:
                 # log
                 self.network_event_scheduler.log_packet_info(packet, "arrived", self.node_id)
                 packet.set_arrived(self.network_event_scheduler.current_time)
 
                 # Check TCP flags for processing
-                flags = packet.header.get('flags', '')
+                flags = packet.header.flags
 
                 # SYNパケットの処理
                 if "SYN" in flags:
@@ -273,15 +276,15 @@ class Node:
             'state': state,
             'sequence_number': sequence_number,
             'acknowledgment_number': acknowledgment_number,
-            'data': data,
+            'data': as_payload(data),  # 送信するデータ（コピーせずにスライスできるペイロード）
             'last_ack_number': None,
             'duplicate_ack_count': 0,
             'packet_history': {}  # Packet history for potential retransmission
         }
 
     def count_duplicated_ACK(self, packet):
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
-        current_ack_number = packet.header["acknowledgment_number"]
+        connection_key = (packet.header.source_ip, packet.header.source_port)
+        current_ack_number = packet.header.acknowledgment_number
 
         if connection_key not in self.tcp_connections:
             return  # コネクションが存在しない場合は何もしない
@@ -308,12 +311,12 @@ class Node:
         return False
 
     def update_ACK_number(self, packet):
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
+        connection_key = (packet.header.source_ip, packet.header.source_port)
         if connection_key not in self.tcp_connections:
             return  # コネクション情報が存在しない場合は処理をスキップ
 
         # 受信したパケットの情報を取得
-        received_sequence_number = packet.header["sequence_number"]
+        received_sequence_number = packet.header.sequence_number
         payload_length = len(packet.payload)
 
         # 現在のACK番号を取得
@@ -328,11 +331,11 @@ class Node:
                 print(f"Updated ACK number to {new_ack_number} for connection {connection_key}.")
 
     def send_TCP_SYN_ACK(self, packet):
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
+        connection_key = (packet.header.source_ip, packet.header.source_port)
         
-        sequence_number = randint(1, 10000)
+        sequence_number = self.tcp_random.randint(1, 10000)
         # 受信したSYNパケットのシーケンス番号に1を加えたものがACK番号
-        acknowledgment_number = packet.header["sequence_number"] + 1
+        acknowledgment_number = packet.header.sequence_number + 1
 
         # 新しい接続情報を初期化
         if connection_key not in self.tcp_connections:
@@ -343,12 +346,12 @@ class Node:
             "flags": "SYN,ACK",
             "sequence_number": self.tcp_connections[connection_key]["sequence_number"],
             "acknowledgment_number": self.tcp_connections[connection_key]["acknowledgment_number"],
-            "source_port": packet.header["destination_port"],
-            "destination_port": packet.header["source_port"]
+            "source_port": packet.header.destination_port,
+            "destination_port": packet.header.source_port
         }
         self._send_tcp_packet(
-            destination_ip=packet.header["source_ip"],
-            destination_mac=packet.header["source_mac"],
+            destination_ip=packet.header.source_ip,
+            destination_mac=packet.header.source_mac,
             data=b"",
             **control_packet_kwargs
         )
@@ -357,17 +360,17 @@ class Node:
         self.tcp_connections[connection_key]["sequence_number"] += 1
 
     def establish_TCP_connection(self, packet):
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
+        connection_key = (packet.header.source_ip, packet.header.source_port)
         if connection_key in self.tcp_connections:
             if self.tcp_connections[connection_key]['state'] == 'ESTABLISHED':
                 return
             else:
                 self.update_tcp_connection_state(connection_key, "ESTABLISHED")
-                self.tcp_connections[connection_key]["acknowledgment_number"] = packet.header["sequence_number"] + 1
+                self.tcp_connections[connection_key]["acknowledgment_number"] = packet.header.sequence_number + 1
 
     def send_TCP_ACK(self, packet):
         # コネクションキーを生成
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
+        connection_key = (packet.header.source_ip, packet.header.source_port)
 
         if connection_key in self.tcp_connections:
             # パラメータ設定
@@ -375,12 +378,12 @@ class Node:
                 "flags": "ACK",
                 "sequence_number": self.tcp_connections[connection_key]["sequence_number"],
                 "acknowledgment_number": self.tcp_connections[connection_key]["acknowledgment_number"],
-                "source_port": packet.header["destination_port"],
-                "destination_port": packet.header["source_port"]
+                "source_port": packet.header.destination_port,
+                "destination_port": packet.header.source_port
             }
             self._send_tcp_packet(
-                destination_ip=packet.header["source_ip"],
-                destination_mac=packet.header["source_mac"],
+                destination_ip=packet.header.source_ip,
+                destination_mac=packet.header.source_mac,
                 data=b"",
                 **control_packet_kwargs
             )
@@ -391,8 +394,8 @@ class Node:
     def terminate_TCP_connection(self, packet):
         # TCP接続を終了する処理
         if self.network_event_scheduler.tcp_verbose:
-            print(f"Terminating TCP connection with {packet.header['source_ip']}:{packet.header['source_port']}") 
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
+            print(f"Terminating TCP connection with {packet.header.source_ip}:{packet.header.source_port}") 
+        connection_key = (packet.header.source_ip, packet.header.source_port)
         if connection_key in self.tcp_connections:
             del self.tcp_connections[connection_key]
             print(f"TCP connection terminated with {connection_key}")
@@ -430,23 +433,23 @@ class Node:
 
     def process_data_packet(self, packet):
         # 'more_fragments'キーが存在しない場合はFalseをデフォルト値として使用
-        more_fragments = packet.header.get("fragment_flags", {}).get("more_fragments", False)
+        more_fragments = packet.header.fragment_flags.get("more_fragments", False)
 
         # フラグメントされたパケットの処理
         if more_fragments:
             self._store_fragment(packet)
         else:
             # original_data_idのチェックを追加
-            original_data_id = packet.header.get("fragment_flags", {}).get("original_data_id")
-            if original_data_id and original_data_id in self.fragmented_packets:
+            original_data_id = packet.header.fragment_flags.get("original_data_id")
+            if original_data_id is not None and original_data_id in self.fragmented_packets:
                 self._reassemble_and_process_packet(packet)
             else:
                 # フラグメントされていないパケットの処理
                 self.direct_process_packet(packet)
 
     def _store_fragment(self, fragment):
-        original_data_id = fragment.header["fragment_flags"]["original_data_id"]
-        offset = fragment.header["fragment_offset"]
+        original_data_id = fragment.header.fragment_flags["original_data_id"]
+        offset = fragment.header.fragment_offset
 
         if original_data_id not in self.fragmented_packets:
             self.fragmented_packets[original_data_id] = {}
@@ -462,7 +465,7 @@ class Node:
                 print(f"  Offset: {offset}, Size: {fragment_size}")
 
     def _reassemble_and_process_packet(self, last_fragment):
-        original_data_id = last_fragment.header["fragment_flags"]["original_data_id"]
+        original_data_id = last_fragment.header.fragment_flags["original_data_id"]
         if original_data_id not in self.fragmented_packets:
             self.network_event_scheduler.log_packet_info(last_fragment, "reassemble_failed_no_fragments", self.node_id)
             return
@@ -471,7 +474,7 @@ class Node:
         sorted_offsets = sorted(fragments.keys())
 
         # 再組み立てされたデータを結合して再構築
-        reassembled_data = b''.join(fragments[offset].payload for offset in sorted_offsets)
+        reassembled_data = join_payloads(fragments[offset].payload for offset in sorted_offsets)
 
         # 欠けているフラグメントをチェック
         total_data_length = sum(len(fragment.payload) for fragment in fragments.values())
@@ -520,9 +523,9 @@ class Node:
         # ARPリプライパケットを作成
         arp_reply_packet = ARPPacket(
             source_mac=self.mac_address,  # 送信元MACアドレスは自身のMACアドレス
-            destination_mac=request_packet.header["source_mac"],  # 宛先MACアドレスはARPリクエストの送信元MACアドレス
+            destination_mac=request_packet.header.source_mac,  # 宛先MACアドレスはARPリクエストの送信元MACアドレス
             source_ip=self.ip_address,  # 送信元IPアドレスは自身のIPアドレス
-            destination_ip=request_packet.header["source_ip"],  # 宛先IPアドレスはARPリクエストの送信元IPアドレス
+            destination_ip=request_packet.header.source_ip,  # 宛先IPアドレスはARPリクエストの送信元IPアドレス
             operation="reply",  # 操作は'reply'
             network_event_scheduler=self.network_event_scheduler
         )
@@ -585,7 +588,7 @@ class Node:
 
             connection_key = (destination_ip, kwargs.get('destination_port'))
             if connection_key not in self.tcp_connections:
-                self.initialize_connection_info(connection_key=connection_key, state='SYN_SENT', sequence_number=randint(1, 10000), acknowledgment_number=0, data=b'')
+                self.initialize_connection_info(connection_key=connection_key, state='SYN_SENT', sequence_number=self.tcp_random.randint(1, 10000), acknowledgment_number=0, data=b'')
 
             # SYNフラグをセットしてTCPパケットを送信
             control_packet_kwargs = {
@@ -619,7 +622,7 @@ class Node:
         self._send_ip_packet_data(destination_ip, destination_mac, data, header_size, protocol="UDP", **kwargs)
 
     def send_tcp_data_packet(self, packet):
-        connection_key = (packet.header["source_ip"], packet.header["source_port"])
+        connection_key = (packet.header.source_ip, packet.header.source_port)
         
         if connection_key in self.tcp_connections:
             if 'traffic_info' not in self.tcp_connections[connection_key]:
@@ -628,7 +631,7 @@ class Node:
                 return
 
             traffic_info = self.tcp_connections[connection_key]['traffic_info']
-            if self.network_event_scheduler.current_time < traffic_info['end_time']:
+            if self.network_event_scheduler.current_tick < traffic_info['end_time']:
                 # 送信するデータを取得
                 remaining_data = self.tcp_connections[connection_key]['data']
                 payload_size = traffic_info['payload_size']
@@ -636,8 +639,8 @@ class Node:
 
                 # パラメータ設定
                 data_packet_kwargs = {
-                    "source_port": packet.header["destination_port"],
-                    "destination_port": packet.header["source_port"],
+                    "source_port": packet.header.destination_port,
+                    "destination_port": packet.header.source_port,
                     "sequence_number": self.tcp_connections[connection_key]['sequence_number'],
                     "acknowledgment_number": self.tcp_connections[connection_key]['acknowledgment_number'],
                     "flags": "PSH"
@@ -645,8 +648,8 @@ class Node:
 
                 # パケットを送信
                 self._send_tcp_packet(
-                    destination_ip=packet.header["source_ip"],
-                    destination_mac=packet.header["source_mac"],
+                    destination_ip=packet.header.source_ip,
+                    destination_mac=packet.header.source_mac,
                     data=data_to_send,
                     **data_packet_kwargs
                 )
@@ -703,8 +706,9 @@ class Node:
         """
         IPパケットを送信するための内部メソッド。TCP/UDPの区別に応じて適切なパケットを生成します。
         """
-        original_data_id = str(uuid.uuid4())
-        total_size = len(data) if data else 0
+        original_data_id = self.network_event_scheduler.generate_packet_id()
+        data = as_payload(data)  # フラグメントの切り出しでデータをコピーしない
+        total_size = len(data)
         offset = 0
 
         while offset < total_size or (offset == 0 and total_size == 0):
@@ -782,50 +786,51 @@ class Node:
                 link.enqueue_packet(packet, self)
 
     def start_udp_traffic(self, destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness=1.0, protocol="UDP"):
-        def attempt_to_start_traffic():
-            destination_ip = self.resolve_destination_ip(destination_url)
-            if destination_ip is None:
-                # DNSレコードがない場合、DNSクエリを行い、レスポンスの受信後にトラフィックを開始するための処理をスケジュール
-                self.send_dns_query_and_set_traffic(destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol)
-            else:
-                # DNSレコードが既に存在する場合、直接トラフィック生成を開始
-                self.set_udp_traffic(destination_ip, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol)
-        
         # 最初のパケット生成（またはDNSレコードの検索処理）をstart_timeにスケジュール
-        self.network_event_scheduler.schedule_event(start_time, attempt_to_start_traffic)
+        self.network_event_scheduler.schedule_event(self.network_event_scheduler.to_ticks(start_time), self.attempt_to_start_udp_traffic, destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol)
+
+    def attempt_to_start_udp_traffic(self, destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol):
+        destination_ip = self.resolve_destination_ip(destination_url)
+        if destination_ip is None:
+            # DNSレコードがない場合、DNSクエリを行い、レスポンスの受信後にトラフィックを開始するための処理をスケジュール
+            self.send_dns_query_and_set_traffic(destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol)
+        else:
+            # DNSレコードが既に存在する場合、直接トラフィック生成を開始
+            self.set_udp_traffic(destination_ip, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol)
 
     def set_udp_traffic(self, destination_ip, bitrate, start_time, duration, header_size, payload_size, burstiness=1.0, protocol="UDP"):
-        end_time = start_time + duration
+        end_time = self.network_event_scheduler.to_ticks(start_time + duration)
         source_port = self.select_random_port()  # 利用可能なランダムなソースポートを選択
         destination_port = self.select_random_port()  # デスティネーションポートもランダムに選択
 
-        def generate_packet():
-            if self.network_event_scheduler.current_time < end_time:
-                # send_packetメソッドを使用してパケットを送信
-                data = b'X' * payload_size  # ダミーデータを生成
-                self.send_packet(destination_ip, data, protocol, source_port=source_port, destination_port=destination_port)
+        # 次のパケットまでのインターバル（イベントキューの時刻単位）
+        packet_size = header_size + payload_size
+        interval = self.network_event_scheduler.to_duration_ticks((packet_size * 8) / bitrate * burstiness)
+        self.network_event_scheduler.schedule_event(self.network_event_scheduler.current_tick, self.generate_udp_packet, destination_ip, payload_size, protocol, source_port, destination_port, end_time, interval)
 
-                # 次のパケットをスケジュールするためのインターバルを計算
-                packet_size = header_size + payload_size
-                interval = (packet_size * 8) / bitrate * burstiness
-                self.network_event_scheduler.schedule_event(self.network_event_scheduler.current_time + interval, generate_packet)
+    def generate_udp_packet(self, destination_ip, payload_size, protocol, source_port, destination_port, end_time, interval):
+        if self.network_event_scheduler.current_tick < end_time:
+            # send_packetメソッドを使用してパケットを送信
+            data = VirtualPayload(payload_size)  # ダミーデータ（長さだけを持つ仮想的なペイロード）
+            self.send_packet(destination_ip, data, protocol, source_port=source_port, destination_port=destination_port)
 
-        self.network_event_scheduler.schedule_event(self.network_event_scheduler.current_time, generate_packet)
+            # 次のパケットをスケジュール
+            self.network_event_scheduler.schedule_event(self.network_event_scheduler.current_tick + interval, self.generate_udp_packet, destination_ip, payload_size, protocol, source_port, destination_port, end_time, interval)
 
     def start_tcp_traffic(self, destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness=1.0, protocol="TCP"):
-        def attempt_to_start_traffic():
-            destination_ip = self.resolve_destination_ip(destination_url)
-            if destination_ip is None:
-                # DNSレコードがない場合、DNSクエリを行い、レスポンスの受信後にトラフィックを開始するための処理をスケジュール
-                self.send_dns_query_and_set_traffic(destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol="TCP")
-            else:
-                # DNSレコードが既に存在する場合、直接トラフィック生成を開始
-                self.set_tcp_traffic(destination_ip, bitrate, start_time, duration, header_size, payload_size, burstiness)
+        self.network_event_scheduler.schedule_event(self.network_event_scheduler.to_ticks(start_time), self.attempt_to_start_tcp_traffic, destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness)
 
-        self.network_event_scheduler.schedule_event(start_time, attempt_to_start_traffic)
+    def attempt_to_start_tcp_traffic(self, destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness):
+        destination_ip = self.resolve_destination_ip(destination_url)
+        if destination_ip is None:
+            # DNSレコードがない場合、DNSクエリを行い、レスポンスの受信後にトラフィックを開始するための処理をスケジュール
+            self.send_dns_query_and_set_traffic(destination_url, bitrate, start_time, duration, header_size, payload_size, burstiness, protocol="TCP")
+        else:
+            # DNSレコードが既に存在する場合、直接トラフィック生成を開始
+            self.set_tcp_traffic(destination_ip, bitrate, start_time, duration, header_size, payload_size, burstiness)
 
     def set_tcp_traffic(self, destination_ip, bitrate, start_time, duration, header_size, payload_size, burstiness=1.0, protocol="TCP"):
-        end_time = start_time + duration
+        end_time = self.network_event_scheduler.to_ticks(start_time + duration)
         source_port = self.select_random_port()
         destination_port = self.select_random_port()  # 実際のアプリケーションでは、適切な宛先ポートを指定する必要があります
         
@@ -834,8 +839,8 @@ class Node:
         
         # self.tcp_connectionsにコネクションキーが存在しない場合、新しく追加する
         if connection_key not in self.tcp_connections:
-            data = b'X' * (int(bitrate * duration) // 8)
-            self.initialize_connection_info(connection_key=connection_key, sequence_number=randint(1, 10000), data=data)
+            data = VirtualPayload(int(bitrate * duration) // 8)  # 転送するダミーデータ（長さだけを持つ）
+            self.initialize_connection_info(connection_key=connection_key, sequence_number=self.tcp_random.randint(1, 10000), data=data)
         
         # トラフィック情報をself.tcp_connectionsに保存
         self.tcp_connections[connection_key]['traffic_info'] = {
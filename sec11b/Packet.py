@@ -1,40 +1,128 @@
-import uuid
+import copy
+from collections.abc import Mapping
+
+class PacketHeader(Mapping):
+    """
+    MACヘッダとIPヘッダのフィールドを属性として平坦に持つヘッダ（packet.header.ttlのように読み書きする）。
+    従来の統合ヘッダの辞書と同じくpacket.header["ttl"]、packet.header.get("flags", "")でもアクセスでき、書き込みはパケットに反映される。
+    """
+    __slots__ = ("source_mac", "destination_mac", "source_ip", "destination_ip", "ttl", "fragment_flags", "fragment_offset")
+    fields = __slots__  # ヘッダが持つフィールド（サブクラスでTCP/UDPヘッダのフィールドを追加する）
+
+    def __init__(self, source_mac, destination_mac, source_ip, destination_ip, ttl, fragment_flags, fragment_offset):
+        self.source_mac = source_mac
+        self.destination_mac = destination_mac
+        self.source_ip = source_ip
+        self.destination_ip = destination_ip
+        self.ttl = ttl
+        self.fragment_flags = fragment_flags
+        self.fragment_offset = fragment_offset
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            # 値が設定されていないフィールドは従来の辞書と同じく存在しないキーとして扱う
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        # 値が設定されているフィールドだけを返す
+        return (field for field in self.fields if hasattr(self, field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        # 書き換え可能な複製
+        return copy.copy(self)
+
+    def freeze(self):
+        # 複数のパケットで共有する変更不可のヘッダ（MAC/IPヘッダのフィールドのみ）
+        return FrozenPacketHeader(*(getattr(self, field) for field in PacketHeader.fields))
+
+class FrozenPacketHeader(PacketHeader):
+    """
+    制御パケットのフライウェイト（ControlMessage）が複数のパケットで共有する変更不可のヘッダ。
+    書き換えるときはPacket.writable_header()またはPacket.copy()で書き換え可能な複製に置き換える（コピーオンライト）。
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.fields, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"共有ヘッダのフィールド {name} は変更できません。Packet.writable_header()で複製してから変更してください。")
+
+    def __setstate__(self, state):
+        # pickle・copyでの復元
+        for field, value in state[1].items():
+            object.__setattr__(self, field, value)
+
+    def copy(self):
+        return PacketHeader(*(getattr(self, field) for field in self.fields))
+
+    def freeze(self):
+        return self
+
+class TCPHeader(PacketHeader):
+    __slots__ = ("source_port", "destination_port", "sequence_number", "acknowledgment_number", "flags")
+    fields = PacketHeader.fields + __slots__
+
+class UDPHeader(PacketHeader):
+    __slots__ = ("source_port", "destination_port")
+    fields = PacketHeader.fields + __slots__
 
 class Packet:
+    """
+    パケットの基底クラス。大量に生成されるため__slots__でインスタンス辞書を持たず、スケジューラへの参照も保持しない
+    （network_event_schedulerはIDと生成時刻の取得にだけ使う）。サブクラスも属性を__slots__に宣言する。
+    """
+    __slots__ = ("id", "header", "size", "creation_time", "arrival_time", "flow_key", "payload")
+    header_class = PacketHeader
+
     def __init__(self, source_mac, destination_mac, source_ip, destination_ip, ttl, fragment_flags, fragment_offset, header_size, payload_size, network_event_scheduler):
-        self.network_event_scheduler = network_event_scheduler
-        self.id = str(uuid.uuid4())
-        # MACヘッダとIPヘッダを分割して管理
-        self.mac_header = {
-            "source_mac": source_mac,
-            "destination_mac": destination_mac
-        }
-        self.ip_header = {
-            "source_ip": source_ip,
-            "destination_ip": destination_ip,
-            "ttl": ttl,
-            "fragment_flags": fragment_flags,
-            "fragment_offset": fragment_offset
-        }
+        self.id = network_event_scheduler.generate_packet_id()  # スケジューラが割り当てる整数ID
+        self.header = self.header_class(source_mac, destination_mac, source_ip, destination_ip, ttl, fragment_flags, fragment_offset)
         self.size = header_size + payload_size
-        self.creation_time = self.network_event_scheduler.current_time
+        self.creation_time = network_event_scheduler.current_time
         self.arrival_time = None
-    
-    @property
-    def header(self):
-        # MACヘッダとIPヘッダを統合して返す
-        return {**self.mac_header, **self.ip_header}
+        self.flow_key = None  # 集計モード（FlowStatistics）で割り当てたフロー
+        self.payload = None
+
+    def writable_header(self):
+        # 共有ヘッダ（FrozenPacketHeader）なら複製に置き換えてから返す（コピーオンライト）
+        if type(self.header) is FrozenPacketHeader:
+            self.header = self.header.copy()
+        return self.header
 
     # MACヘッダを疑似的に除去するメソッド
     def remove_mac_header(self):
-        self.mac_header = {}
+        header = self.writable_header()
+        header.source_mac = None
+        header.destination_mac = None
 
     # MACヘッダを再付与するメソッド
     def add_mac_header(self, source_mac, destination_mac):
-        self.mac_header = {
-            "source_mac": source_mac,
-            "destination_mac": destination_mac
-        }
+        header = self.writable_header()
+        header.source_mac = source_mac
+        header.destination_mac = destination_mac
+
+    def copy(self):
+        # 書き換え可能なヘッダを持つパケットの複製（IDや生成時刻、ペイロードは共有する）
+        packet = copy.copy(self)
+        packet.header = self.header.copy()
+        return packet
 
     def set_arrived(self, arrival_time):
         self.arrival_time = arrival_time
@@ -42,41 +130,40 @@ class Packet:
     def __lt__(self, other):
         return False  # heapqでの比較のため
 
+    def get_mac_addresses(self):
+        # MACヘッダが除去されている場合は"不明"
+        source_mac = self.header.source_mac if self.header.source_mac is not None else "不明"
+        destination_mac = self.header.destination_mac if self.header.destination_mac is not None else "不明"
+        return source_mac, destination_mac
+
     def __str__(self):
-        source_mac = self.mac_header.get("source_mac", "不明")
-        destination_mac = self.mac_header.get("destination_mac", "不明")
-        return f'パケット(送信元MAC: {source_mac}, 宛先MAC: {destination_mac}, 送信元IP: {self.ip_header["source_ip"]}, 宛先IP: {self.ip_header["destination_ip"]}, TTL: {self.ip_header["ttl"]}, フラグメントフラグ: {self.ip_header["fragment_flags"]}, フラグメントオフセット: {self.ip_header["fragment_offset"]}, ペイロード: {self.payload})'
+        source_mac, destination_mac = self.get_mac_addresses()
+        return f'パケット(送信元MAC: {source_mac}, 宛先MAC: {destination_mac}, 送信元IP: {self.header.source_ip}, 宛先IP: {self.header.destination_ip}, TTL: {self.header.ttl}, フラグメントフラグ: {self.header.fragment_flags}, フラグメントオフセット: {self.header.fragment_offset}, ペイロード: {self.payload})'
 
 class TCPPacket(Packet):
+    __slots__ = ()
+    header_class = TCPHeader  # MACヘッダ、IPヘッダ、TCPヘッダのフィールドを持つ
+
     def __init__(self, source_port, destination_port, sequence_number, acknowledgment_number, flags, **kwargs):
         super().__init__(**kwargs)
-        self.tcp_header = {
-            "source_port": source_port,
-            "destination_port": destination_port,
-            "sequence_number": sequence_number,
-            "acknowledgment_number": acknowledgment_number,
-            "flags": flags
-        }
-
-    @property
-    def header(self):
-        # MACヘッダ、IPヘッダ、TCPヘッダを統合して返す
-        return {**self.mac_header, **self.ip_header, **self.tcp_header}
+        self.header.source_port = source_port
+        self.header.destination_port = destination_port
+        self.header.sequence_number = sequence_number
+        self.header.acknowledgment_number = acknowledgment_number
+        self.header.flags = flags
 
 class UDPPacket(Packet):
+    __slots__ = ()
+    header_class = UDPHeader  # MACヘッダ、IPヘッダ、UDPヘッダのフィールドを持つ
+
     def __init__(self, source_port, destination_port, **kwargs):
         super().__init__(**kwargs)
-        self.udp_header = {
-            "source_port": source_port,
-            "destination_port": destination_port
-        }
-
-    @property
-    def header(self):
-        # MACヘッダ、IPヘッダ、UDPヘッダを統合して返す
-        return {**self.mac_header, **self.ip_header, **self.udp_header}
+        self.header.source_port = source_port
+        self.header.destination_port = destination_port
 
 class ARPPacket(Packet):
+    __slots__ = ()
+
     def __init__(self, source_mac, destination_mac, source_ip, destination_ip, operation, network_event_scheduler):
         super().__init__(
             source_mac=source_mac,
@@ -99,9 +186,11 @@ class ARPPacket(Packet):
 
     def __str__(self):
         # ARPパケットの情報を文字列で返す
-        return f'ARPPacket(送信元MAC: {self.mac_header["source_mac"]}, 宛先MAC: {self.mac_header["destination_mac"]}, 操作: {self.payload["operation"]})'
+        return f'ARPPacket(送信元MAC: {self.header.source_mac}, 宛先MAC: {self.header.destination_mac}, 操作: {self.payload["operation"]})'
 
 class DNSPacket(Packet):
+    __slots__ = ("query_domain", "query_type", "dns_data")
+
     def __init__(self, source_mac, destination_mac, source_ip, destination_ip, query_domain, query_type, network_event_scheduler):
         super().__init__(
             source_mac=source_mac,
@@ -120,11 +209,12 @@ class DNSPacket(Packet):
         self.dns_data = {}
 
     def __str__(self):
-        source_mac = self.mac_header.get("source_mac", "不明")
-        destination_mac = self.mac_header.get("destination_mac", "不明")
-        return f'DNSPacket(送信元MAC: {source_mac}, 宛先MAC: {destination_mac}, 送信元IP: {self.ip_header["source_ip"]}, 宛先IP: {self.ip_header["destination_ip"]}, Query Domain: {self.query_domain}, Query Type: {self.query_type})'
+        source_mac, destination_mac = self.get_mac_addresses()
+        return f'DNSPacket(送信元MAC: {source_mac}, 宛先MAC: {destination_mac}, 送信元IP: {self.header.source_ip}, 宛先IP: {self.header.destination_ip}, Query Domain: {self.query_domain}, Query Type: {self.query_type})'
 
 class DHCPPacket(Packet):
+    __slots__ = ("message_type", "dhcp_data")
+
     def __init__(self, source_mac, destination_mac, source_ip, destination_ip, message_type, network_event_scheduler):
         super().__init__(
             source_mac=source_mac,
@@ -142,11 +232,12 @@ class DHCPPacket(Packet):
         self.dhcp_data = {}
 
     def __str__(self):
-        source_mac = self.mac_header.get("source_mac", "不明")
-        destination_mac = self.mac_header.get("destination_mac", "不明")
-        return f'DHCPPacket(送信元MAC: {source_mac}, 宛先MAC: {destination_mac}, 送信元IP: {self.ip_header["source_ip"]}, 宛先IP: {self.ip_header["destination_ip"]}, Message Type: {self.message_type})'
+        source_mac, destination_mac = self.get_mac_addresses()
+        return f'DHCPPacket(送信元MAC: {source_mac}, 宛先MAC: {destination_mac}, 送信元IP: {self.header.source_ip}, 宛先IP: {self.header.destination_ip}, Message Type: {self.message_type})'
 
 class BPDU(Packet):
+    __slots__ = ()
+
     def __init__(self, source_mac, destination_mac, root_id, bridge_id, path_cost, network_event_scheduler):
         super().__init__(
             source_mac=source_mac, 
@@ -163,9 +254,11 @@ class BPDU(Packet):
         }
 
     def __str__(self):
-        return f'BPDU(送信元: {self.header["source_mac"]}, 宛先: {self.header["destination_mac"]}, ルートID: {self.payload["root_id"]}, ブリッジID: {self.payload["bridge_id"]}, パスコスト: {self.payload["path_cost"]})'
+        return f'BPDU(送信元: {self.header.source_mac}, 宛先: {self.header.destination_mac}, ルートID: {self.payload["root_id"]}, ブリッジID: {self.payload["bridge_id"]}, パスコスト: {self.payload["path_cost"]})'
 
 class HelloPacket(Packet):
+    __slots__ = ()
+
     def __init__(self, source_mac, source_ip, network_mask, router_id, hello_interval, neighbors, network_event_scheduler):
         super().__init__(
             source_mac=source_mac,
@@ -186,9 +279,11 @@ class HelloPacket(Packet):
         }
 
     def __str__(self):
-        return f'HelloPacket(送信元MAC: {self.header["source_mac"]}, 宛先MAC: {self.header["destination_mac"]}, 送信元IP: {self.header["source_ip"]}, ネットワークマスク: {self.payload["network_mask"]}, ルータID: {self.payload["router_id"]}, Helloインターバル: {self.payload["hello_interval"]}, 隣接ルータ: {self.payload["neighbors"]})'
+        return f'HelloPacket(送信元MAC: {self.header.source_mac}, 宛先MAC: {self.header.destination_mac}, 送信元IP: {self.header.source_ip}, ネットワークマスク: {self.payload["network_mask"]}, ルータID: {self.payload["router_id"]}, Helloインターバル: {self.payload["hello_interval"]}, 隣接ルータ: {self.payload["neighbors"]})'
 
 class LSAPacket(Packet):
+    __slots__ = ()
+
     def __init__(self, source_mac, source_ip, router_id, sequence_number, link_state_info, network_event_scheduler):
         super().__init__(
             source_mac=source_mac,
@@ -207,4 +302,31 @@ class LSAPacket(Packet):
             "link_state_info": link_state_info
         }
     def __str__(self):
-        return f'LSAPacket(送信元MAC: {self.header["source_mac"]}, 送信元IP: {self.header["source_ip"]}, トポロジ情報: {self.payload["link_state_info"]})'
+        return f'LSAPacket(送信元MAC: {self.header.source_mac}, 送信元IP: {self.header.source_ip}, トポロジ情報: {self.payload["link_state_info"]})'
+
+class ControlMessage:
+    """
+    定期的に送る制御パケット（Hello/LSA/BPDU）のフライウェイト。ヘッダ（FrozenPacketHeader）とペイロードを
+    インタフェースや送信周期をまたいで共有し、内容が変わったときだけ作り直す。
+    リンクでの損失や受信ログは送信ごとに区別する必要があるため、instantiate()でID・生成時刻・到着時刻だけを持つパケットを作る。
+    ペイロードは送信済みのパケットとも共有されるので、変更せずに新しい辞書に置き換えること。
+    """
+    __slots__ = ("packet_class", "header", "payload", "size")
+
+    def __init__(self, packet):
+        # 雛形のパケットからヘッダとペイロードを取り出す
+        self.packet_class = type(packet)
+        self.header = packet.header.freeze()
+        self.payload = packet.payload
+        self.size = packet.size
+
+    def instantiate(self, network_event_scheduler):
+        packet = self.packet_class.__new__(self.packet_class)
+        packet.id = network_event_scheduler.generate_packet_id()
+        packet.header = self.header
+        packet.size = self.size
+        packet.creation_time = network_event_scheduler.current_time
+        packet.arrival_time = None
+        packet.flow_key = None
+        packet.payload = self.payload
+        return packet
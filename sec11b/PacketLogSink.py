@@ -0,0 +1,237 @@
+import math
+import numpy as np
+from sec11b.PacketLogStore import PACKET_DTYPE, PacketLogStore, ValueTable
+
+# ストリーミング出力するイベント1つ分のレコード（パケットの情報も毎回含めるので、書き込み側はパケットごとの状態を持たない）
+# 文字列の列は値の番号（番号0はNone）、arrival_timeは記録時点のパケットの値（未到着ならNaN）
+LOG_RECORD_DTYPE = np.dtype([
+    ("time", "f8"),
+    ("packet_id", "u8"),
+    ("packet_type", "u4"),
+    ("event", "u4"),
+    ("node_id", "u4"),
+    ("source_mac", "u4"),
+    ("destination_mac", "u4"),
+    ("source_ip", "u4"),
+    ("destination_ip", "u4"),
+    ("size", "i8"),
+    ("creation_time", "f8"),
+    ("arrival_time", "f8")
+])
+
+class PacketLogSink:
+    """
+    パケットログをバッチ単位でファイルに書き出す（NetworkEventScheduler(log_enabled=PacketLogSink(path))として使う）。
+    メモリに保持するのは書き込み前の1バッチと値の対応表だけなので、長時間のシミュレーションでもログがメモリに収まる必要はない。
+
+    ファイルはバッチを順に並べたもので、各バッチはNPY形式（numpy.lib.format）の配列2つからなる。
+      1. 前のバッチ以降に番号を割り当てた値の配列（Unicode文字列、番号順。番号0はNoneで書き出さない）
+      2. LOG_RECORD_DTYPEのレコード配列（記録順）
+    読み出しにはPacketLogReaderを使う。
+    """
+    def __init__(self, path, batch_size=65536):
+        self.path = path
+        self.batch_size = batch_size
+        self.file = open(path, "wb")
+        self.values = ValueTable()
+        self.values.intern(None)
+        self.written_values = 1  # ファイルに書き出した値の数
+        self.batch = np.empty(batch_size, LOG_RECORD_DTYPE)
+        self.batch_length = 0
+
+    @property
+    def addresses(self):
+        return self.values
+
+    @property
+    def packet_types(self):
+        return self.values
+
+    def log(self, packet, event_type, node_id, time):
+        header = packet.header
+        intern = self.values.intern
+        self.batch[self.batch_length] = (
+            time,
+            packet.id,
+            intern(type(packet).__name__),
+            intern(event_type),
+            intern(node_id),
+            intern(header.source_mac),
+            intern(header.destination_mac),
+            intern(header.source_ip),
+            intern(header.destination_ip),
+            packet.size,
+            packet.creation_time,
+            time if event_type == "arrived" else math.nan if packet.arrival_time is None else packet.arrival_time
+        )
+        self.batch_length += 1
+        if self.batch_length == self.batch_size:
+            self.flush()
+
+    def create_empty(self):
+        # 並列実行のワーカーはメモリ上に記録する（出力は親プロセスがログを集約するときに行う）
+        return PacketLogStore()
+
+    def write_records(self, records):
+        values = np.array([str(value) for value in self.values.values[self.written_values:]], dtype=str)
+        np.lib.format.write_array(self.file, values, allow_pickle=False)
+        np.lib.format.write_array(self.file, records, allow_pickle=False)
+        self.file.flush()
+        self.written_values = len(self.values)
+
+    def flush(self):
+        # 書き込み前のレコードをファイルに書き出す
+        if self.batch_length:
+            self.write_records(self.batch[:self.batch_length])
+            self.batch_length = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def merge(self, packet_logs):
+        """他のプロセスで記録されたパケットログ（PacketLogStore）を書き出す"""
+        self.flush()
+        packets = packet_logs.packet_array()
+        events = packet_logs.event_array()
+        rows = packets[events["packet"]]
+        records = np.empty(len(events), LOG_RECORD_DTYPE)
+        records["time"] = events["time"]
+        records["packet_id"] = np.array(packet_logs.packet_ids, dtype="u8")[events["packet"]]
+        records["packet_type"] = np.array([self.values.intern(value) for value in packet_logs.packet_types.values], dtype="u4")[rows["packet_type"]]
+        records["event"] = np.array([self.values.intern(value) for value in packet_logs.event_types.values], dtype="u4")[events["event"]]
+        records["node_id"] = np.array([self.values.intern(value) for value in packet_logs.node_ids.values], dtype="u4")[events["node_id"]]
+        address_codes = np.array([self.values.intern(value) for value in packet_logs.addresses.values], dtype="u4")
+        records["source_mac"] = address_codes[rows["source_mac"]]
+        records["destination_mac"] = address_codes[rows["destination_mac"]]
+        records["source_ip"] = address_codes[events["src"]]
+        records["destination_ip"] = address_codes[events["dst"]]
+        records["size"] = rows["size"]
+        records["creation_time"] = rows["creation_time"]
+        records["arrival_time"] = rows["arrival_time"]
+        if len(records):
+            self.write_records(records)
+
+    def packet_array(self):
+        # 書き出し済みのファイルからパケットごとの列を組み立てる
+        self.flush()
+        return PacketLogReader(self.path).packet_array()
+
+    def __getstate__(self):
+        # チェックポイントにはファイルの書き込み位置を保存し、復元時にその位置より後を切り捨てて追記を再開する
+        state = self.__dict__.copy()
+        state["file"] = self.file.tell()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.file = open(self.path, "r+b")
+        self.file.truncate(state["file"])
+        self.file.seek(state["file"])
+
+class PacketLogReader:
+    """
+    PacketLogSinkが書き出したファイルを先頭から順に読む。
+    batches()はレコード配列をバッチごとに、イテレータとしてはイベントを1つずつ辞書で返し、ファイル全体をメモリに読み込むことはない。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.values = [None]  # 値の番号 -> 値（すべての列で共通）
+
+    @property
+    def addresses(self):
+        return self.values
+
+    @property
+    def packet_types(self):
+        return self.values
+
+    def batches(self):
+        self.values = [None]
+        with open(self.path, "rb") as file:
+            while file.peek(1):
+                self.values.extend(np.lib.format.read_array(file, allow_pickle=False).tolist())
+                yield np.lib.format.read_array(file, allow_pickle=False)
+
+    def __iter__(self):
+        for records in self.batches():
+            values = self.values
+            for record in records.tolist():
+                time, packet_id, packet_type, event, node_id, source_mac, destination_mac, source_ip, destination_ip, size, creation_time, arrival_time = record
+                yield {
+                    "time": time,
+                    "event": values[event],
+                    "node_id": values[node_id],
+                    "packet_id": packet_id,
+                    "packet_type": values[packet_type],
+                    "src": values[source_ip],
+                    "dst": values[destination_ip],
+                    "size": size,
+                    "creation_time": creation_time
+                }
+
+    def items(self):
+        """
+        PacketLogStore.items()と同じ形式の(パケットID, ログ)を、パケットが最初に記録された順に返す（print_packet_logs用）。
+        イベントをパケットごとにまとめるため、ファイル全体のイベントをメモリに読み込む。
+        """
+        logs = {}
+        for records in self.batches():
+            values = self.values
+            for record in records.tolist():
+                time, packet_id, packet_type, event, node_id, source_mac, destination_mac, source_ip, destination_ip, size, creation_time, arrival_time = record
+                log = logs.get(packet_id)
+                if log is None:
+                    log = logs[packet_id] = {
+                        "packet_type": values[packet_type],
+                        "source_mac": values[source_mac],
+                        "destination_mac": values[destination_mac],
+                        "source_ip": values[source_ip],
+                        "destination_ip": values[destination_ip],
+                        "size": size,
+                        "creation_time": creation_time,
+                        "arrival_time": None,
+                        "events": []
+                    }
+                if values[event] == "arrived":
+                    log["arrival_time"] = time
+                elif log["arrival_time"] is None and not math.isnan(arrival_time):
+                    log["arrival_time"] = arrival_time
+                log["events"].append({
+                    "time": time,
+                    "event": values[event],
+                    "node_id": values[node_id],
+                    "packet_id": packet_id,
+                    "src": values[source_ip],
+                    "dst": values[destination_ip]
+                })
+        for packet_id, log in logs.items():
+            # 並列実行のワーカーから集約したイベントは時刻順に並んでいない
+            log["events"].sort(key=lambda event: event["time"])
+            yield packet_id, log
+
+    def packet_array(self):
+        """
+        パケットごとの列（PACKET_DTYPE、値の番号はvaluesの番号）を返す。集計関数はこの列を読む。
+        パケットの情報は最初に記録されたイベントの値、arrival_timeは到着を記録したイベントの最も遅い時刻（なければ最初のイベントの値）。
+        """
+        rows = {}  # パケットID -> [最初のイベントの時刻, 到着時刻, PACKET_DTYPEの値]
+        for records in self.batches():
+            records = records[np.argsort(records["time"], kind="stable")]
+            packet_ids, first_indices = np.unique(records["packet_id"], return_index=True)
+            for packet_id, record in zip(packet_ids.tolist(), records[first_indices].tolist()):
+                row = rows.get(packet_id)
+                if row is None or record[0] < row[0]:
+                    rows[packet_id] = [record[0], row[1] if row is not None else None, record[2]] + list(record[5:])
+            arrived = records[records["event"] == self.values.index("arrived")] if "arrived" in self.values else records[:0]
+            for packet_id, time in zip(arrived["packet_id"].tolist(), arrived["time"].tolist()):
+                # 並列実行のワーカーのログは統合した順に並ぶため、ファイルの後ろにあるとは限らない最後の到着を選ぶ
+                if rows[packet_id][1] is None or time > rows[packet_id][1]:
+                    rows[packet_id][1] = time
+
+        packets = np.empty(len(rows), PACKET_DTYPE)
+        for index, (_, arrival_time, *row) in enumerate(rows.values()):
+            if arrival_time is not None:
+                row[-1] = arrival_time
+            packets[index] = tuple(row)
+        return packets
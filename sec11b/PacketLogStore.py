@@ -0,0 +1,303 @@
+import math
+from collections.abc import Mapping
+import numpy as np
+
+# パケット1つにつき1行（コード列はValueTableの番号、arrival_timeは未到着ならNaN、失われたら-1）
+PACKET_DTYPE = np.dtype([
+    ("packet_type", "u2"),
+    ("source_mac", "u4"),
+    ("destination_mac", "u4"),
+    ("source_ip", "u4"),
+    ("destination_ip", "u4"),
+    ("size", "i8"),
+    ("creation_time", "f8"),
+    ("arrival_time", "f8")
+])
+
+# 記録したイベント1つにつき1行（packetはパケット行の番号）
+EVENT_DTYPE = np.dtype([
+    ("time", "f8"),
+    ("packet", "u4"),
+    ("event", "u2"),
+    ("node_id", "u4"),
+    ("src", "u4"),
+    ("dst", "u4")
+])
+
+class ValueTable:
+    """パケットタイプ・ノードID・イベント種別・アドレスなどの値を小さな整数に対応付ける"""
+    def __init__(self):
+        self.codes = {}  # 値 -> 番号
+        self.values = []  # 番号 -> 値
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+class ChunkedTable:
+    """固定長のNumPyレコード配列（チャンク）を追加していく追記専用の表"""
+    def __init__(self, dtype, chunk_size):
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, row):
+        offset = self.length % self.chunk_size
+        if offset == 0:
+            self.chunks.append(np.empty(self.chunk_size, self.dtype))
+        self.chunks[-1][offset] = row
+        self.length += 1
+
+    def get(self, index, field):
+        return self.chunks[index // self.chunk_size][field][index % self.chunk_size]
+
+    def set(self, index, field, value):
+        self.chunks[index // self.chunk_size][field][index % self.chunk_size] = value
+
+    def extend(self, rows):
+        # レコード配列をチャンク単位でまとめて書き込む
+        start = 0
+        while start < len(rows):
+            offset = self.length % self.chunk_size
+            if offset == 0:
+                self.chunks.append(np.empty(self.chunk_size, self.dtype))
+            count = min(self.chunk_size - offset, len(rows) - start)
+            self.chunks[-1][offset:offset + count] = rows[start:start + count]
+            self.length += count
+            start += count
+
+    def truncate(self, length):
+        # length行目以降を取り除く
+        self.length = min(self.length, length)
+        del self.chunks[-(-self.length // self.chunk_size):]
+
+    def to_array(self):
+        if not self.chunks:
+            return np.empty(0, self.dtype)
+        return np.concatenate(self.chunks)[:self.length]
+
+    def __getstate__(self):
+        # 最後のチャンクの未使用部分は保存しない
+        state = self.__dict__.copy()
+        if self.chunks:
+            state["chunks"] = self.chunks[:-1] + [self.chunks[-1][:self.length - (len(self.chunks) - 1) * self.chunk_size].copy()]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.chunks:
+            last_chunk = np.empty(self.chunk_size, self.dtype)
+            last_chunk[:len(self.chunks[-1])] = self.chunks[-1]
+            self.chunks[-1] = last_chunk
+
+class PacketLogStore(Mapping):
+    """
+    パケットログを列指向で保持する。パケットとイベントをそれぞれNumPyレコード配列のチャンクに追記し、
+    パケットタイプ・ノードID・イベント種別・アドレスは整数に置き換えて記録する。
+    集計やグラフはpacket_array()/event_array()の列を直接読む。
+    従来のパケットIDをキーとする辞書としても読める（store[packet_id]で{"packet_type": ..., "events": [...]}を組み立てて返す）。
+    """
+    def __init__(self, chunk_size=4096):
+        self.chunk_size = chunk_size
+        self.packets = ChunkedTable(PACKET_DTYPE, chunk_size)
+        self.events = ChunkedTable(EVENT_DTYPE, chunk_size)
+        self.packet_types = ValueTable()
+        self.event_types = ValueTable()
+        self.node_ids = ValueTable()
+        self.addresses = ValueTable()  # MACアドレスとIPアドレス
+        self.packet_ids = []  # パケット行の番号 -> パケットID
+        self.packet_index = {}  # パケットID -> パケット行の番号
+        self.arrival_undo_log = None  # arrival_timeの変更履歴 (パケット行の番号, 変更前の値)（enable_undoで有効になる）
+        self.arrival_undo_base = 0  # arrival_undo_log[0]の通し番号
+
+    def log(self, packet, event_type, node_id, time):
+        header = packet.header
+        index = self.packet_index.get(packet.id)
+        if index is None:
+            index = len(self.packet_ids)
+            self.packet_index[packet.id] = index
+            self.packet_ids.append(packet.id)
+            self.packets.append((
+                self.packet_types.intern(type(packet).__name__),  # パケットのクラス名を記録
+                self.addresses.intern(header.source_mac),
+                self.addresses.intern(header.destination_mac),
+                self.addresses.intern(header.source_ip),
+                self.addresses.intern(header.destination_ip),
+                packet.size,
+                packet.creation_time,
+                math.nan if packet.arrival_time is None else packet.arrival_time
+            ))
+
+        if event_type == "arrived":
+            if self.arrival_undo_log is not None:
+                self.arrival_undo_log.append((index, self.packets.get(index, "arrival_time")))
+            self.packets.set(index, "arrival_time", time)
+
+        self.events.append((
+            time,
+            index,
+            self.event_types.intern(event_type),
+            self.node_ids.intern(node_id),
+            self.addresses.intern(header.source_ip),
+            self.addresses.intern(header.destination_ip)
+        ))
+
+    def create_empty(self):
+        return PacketLogStore(self.chunk_size)
+
+    def packet_array(self):
+        return self.packets.to_array()
+
+    def event_array(self):
+        return self.events.to_array()
+
+    def enable_undo(self):
+        # 記録の取り消し（mark/truncate）に必要なarrival_timeの変更履歴を残す
+        self.arrival_undo_log = []
+        self.arrival_undo_base = 0
+
+    def mark(self):
+        # 現在の記録位置（truncateでこの位置まで戻せる）
+        return len(self.packets), len(self.events), self.arrival_undo_base + len(self.arrival_undo_log)
+
+    def truncate(self, mark):
+        # markより後の記録を取り除く
+        num_packets, num_events, undo_length = mark
+        while self.arrival_undo_base + len(self.arrival_undo_log) > undo_length:
+            index, arrival_time = self.arrival_undo_log.pop()
+            if index < num_packets:
+                self.packets.set(index, "arrival_time", arrival_time)
+        while len(self.packet_ids) > num_packets:
+            del self.packet_index[self.packet_ids.pop()]
+        self.packets.truncate(num_packets)
+        self.events.truncate(num_events)
+
+    def discard_undo_log(self, mark):
+        # mark以前の変更履歴は取り消しに使われないので捨てる
+        undo_length = mark[2]
+        del self.arrival_undo_log[:undo_length - self.arrival_undo_base]
+        self.arrival_undo_base = max(self.arrival_undo_base, undo_length)
+
+    def first_event_times(self, events=None):
+        # パケットごとの最初のイベント時刻
+        events = self.event_array() if events is None else events
+        first_times = np.full(len(self.packets), np.inf)
+        np.minimum.at(first_times, events["packet"], events["time"])
+        return first_times
+
+    def arrived_packets(self, events=None):
+        # "arrived"イベントが記録されたパケット
+        events = self.event_array() if events is None else events
+        arrived = np.zeros(len(self.packets), dtype=bool)
+        code = self.event_types.codes.get("arrived")
+        if code is not None:
+            arrived[events["packet"][events["event"] == code]] = True
+        return arrived
+
+    def merge(self, other):
+        """他のプロセスで記録されたパケットログを統合する"""
+        other_packets = other.packet_array()
+        other_events = other.event_array()
+        address_codes = np.array([self.addresses.intern(value) for value in other.addresses.values], dtype="u4")
+        packet_type_codes = np.array([self.packet_types.intern(value) for value in other.packet_types.values], dtype="u2")
+
+        # arrival_timeは到着を記録したログの最も遅い到着時刻（ブロードキャストが複数のパーティションのノードに届いた場合も最後の到着）、
+        # 到着していなければ最初に記録されたログの初期値（逐次実行と同じ）
+        events = self.event_array()
+        first_times = self.first_event_times(events)
+        arrived = self.arrived_packets(events)
+        other_first_times = other.first_event_times(other_events)
+        other_arrived = other.arrived_packets(other_events)
+
+        packet_codes = np.empty(len(other.packet_ids), dtype="u4")
+        new_rows = []
+        for other_index, packet_id in enumerate(other.packet_ids):
+            index = self.packet_index.get(packet_id)
+            if index is None:
+                index = len(self.packet_ids)
+                self.packet_index[packet_id] = index
+                self.packet_ids.append(packet_id)
+                new_rows.append(other_index)
+            elif other_arrived[other_index]:
+                if not arrived[index] or other_packets["arrival_time"][other_index] > self.packets.get(index, "arrival_time"):
+                    self.packets.set(index, "arrival_time", other_packets["arrival_time"][other_index])
+            elif not arrived[index] and other_first_times[other_index] < first_times[index]:
+                self.packets.set(index, "arrival_time", other_packets["arrival_time"][other_index])
+            packet_codes[other_index] = index
+
+        rows = other_packets[new_rows]
+        rows["packet_type"] = packet_type_codes[rows["packet_type"]]
+        for field in ("source_mac", "destination_mac", "source_ip", "destination_ip"):
+            rows[field] = address_codes[rows[field]]
+        self.packets.extend(rows)
+
+        other_events["packet"] = packet_codes[other_events["packet"]]
+        other_events["event"] = np.array([self.event_types.intern(value) for value in other.event_types.values], dtype="u2")[other_events["event"]]
+        other_events["node_id"] = np.array([self.node_ids.intern(value) for value in other.node_ids.values], dtype="u4")[other_events["node_id"]]
+        other_events["src"] = address_codes[other_events["src"]]
+        other_events["dst"] = address_codes[other_events["dst"]]
+        self.events.extend(other_events)
+
+    def build_log(self, index, packet, events):
+        arrival_time = float(packet["arrival_time"])
+        packet_id = self.packet_ids[index]
+        return {
+            "packet_type": self.packet_types[packet["packet_type"]],
+            "source_mac": self.addresses[packet["source_mac"]],
+            "destination_mac": self.addresses[packet["destination_mac"]],
+            "source_ip": self.addresses[packet["source_ip"]],
+            "destination_ip": self.addresses[packet["destination_ip"]],
+            "size": int(packet["size"]),
+            "creation_time": float(packet["creation_time"]),
+            "arrival_time": None if math.isnan(arrival_time) else arrival_time,
+            "events": [{
+                "time": float(event["time"]),
+                "event": self.event_types[event["event"]],
+                "node_id": self.node_ids[event["node_id"]],
+                "packet_id": packet_id,
+                "src": self.addresses[event["src"]],
+                "dst": self.addresses[event["dst"]]
+            } for event in events]
+        }
+
+    def __getitem__(self, packet_id):
+        index = self.packet_index[packet_id]
+        events = self.event_array()
+        events = events[events["packet"] == index]
+        return self.build_log(index, self.packets.chunks[index // self.chunk_size][index % self.chunk_size], events[np.argsort(events["time"], kind="stable")])
+
+    def __iter__(self):
+        return iter(self.packet_ids)
+
+    def __len__(self):
+        return len(self.packet_ids)
+
+    def __contains__(self, packet_id):
+        return packet_id in self.packet_index
+
+    def items(self):
+        # イベントをパケットごと・時刻順に並べ替えてから1パケットずつ組み立てる
+        packets = self.packet_array()
+        events = self.event_array()
+        events = events[np.lexsort((events["time"], events["packet"]))]
+        bounds = np.searchsorted(events["packet"], np.arange(len(packets) + 1))
+        for index, packet_id in enumerate(self.packet_ids):
+            yield packet_id, self.build_log(index, packets[index], events[bounds[index]:bounds[index + 1]])
+
+    def values(self):
+        for _, log in self.items():
+            yield log
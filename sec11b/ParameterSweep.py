@@ -0,0 +1,95 @@
+import os
+import hashlib
+import inspect
+import pickle
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from sec11b.ReplicationRunner import run_replication, aggregate_summaries
+
+class ParameterSweep:
+    """
+    シナリオのテンプレートをパラメータグリッドの全組み合わせ × シードで実行するパラメータスイープ。
+    build_scenario(seed, **parameters)はパラメータ（リンクのbandwidth/delay/loss_rate、set_udp_trafficのbitrate/payload_size/burstinessなど）を
+    受け取ってシナリオを構築したNetworkEventSchedulerを返すモジュールレベルの関数。
+    各（シナリオのハッシュ, パラメータ, シード）の結果はcache_dirに保存され、再実行時は未計算の点だけをプロセスプールで計算する。
+    シナリオのハッシュはbuild_scenarioのソースコード・end_time・packet_types・scenario_versionから求めるため、
+    テンプレートを書き換えると全点が再計算される（テンプレートが呼ぶ関数を変更した場合はscenario_versionを変える）。
+    """
+    def __init__(self, build_scenario, grid, seeds=(0,), end_time=None, packet_types=("UDPPacket", "TCPPacket"), cache_dir=".sweep_cache", scenario_version=None, confidence=0.95, max_workers=None):
+        self.build_scenario = build_scenario
+        self.grid = grid  # パラメータ名 -> 値のリスト
+        self.seeds = list(seeds)
+        self.end_time = end_time
+        self.packet_types = packet_types
+        self.cache_dir = cache_dir
+        self.scenario_version = scenario_version
+        self.confidence = confidence
+        self.max_workers = max_workers
+        self.computed_runs = 0  # 直近のrunで新たに計算した実行数（キャッシュにあった点は含まない）
+        self.scenario_hash = self.compute_scenario_hash()
+
+    def compute_scenario_hash(self):
+        try:
+            source = inspect.getsource(self.build_scenario)
+        except (OSError, TypeError):
+            source = f"{self.build_scenario.__module__}.{self.build_scenario.__qualname__}"
+        return hashlib.sha256(repr((source, self.end_time, tuple(self.packet_types), self.scenario_version)).encode()).hexdigest()
+
+    def get_points(self):
+        # グリッドの全組み合わせ（パラメータ名 -> 値の辞書）
+        names = list(self.grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(self.grid[name] for name in names))]
+
+    def get_cache_path(self, parameters, seed):
+        key = hashlib.sha256(repr((self.scenario_hash, sorted(parameters.items()), seed)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def load_cached(self, parameters, seed):
+        path = self.get_cache_path(parameters, seed)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def store(self, parameters, seed, summary):
+        # 途中で中断しても壊れたキャッシュが残らないよう、一時ファイルに書いてから置き換える
+        path = self.get_cache_path(parameters, seed)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(summary, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def run(self):
+        """
+        スイープを実行し、(パラメータの辞書, 集計結果)のリストをグリッドの順に返す。
+        集計結果はReplicationRunner.runと同じ形式（シード間の平均と信頼区間）。
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        points = self.get_points()
+        summaries = {}  # (点の番号, シード) -> 集計値
+        pending = []
+        for index, parameters in enumerate(points):
+            for seed in self.seeds:
+                summary = self.load_cached(parameters, seed)
+                if summary is None:
+                    pending.append((index, seed))
+                else:
+                    summaries[(index, seed)] = summary
+
+        self.computed_runs = len(pending)
+        if pending:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(run_replication, partial(self.build_scenario, **points[index]), seed, self.end_time, self.packet_types): (index, seed)
+                    for index, seed in pending
+                }
+                for future in as_completed(futures):
+                    index, seed = futures[future]
+                    summaries[(index, seed)] = future.result()
+                    self.store(points[index], seed, summaries[(index, seed)])
+
+        return [
+            (parameters, aggregate_summaries([summaries[(index, seed)] for seed in self.seeds], self.confidence))
+            for index, parameters in enumerate(points)
+        ]
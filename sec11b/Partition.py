@@ -0,0 +1,348 @@
+import io
+import os
+import math
+import random
+import pickle
+import multiprocessing
+from abc import ABC, abstractmethod
+import networkx as nx
+from sec11b.EventQueue import EventHandle
+from sec11b.Link import Link
+
+def partition_topology(graph, num_partitions):
+    """
+    トポロジを num_partitions 個のパーティションに分割し、ノードIDからパーティション番号への辞書を返す。
+    遅延の小さいリンクほど切断しにくくなるよう 1/delay を重みとして、Kernighan-Lin法で再帰的に二分割する。
+    """
+    weighted_graph = nx.Graph()
+    weighted_graph.add_nodes_from(graph.nodes)
+    for u, v, data in graph.edges(data=True):
+        weighted_graph.add_edge(u, v, weight=1.0 / max(data["delay"], 1e-12))
+
+    parts = [set(graph.nodes)]
+    while len(parts) < num_partitions:
+        # 最も大きいパーティションを二分割する
+        largest = max(parts, key=len)
+        if len(largest) < 2:
+            break
+        parts.remove(largest)
+        part_a, part_b = nx.community.kernighan_lin_bisection(weighted_graph.subgraph(largest), weight="weight", seed=1)
+        parts.extend([set(part_a), set(part_b)])
+
+    parts.sort(key=lambda part: min(map(str, part)))
+    return {node_id: index for index, part in enumerate(parts) for node_id in part}
+
+def get_cut_links(links, node_partitions):
+    # パーティション間をまたぐリンクの一覧
+    return [link for link in links if node_partitions[link.node_x.node_id] != node_partitions[link.node_y.node_id]]
+
+# 並列実行後に親プロセスのLinkへ書き戻す属性（両方向で共有する属性と、送信側ノードのパーティションが持つ方向ごとの属性）
+LINK_SHARED_ATTRIBUTES = ("bandwidth", "delay", "loss_rate", "is_active")
+LINK_XY_ATTRIBUTES = ("packet_queue_xy", "current_queue_time_xy", "loss_random_xy")
+LINK_YX_ATTRIBUTES = ("packet_queue_yx", "current_queue_time_yx", "loss_random_yx")
+
+def get_event_nodes(callback, args):
+    """
+    イベントを実行するノード（Node/Router/Switch/Server）のリストを返す。
+    バウンドメソッドは__self__、クロージャは自由変数selfから求める。Linkの送信イベントは送信側ノードに属し、
+    それ以外のLinkのイベント（set_activeなど）はリンクの状態を複製して持つ両端のノードに属する。
+    """
+    owner = getattr(callback, "__self__", None)
+    if owner is None and getattr(callback, "__closure__", None):
+        for name, cell in zip(callback.__code__.co_freevars, callback.__closure__):
+            if name == "self":
+                owner = cell.cell_contents
+    if isinstance(owner, Link):
+        if args and hasattr(args[0], "node_id"):
+            return [args[0]]  # transfer_packet/subtract_from_queue_timeの第1引数は送信元ノード
+        return [owner.node_x, owner.node_y]
+    if owner is None or not hasattr(owner, "node_id"):
+        raise ValueError(f"イベント {callback} を実行するノードを特定できません。")
+    return [owner]
+
+# ワーカーのイベントキーに記録する生成時刻の数（生成元をこの深さまでたどる）
+EVENT_KEY_DEPTH = 16
+# フォーク前に生成されたイベントを生成元とする系譜の値（負の値にして、どの生成時刻よりも前にイベントID順に並べる）
+FORKED_EVENT_ORDER_BASE = -(1 << 62)
+
+class PartitionPickler(pickle.Pickler):
+    """
+    パーティション間で送るメッセージ用のPickler。
+    各プロセスは同じトポロジの複製を持つため、Link・ノード・スケジューラは実体ではなく識別子として送る。
+    """
+    def __init__(self, file, persistent_ids):
+        super().__init__(file)
+        self.persistent_ids = persistent_ids  # id(オブジェクト) -> 識別子
+
+    def persistent_id(self, obj):
+        return self.persistent_ids.get(id(obj))
+
+class PartitionUnpickler(pickle.Unpickler):
+    def __init__(self, file, objects):
+        super().__init__(file)
+        self.objects = objects  # 識別子 -> このプロセスでのオブジェクト
+
+    def persistent_load(self, persistent_id):
+        return self.objects[persistent_id]
+
+class PartitionObjects:
+    """プロセス間で共有するオブジェクト（スケジューラ、Link、ノード）と識別子の対応表"""
+    def __init__(self, network_event_scheduler):
+        self.objects = {"scheduler": network_event_scheduler}
+        for index, link in enumerate(network_event_scheduler.links):
+            self.objects[("link", index)] = link
+            self.objects[("node", link.node_x.node_id)] = link.node_x
+            self.objects[("node", link.node_y.node_id)] = link.node_y
+        self.persistent_ids = {id(obj): persistent_id for persistent_id, obj in self.objects.items()}
+
+    def dumps(self, obj):
+        buffer = io.BytesIO()
+        PartitionPickler(buffer, self.persistent_ids).dump(obj)
+        return buffer.getvalue()
+
+    def loads(self, data):
+        return PartitionUnpickler(io.BytesIO(data), self.objects).load()
+
+class PartitionWorker(ABC):
+    """
+    並列実行エンジンのワーカープロセス内で1つのパーティションを担当する（各エンジンのワーカーの基底クラス）。
+    ワーカーはフォーク時点のトポロジ全体の複製を持つが、担当ノードのイベントだけを実行する。
+    """
+    def __init__(self, network_event_scheduler, index, node_partitions):
+        self.network_event_scheduler = network_event_scheduler
+        self.index = index
+        self.node_partitions = node_partitions
+        self.partition_objects = PartitionObjects(network_event_scheduler)
+        self.current_chain = ()  # 実行中のイベントの生成時刻の系譜
+
+        network_event_scheduler.parallel_engine = None
+        network_event_scheduler.partition = self
+        # フォーク前のログは親プロセスに残っているので、ワーカーは空のログから記録する
+        network_event_scheduler.packet_logs = network_event_scheduler.packet_logs.create_empty()
+        # パケットIDはパーティションごとに剰余の異なる系列から割り当て、他のワーカーやフォーク前のIDと重複させない
+        network_event_scheduler.next_packet_id += index
+        network_event_scheduler.packet_id_step = max(node_partitions.values()) + 1
+
+        # 他のパーティションのイベントを取り除き、残りのイベントIDをイベントキーに置き換える
+        events = network_event_scheduler.events
+        owned_events = []
+        while events:
+            event = events.pop()
+            if not event[4].cancelled and self.owns(event):
+                owned_events.append(event)
+        for event_time, event_id, callback, args, handle in owned_events:
+            handle.event_id = ((), -1, event_id)
+            events.push((event_time, handle.event_id, callback, args, handle))
+        network_event_scheduler.cancelled_events = 0
+
+    def owns(self, event):
+        _, _, callback, args, _ = event
+        return any(not self.is_remote(node) for node in get_event_nodes(callback, args))
+
+    def is_remote(self, node):
+        return self.node_partitions[node.node_id] != self.index
+
+    @abstractmethod
+    def send(self, event_time, event_key, node, packet, link):
+        """別パーティションのノードが受信するパケットを、送信側で割り当てたイベントキーとともに送出する"""
+
+    def get_event_key(self, event_id):
+        """
+        これから生成するイベントのキー（ワーカーでのイベントID）を返す。
+        キーは(生成時刻の系譜, パーティション番号, イベントID)で、系譜は生成時刻と生成元のイベントの系譜をEVENT_KEY_DEPTHまでたどったもの。
+        逐次実行のイベントIDは生成順なので、同時刻のイベントの実行順は生成時刻、生成元のイベントの実行順の順に決まる。
+        系譜はこの順序をパーティションによらず再現するため、受信したパケットも逐次実行と同じ順に実行される
+        （系譜が等しい場合は同じパーティションで生成したイベントどうしならイベントIDの順になる）。
+        """
+        chain = (self.network_event_scheduler.current_tick,) + self.current_chain[:EVENT_KEY_DEPTH - 1]
+        return chain, self.index, event_id
+
+    def next_event_key(self):
+        # 別パーティションに送るイベントのキー（イベントIDを消費して送信側で一意にする）
+        network_event_scheduler = self.network_event_scheduler
+        event_key = self.get_event_key(network_event_scheduler.event_id)
+        network_event_scheduler.event_id += 1
+        return event_key
+
+    def push_event(self, event_time, event_key, callback, args):
+        # 送信側で割り当てたキーのイベントをキューに入れる
+        handle = EventHandle(self.network_event_scheduler, event_time, event_key)
+        self.network_event_scheduler.events.push((event_time, event_key, callback, args, handle))
+        return handle
+
+    def step(self):
+        # 先頭のイベントを1つ実行する（実行中のイベントの系譜を、生成するイベントのキーに使う）
+        network_event_scheduler = self.network_event_scheduler
+        event_time, event_key, callback, args, handle = network_event_scheduler.events.pop()
+        if handle.cancelled:
+            network_event_scheduler.cancelled_events -= 1
+            return
+        handle.fired = True
+        network_event_scheduler.current_tick = event_time
+        network_event_scheduler.current_time = network_event_scheduler.to_seconds(event_time)
+        chain, _, event_id = event_key
+        self.current_chain = chain or (FORKED_EVENT_ORDER_BASE + event_id,)
+        callback(*args)
+
+    def run_until_tick(self, end_time):
+        events = self.network_event_scheduler.events
+        while events and events.peek()[0] <= end_time:
+            self.step()
+
+    def schedule(self, creation_tick, data):
+        # フォーク後に親プロセスでスケジュールされたイベントを受け取る
+        # （逐次実行と同じく、親プロセスの時刻creation_tickまでに生成されたイベントより後、それ以降に生成されるイベントより前に並べる）
+        network_event_scheduler = self.network_event_scheduler
+        for event_time, callback, args in self.partition_objects.loads(data):
+            self.push_event(event_time, ((creation_tick, math.inf), self.index, network_event_scheduler.event_id), callback, args)
+            network_event_scheduler.event_id += 1
+
+    def collect(self):
+        # パケットログと担当部分の状態を返す（収集済みのログは親プロセスに渡したので手元からは消す）
+        packet_logs = self.network_event_scheduler.packet_logs
+        self.network_event_scheduler.packet_logs = packet_logs.create_empty()
+        return packet_logs, self.export_state()
+
+    def export_state(self):
+        # 担当ノードの状態と、担当ノードが送信側になるリンクの方向の状態
+        nodes = {}
+        links = {}
+        for persistent_id, obj in self.partition_objects.objects.items():
+            if persistent_id == "scheduler":
+                continue
+            kind, key = persistent_id
+            if kind == "node" and not self.is_remote(obj):
+                nodes[key] = vars(obj)
+            elif kind == "link":
+                attributes = []
+                if not self.is_remote(obj.node_x):
+                    attributes += LINK_SHARED_ATTRIBUTES + LINK_XY_ATTRIBUTES
+                if not self.is_remote(obj.node_y):
+                    attributes += LINK_SHARED_ATTRIBUTES + LINK_YX_ATTRIBUTES
+                if attributes:
+                    links[key] = {name: getattr(obj, name) for name in attributes}
+        return self.partition_objects.dumps((nodes, links))
+
+    def serve(self, connection):
+        # 親プロセスからのコマンド（メソッド名と引数）を実行して結果を返す
+        while True:
+            command, *arguments = connection.recv()
+            if command == "close":
+                connection.close()
+                return
+            connection.send(getattr(self, command)(*arguments))
+
+def run_partition_worker(create_worker, network_event_scheduler, index, node_partitions, connection, seed):
+    # パーティションごとに乱数系列を分ける
+    random.seed(seed + index)
+    create_worker(network_event_scheduler, index, node_partitions).serve(connection)
+
+class PartitionedEngine(ABC):
+    """
+    トポロジをパーティションに分割し、パーティションごとのワーカープロセスで実行する並列実行エンジンの基底クラス。
+    ワーカーはrun/run_untilの初回呼び出し時にフォークされる。フォーク後に親プロセスでスケジュールしたイベントは
+    次のrun/run_untilの初めにそのイベントを実行するノードのワーカーへ送る（現在時刻より前のイベントはValueError）。
+    各run_untilの終わりに、パケットログは親プロセスのpacket_logsへ集約し、ノードとリンクの状態は親プロセスのオブジェクトに書き戻す。
+    親プロセスでノードやリンクを直接変更してもワーカーには反映されないので、実行の合間の変更はschedule_eventで行う。
+    """
+    def __init__(self, num_partitions=None, partitions=None, seed=0):
+        self.num_partitions = num_partitions or os.cpu_count()
+        self.partitions = partitions  # ノードID -> パーティション番号（Noneの場合は自動分割）
+        self.seed = seed
+        self.workers = []  # (プロセス, コネクション)
+        self.node_partitions = None
+        self.partition_objects = None  # 親プロセスのオブジェクトと識別子の対応表
+
+    @abstractmethod
+    def create_worker(self, network_event_scheduler, index, node_partitions):
+        """ワーカープロセス内でパーティションを担当するPartitionWorkerを作る"""
+
+    def prepare(self, network_event_scheduler, node_partitions):
+        # フォーク前に行うエンジン固有の準備
+        pass
+
+    def start(self, network_event_scheduler):
+        node_partitions = self.partitions or partition_topology(network_event_scheduler.graph, self.num_partitions)
+        self.prepare(network_event_scheduler, node_partitions)
+        self.node_partitions = node_partitions
+        self.partition_objects = PartitionObjects(network_event_scheduler)
+
+        context = multiprocessing.get_context("fork")
+        for index in range(max(node_partitions.values()) + 1):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=run_partition_worker,
+                args=(self.create_worker, network_event_scheduler, index, node_partitions, child_connection, self.seed),
+                daemon=True
+            )
+            process.start()
+            child_connection.close()
+            self.workers.append((process, parent_connection))
+
+        # イベントはワーカーに引き継がれたので親プロセスのキューは空にする
+        network_event_scheduler.events.rebuild(lambda event: False)
+        network_event_scheduler.cancelled_events = 0
+
+    def run(self, network_event_scheduler):
+        self.run_until_tick(network_event_scheduler, math.inf)
+
+    def run_until(self, network_event_scheduler, end_time):
+        self.run_until_tick(network_event_scheduler, network_event_scheduler.to_ticks(end_time))
+
+    def run_until_tick(self, network_event_scheduler, end_time):
+        if not self.workers:
+            self.start(network_event_scheduler)
+        else:
+            self.dispatch_events(network_event_scheduler)
+        self.advance_until_tick(network_event_scheduler, end_time)
+        network_event_scheduler.current_time = network_event_scheduler.to_seconds(network_event_scheduler.current_tick)
+        self.collect(network_event_scheduler)
+
+    @abstractmethod
+    def advance_until_tick(self, network_event_scheduler, end_time):
+        """end_time以下のイベントをすべてのワーカーで実行し、親プロセスのcurrent_tickを進める"""
+
+    def dispatch_events(self, network_event_scheduler):
+        """
+        フォーク後に親プロセスのキューにスケジュールされたイベントを、実行するノードのワーカーに送る。
+        最も早いイベントの時刻（イベントがなければNone）を返す。
+        """
+        events = network_event_scheduler.events
+        outgoing = [[] for _ in self.workers]
+        earliest = None
+        while events:
+            event_time, _, callback, args, handle = events.pop()
+            if handle.cancelled:
+                continue
+            if event_time < network_event_scheduler.current_tick:
+                raise ValueError("並列実行では現在時刻より前のイベントはスケジュールできません。")
+            for index in sorted({self.node_partitions[node.node_id] for node in get_event_nodes(callback, args)}):
+                outgoing[index].append((event_time, callback, args))
+            earliest = event_time if earliest is None else min(earliest, event_time)
+        network_event_scheduler.cancelled_events = 0
+        if earliest is not None:
+            self.broadcast("schedule", [(network_event_scheduler.current_tick, self.partition_objects.dumps(messages)) for messages in outgoing])
+        return earliest
+
+    def broadcast(self, command, arguments_list):
+        # 各ワーカーにコマンドを送り、全ワーカーの結果をパーティション順に返す
+        for (_, connection), arguments in zip(self.workers, arguments_list):
+            connection.send((command, *arguments))
+        return [connection.recv() for _, connection in self.workers]
+
+    def collect(self, network_event_scheduler):
+        # ワーカーのパケットログを集約し、ノードとリンクの状態を親プロセスのオブジェクトに書き戻す
+        for packet_logs, state in self.broadcast("collect", [()] * len(self.workers)):
+            network_event_scheduler.merge_packet_logs(packet_logs)
+            nodes, links = self.partition_objects.loads(state)
+            for node_id, node_state in nodes.items():
+                vars(self.partition_objects.objects[("node", node_id)]).update(node_state)
+            for index, link_state in links.items():
+                vars(self.partition_objects.objects[("link", index)]).update(link_state)
+
+    def close(self):
+        for process, connection in self.workers:
+            connection.send(("close",))
+            connection.close()
+            process.join()
+        self.workers = []
@@ -0,0 +1,119 @@
+FILLER_CHUNK = memoryview(b"X" * 65536)  # VirtualPayloadの中身との比較に使うb"X"の列
+
+def is_filler(data):
+    # dataのバイトがすべてb"X"か（VirtualPayloadの中身と等しいか）をコピーせずに一定サイズずつ調べる
+    view = memoryview(data).cast("B")
+    for start in range(0, len(view), len(FILLER_CHUNK)):
+        chunk = view[start:start + len(FILLER_CHUNK)]
+        if chunk != FILLER_CHUNK[:len(chunk)]:
+            return False
+    return True
+
+class VirtualPayload:
+    """
+    中身を持たず、仮想的なデータストリーム上の位置（offset）と長さ（length）だけを記録するペイロード。
+    トラフィック生成のダミーデータに使い、スライスしても新しいVirtualPayloadを作るだけなので、
+    数GBのTCP転送でもデータのためのメモリはO(1)で済む。bytes()で実体化すると b'X' * length になる。
+    """
+    __slots__ = ("offset", "length")
+
+    def __init__(self, length, offset=0):
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def slice_bounds(self, key):
+        # スライスの開始・終了位置（ステップは1のみ）
+        start, stop, step = key.indices(self.length)
+        if step != 1:
+            raise ValueError("ペイロードのスライスはステップ1のみサポートしています。")
+        return start, max(start, stop)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop = self.slice_bounds(key)
+            return VirtualPayload(stop - start, self.offset + start)
+        if not -self.length <= key < self.length:
+            raise IndexError("ペイロードの範囲外です。")
+        return ord("X")
+
+    def __bytes__(self):
+        return b"X" * self.length
+
+    def __eq__(self, other):
+        # 中身が等しければ等しい（中身はすべてb"X"なので実体化せずに比較する。BytesPayloadとの比較はBytesPayload.__eq__で行う）
+        if type(other) is VirtualPayload:
+            return self.length == other.length
+        if isinstance(other, (bytes, bytearray, memoryview)):
+            return len(other) == self.length and is_filler(other)
+        return NotImplemented
+
+    def __hash__(self):
+        # 中身は長さだけで決まるので長さから計算する（等しいbytesとはハッシュ値が一致しない）
+        return hash((VirtualPayload, self.length))
+
+    def __repr__(self):
+        return f"VirtualPayload(length={self.length}, offset={self.offset})"
+
+class BytesPayload(VirtualPayload):
+    """
+    実データ（bytes）の一部を表すペイロード。元のバイト列を共有したまま範囲（offset, length）だけを持つので、
+    セグメントやフラグメントに分割するたびにデータをコピーしない。中身はview()のmemoryviewで参照する。
+    pickleでは元のバイト列ごと保存されるため、同じデータを共有するペイロードはチェックポイント内でも共有される。
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data, offset=0, length=None):
+        super().__init__(len(data) - offset if length is None else length, offset)
+        self.data = data
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop = self.slice_bounds(key)
+            return BytesPayload(self.data, self.offset + start, stop - start)
+        if not -self.length <= key < self.length:
+            raise IndexError("ペイロードの範囲外です。")
+        return self.data[self.offset + key % self.length]
+
+    def view(self):
+        return memoryview(self.data)[self.offset:self.offset + self.length]
+
+    def __bytes__(self):
+        return self.view().tobytes()
+
+    def __eq__(self, other):
+        # memoryviewで比較し、中身をコピーしない
+        if isinstance(other, BytesPayload):
+            return self.view() == other.view()
+        if isinstance(other, VirtualPayload):
+            return self.length == other.length and is_filler(self.view())
+        if isinstance(other, (bytes, bytearray, memoryview)):
+            return self.view() == other
+        return NotImplemented
+
+    def __hash__(self):
+        # bytesと同じハッシュ値（書き換え可能なバッファのmemoryviewはハッシュできないのでbytesにする）
+        view = self.view()
+        return hash(view if view.readonly else view.tobytes())
+
+    def __repr__(self):
+        return f"BytesPayload({bytes(self)!r})"
+
+def as_payload(data):
+    # 送信するデータをコピーせずに分割できるペイロードに変換する（VirtualPayload/BytesPayloadはそのまま）
+    if isinstance(data, VirtualPayload):
+        return data
+    return BytesPayload(bytes(data) if isinstance(data, (bytearray, memoryview)) else data)
+
+def join_payloads(payloads):
+    """
+    フラグメントのペイロードを順に結合する。連続するVirtualPayloadだけなら実体化せずにVirtualPayloadを返し、
+    それ以外はbytesに結合する。
+    """
+    payloads = list(payloads)
+    if payloads and all(type(payload) is VirtualPayload for payload in payloads):
+        if all(previous.offset + previous.length == payload.offset for previous, payload in zip(payloads, payloads[1:])):
+            return VirtualPayload(sum(payload.length for payload in payloads), payloads[0].offset)
+    return b"".join(payload.view() if isinstance(payload, BytesPayload) else bytes(payload) for payload in payloads)
@@ -0,0 +1,65 @@
+class PrefixTrie:
+    """
+    IPv4プレフィックスの二分トライ。ルータのFIBとして最長一致検索に使う。
+    ノードは[ビット0側の子, ビット1側の子, 値]のリストで、値がNoneでないノードがプレフィックスの終端になる（値にNoneは使えない）。
+    lookupはアドレスの上位ビットから辿り、最後に通った終端の値を返すので、経路数によらずO(プレフィックス長)で検索できる。
+    routesには登録済みのプレフィックス（ネットワークアドレス, プレフィックス長）と値を保持し、replaceで差分だけを更新する。
+    """
+    def __init__(self):
+        self.root = [None, None, None]
+        self.routes = {}  # (整数のネットワークアドレス, プレフィックス長) -> 値
+
+    def __len__(self):
+        return len(self.routes)
+
+    def insert(self, network, prefix_length, value):
+        node = self.root
+        for shift in range(31, 31 - prefix_length, -1):
+            bit = (network >> shift) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, None]
+            node = child
+        node[2] = value
+        self.routes[(network, prefix_length)] = value
+
+    def remove(self, network, prefix_length):
+        if self.routes.pop((network, prefix_length), None) is None:
+            return False
+        path = []
+        node = self.root
+        for shift in range(31, 31 - prefix_length, -1):
+            bit = (network >> shift) & 1
+            path.append((node, bit))
+            node = node[bit]
+        node[2] = None
+        # 子も値もなくなったノードを根に向かって取り除く
+        while path and node[0] is None and node[1] is None and node[2] is None:
+            parent, bit = path.pop()
+            parent[bit] = None
+            node = parent
+        return True
+
+    def replace(self, routes):
+        # 登録内容をroutesに置き換える（変化したプレフィックスだけを挿入・削除し、変化があればTrueを返す）
+        changed = False
+        for prefix in self.routes.keys() - routes.keys():
+            self.remove(*prefix)
+            changed = True
+        for prefix, value in routes.items():
+            if self.routes.get(prefix) != value:
+                self.insert(*prefix, value)
+                changed = True
+        return changed
+
+    def lookup(self, address):
+        # addressに一致する最長のプレフィックスの値（一致するものがなければNone）
+        node = self.root
+        value = node[2]
+        for shift in range(31, -1, -1):
+            node = node[(address >> shift) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                value = node[2]
+        return value
@@ -0,0 +1,64 @@
+import random
+import hashlib
+import numpy as np
+
+class RandomStream:
+    """
+    コンポーネント専用の乱数系列。NumPyの乱数生成器でblock_size個ずつ一様乱数をまとめて生成し、順に払い出す。
+    randomモジュールと同じrandom/uniform/randintのインタフェースを持つ。
+    """
+    def __init__(self, seed_sequence, block_size=1024):
+        self.generator = np.random.Generator(np.random.PCG64(seed_sequence))
+        self.block_size = block_size
+        self.block = []
+        self.index = 0
+
+    def random(self):
+        # [0, 1)の一様乱数
+        if self.index == len(self.block):
+            self.block = self.generator.random(self.block_size).tolist()
+            self.index = 0
+        value = self.block[self.index]
+        self.index += 1
+        return value
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def randint(self, a, b):
+        # a以上b以下の整数
+        return a + int(self.random() * (b - a + 1))
+
+class GlobalRandomStream:
+    """
+    randomモジュールの関数に委譲する系列（シード未指定時に使う）。
+    モジュール自体と違って状態を持たないオブジェクトなので、スケジューラと一緒に保存・復元できる。
+    """
+    def random(self):
+        return random.random()
+
+    def uniform(self, a, b):
+        return random.uniform(a, b)
+
+    def randint(self, a, b):
+        return random.randint(a, b)
+
+class RandomStreams:
+    """
+    マスターシードから名前ごとに独立した乱数系列を導出する。
+    系列のシードは名前のハッシュから決まるため、ノードやリンクを追加しても既存のコンポーネントの乱数列は変わらない（共通乱数法で比較できる）。
+    """
+    def __init__(self, seed, block_size=1024):
+        self.seed = seed
+        self.block_size = block_size
+        self.name_counts = {}  # 名前 -> 同じ名前で生成した系列の数
+
+    def stream(self, name):
+        # 同じ名前の系列を複数要求された場合は連番を付けて区別する
+        count = self.name_counts.get(name, 0)
+        self.name_counts[name] = count + 1
+        if count:
+            name = f"{name}#{count}"
+        digest = hashlib.sha256(name.encode()).digest()
+        spawn_key = tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, 16, 4))
+        return RandomStream(np.random.SeedSequence(self.seed, spawn_key=spawn_key), self.block_size)
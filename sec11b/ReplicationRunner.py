@@ -0,0 +1,112 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from statistics import NormalDist, mean, stdev
+
+def t_quantile(p, degrees_of_freedom):
+    # スチューデントのt分布のp分位点（自由度1, 2は厳密解、3以上はCornish-Fisher展開による近似）
+    if degrees_of_freedom == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if degrees_of_freedom == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    v = degrees_of_freedom
+    return (z + (z**3 + z) / (4 * v)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * v**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * v**3)
+            + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * v**4))
+
+def confidence_interval(values, confidence=0.95):
+    # 平均と信頼区間の半幅を返す（値が1つの場合、半幅はNone）
+    if len(values) < 2:
+        return mean(values), None
+    half_width = t_quantile((1 + confidence) / 2, len(values) - 1) * stdev(values) / math.sqrt(len(values))
+    return mean(values), half_width
+
+def run_replication(build_scenario, seed, end_time, packet_types):
+    """
+    1回分のレプリケーションを実行し、パケットログではなく送信元・宛先ペアごとの集計値だけを返す。
+    返り値は {(パケットタイプ, 送信元IP, 宛先IP): {"sent_packets", "received_packets", "throughput", "delay", "loss_rate", "delay_sketch"}}。
+    """
+    random.seed(seed)
+    network_event_scheduler = build_scenario(seed)
+    if end_time is None:
+        network_event_scheduler.run()
+    else:
+        network_event_scheduler.run_until(end_time)
+
+    summary = {}
+    for packet_type, src_dst_data in network_event_scheduler.summarize_packet_logs(network_event_scheduler.packet_logs).items():
+        if packet_type not in packet_types:
+            continue
+        for (source_ip, destination_ip), data in src_dst_data.items():
+            summary[(packet_type, source_ip, destination_ip)] = {
+                "sent_packets": data["sent_packets"],
+                "received_packets": data["received_packets"],
+                "throughput": data["average_throughput"],
+                "delay": data["average_delay"],
+                "loss_rate": data["lost_packets"] / data["sent_packets"],
+                "delay_sketch": data["delay_sketch"]
+            }
+    return summary
+
+def aggregate_summaries(summaries, confidence=0.95):
+    # run_replicationの結果をキーごとにまとめ、各指標の平均と信頼区間、全レプリケーションを合わせた遅延の分位点を求める
+    samples = {}
+    for summary in summaries:
+        for key, data in summary.items():
+            samples.setdefault(key, []).append(data)
+
+    results = {}
+    for key, runs in sorted(samples.items()):
+        results[key] = {"replications": len(runs)}
+        for metric in ("throughput", "delay", "loss_rate"):
+            results[key][metric] = confidence_interval([run[metric] for run in runs], confidence)
+        delay_sketch = None
+        for run in runs:
+            if "delay_sketch" in run:
+                if delay_sketch is None:
+                    delay_sketch = run["delay_sketch"].copy()
+                else:
+                    delay_sketch.merge(run["delay_sketch"])
+        if delay_sketch is not None:
+            results[key]["delay_quantiles"] = delay_sketch.quantiles((0.5, 0.99, 0.999))
+    return results
+
+class ReplicationRunner:
+    """
+    シナリオを複数のシードで独立に実行（レプリケーション）し、送信元・宛先ペアごとのスループット・遅延・損失率の平均と信頼区間を求める。
+    build_scenario(seed)はログを有効にしたNetworkEventSchedulerにシナリオを構築して返す関数で、
+    プロセスプールに渡すためモジュールのトップレベルで定義する必要がある。
+    シードはグローバルなrandomにも設定されるので、NetworkEventScheduler(seed=seed)と合わせて使うと各レプリケーションを再現できる。
+    """
+    def __init__(self, build_scenario, end_time=None, packet_types=("UDPPacket", "TCPPacket"), confidence=0.95, max_workers=None):
+        self.build_scenario = build_scenario
+        self.end_time = end_time  # 各レプリケーションの終了時刻（秒、Noneの場合はイベントがなくなるまで）
+        self.packet_types = packet_types  # 集計対象のパケットタイプ
+        self.confidence = confidence
+        self.max_workers = max_workers
+
+    def run(self, seeds):
+        """
+        シードごとのレプリケーションをプロセスプールで並列に実行し、
+        {(パケットタイプ, 送信元IP, 宛先IP): {"replications": 回数, "throughput": (平均, 半幅), "delay": ..., "loss_rate": ..., "delay_quantiles": {0.5: p50, 0.99: p99, 0.999: p99.9}}} を返す。
+        """
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            summaries = list(executor.map(run_replication, repeat(self.build_scenario), seeds, repeat(self.end_time), repeat(self.packet_types)))
+        return self.aggregate(summaries)
+
+    def aggregate(self, summaries):
+        return aggregate_summaries(summaries, self.confidence)
+
+    def print_results(self, results):
+        for (packet_type, source_ip, destination_ip), result in results.items():
+            print(f"{packet_type} {source_ip} -> {destination_ip} (replications: {result['replications']}, confidence: {self.confidence})")
+            for metric, unit in (("throughput", "bps"), ("delay", "s"), ("loss_rate", "")):
+                average, half_width = result[metric]
+                interval = f" ± {half_width}" if half_width is not None else ""
+                print(f"  {metric}: {average}{interval} {unit}")
+            if "delay_quantiles" in result:
+                quantiles = result["delay_quantiles"]
+                print(f"  delay p50/p99/p99.9: {quantiles[0.5]} / {quantiles[0.99]} / {quantiles[0.999]} s")
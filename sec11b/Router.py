@@ -1,11 +1,14 @@
 import uuid
-import heapq
-import random
-import ipaddress
-from sec11b.Packet import ARPPacket, BPDU, HelloPacket, LSAPacket
+from collections import OrderedDict
+from sec11b.Packet import ARPPacket, BPDU, HelloPacket, LSAPacket, ControlMessage
+from sec11b.IPAddress import parse_ip, parse_network, parse_prefix, normalize_cidr, ip_to_int, int_to_ip, mask_length_to_int
+from sec11b.PrefixTrie import PrefixTrie
+from sec11b.ShortestPathTree import ShortestPathTree
+
+INTERNAL_NETWORK = parse_network("192.168.0.0/16")  # NATの内部ネットワーク（整数のネットワークアドレス, サブネットマスク）
 
 class Router:
-    def __init__(self, node_id, ip_addresses, network_event_scheduler, hello_interval=10, lsa_interval=10, default_route = None, nat_enabled=False, external_ip=None, nat_table=None):
+    def __init__(self, node_id, ip_addresses, network_event_scheduler, hello_interval=10, lsa_interval=10, default_route = None, nat_enabled=False, external_ip=None, nat_table=None, route_cache_size=1024, spf_initial_delay=None, spf_hold_time=0.2, spf_max_hold_time=5):
         self.network_event_scheduler = network_event_scheduler
         self.node_id = node_id
         self.links = []
@@ -13,23 +16,55 @@ class Router:
         self.interfaces = {}  # インタフェース（リンクとIPアドレスのマッピング）
         self.mac_addresses = {}  # インタフェースとMACアドレスのマッピング
         self.routing_table = {}  # ルーティングテーブル
+        self.fib = PrefixTrie()  # routing_tableから作る最長一致検索のFIB（プレフィックス -> (ネクストホップ, リンク)）
+        self.interface_table = []  # 整数に変換済みのインタフェース情報 (IPアドレス, ネットワークアドレス, サブネットマスク)
+        # 宛先IPごとの転送先のキャッシュ（LRU）。経路やARPテーブルが変わると世代を進めて古いエントリを無効にする
+        self.route_cache = OrderedDict()  # 宛先IP -> (世代, ネクストホップ, リンク, 宛先MAC, 送信元MAC)
+        self.route_cache_size = route_cache_size  # キャッシュする宛先の数の上限（0でキャッシュしない）
+        self.route_generation = 0
         self.arp_table = {}  # IPアドレスとMACアドレスのマッピングを保持するARPテーブル
         self.waiting_for_arp_reply = {}  # 宛先IPアドレスごとの待機パケットリスト
         self.default_route = default_route  # デフォルトルート
         self.neighbors = {}  # 隣接ルータの状態を格納
         self.hello_interval = hello_interval
+        self.hello_event = None  # 次回Hello送信イベントのハンドル
+        self.hello_messages = {}  # インタフェース -> (内容, HelloのControlMessage)
         self.lsa_sequence_number = 0  # LSAシーケンス番号の初期化
         self.lsa_interval = lsa_interval  # LSA送信のインターバル
+        self.lsa_event = None  # 次回LSA送信イベントのハンドル
+        self.lsa_messages = {}  # インタフェース -> (内容, LSAのControlMessage)
         self.lsa_database = {}  # LSA情報を格納
         self.is_topology_initialized = False
         self.topology_database = {}  # トポロジデータベースの初期化
+        # LSAを受け取るたびに変化した部分だけを更新する最短経路木と、宛先ルータ・ネットワークごとの経路
+        self.shortest_path_tree = None  # 最初の経路計算で作る
+        self.topology_order = {}  # ルータ -> トポロジデータベースに登録された順番（同じネットワークの経路は後のルータが優先）
+        self.destination_routes = {}  # 宛先ルータ -> {ネットワーク: 経路}
+        self.network_routes = {}  # ネットワーク -> {そのネットワークにインタフェースを持つ宛先ルータ: 経路}
+        self.first_hop_links = {}  # 最初のホップ -> 経路の計算に使った隣接ルータへのリンク
+        self.interface_routes = {}  # 自身のインタフェースのネットワーク -> 経路
+        # SPF計算の抑制（spf_initial_delayがNoneなら、LSAを受け取るたびにすぐに計算する）
+        if spf_initial_delay is not None and not 0 < spf_hold_time <= spf_max_hold_time:
+            raise ValueError("spf_hold_timeは0より大きく、spf_max_hold_time以下でなければなりません。")
+        self.spf_initial_delay = spf_initial_delay  # 最初のLSAの変化からSPF計算までの待ち時間
+        self.spf_hold_time = spf_hold_time  # 連続するSPF計算の間隔の初期値（計算が続くたびに2倍にする）
+        self.spf_max_hold_time = spf_max_hold_time  # 間隔の上限（この時間SPF計算がなければ間隔を初期値に戻す）
+        self.spf_current_hold_time = spf_hold_time
+        self.spf_event = None  # 予約中のSPF計算イベントのハンドル
+        self.last_spf_tick = None  # 最後にSPF計算を行った時刻（ティック）
+        self.pending_spf_routers = {}  # 次のSPF計算で反映する、LSAが変わったルータ
+        self.spf_request_count = 0  # SPF計算が必要になったLSAの数
+        self.spf_run_count = 0  # 実際に行ったSPF計算の回数
 
         self.nat_enabled = nat_enabled  # NAT機能の有効/無効フラグ
         self.external_ip = external_ip  # 外部ネットワークに対応するIPアドレス（NAT有効時）
         self.nat_table = nat_table or {}  # NAT変換テーブル
+        # Hello/LSAの初回送信ジッタ用の乱数系列
+        self.hello_random = network_event_scheduler.get_random_stream(f"router/{node_id}/hello")
+        self.lsa_random = network_event_scheduler.get_random_stream(f"router/{node_id}/lsa")
 
         label = f'Router {node_id}'
-        self.network_event_scheduler.add_node(node_id, label, ip_addresses=ip_addresses)
+        self.network_event_scheduler.add_node(node_id, label, ip_addresses=ip_addresses, node=self)
         self.schedule_hello_packet()
         self.schedule_lsa()
 
@@ -43,12 +78,24 @@ class Router:
         if link not in self.interfaces:
             self.interfaces[link] = ip_address
             self.mac_addresses[link] = self.generate_mac_address()
+            self.compile_interface_table()
 
         # リンクに割り当てられたIPアドレスがある場合、ルーティングテーブルにルートを追加
         if ip_address:
             # 'Directly connected'としてルートを追加
             self.add_route(ip_address, "Directly connected", link)
 
+    @property
+    def default_route(self):
+        # デフォルトルート（宛先に一致する経路がないときに送信するリンク）
+        return self._default_route
+
+    @default_route.setter
+    def default_route(self, link):
+        # キャッシュ済みの転送先がデフォルトルートのリンクを指している可能性があるので無効にする
+        self._default_route = link
+        self.invalidate_route_cache()
+
     def generate_mac_address(self):
         # ランダムなMACアドレスを生成
         return ':'.join(['{:02x}'.format(uuid.uuid4().int >> elements & 0xff) for elements in range(0, 12, 2)])
@@ -61,7 +108,9 @@ class Router:
 
     def add_to_arp_table(self, ip_address, mac_address):
         # ARPテーブルにIPアドレスとMACアドレスのマッピングを追加
-        self.arp_table[ip_address] = mac_address
+        if self.arp_table.get(ip_address) != mac_address:
+            self.arp_table[ip_address] = mac_address
+            self.invalidate_route_cache()
 
     def get_mac_address_from_ip(self, ip_address):
         # 指定されたIPアドレスに対応するMACアドレスをARPテーブルから取得
@@ -83,66 +132,108 @@ class Router:
 
     def add_route(self, destination_cidr, next_hop, link):
         self.routing_table[destination_cidr] = (next_hop, link)
+        prefix = self.get_route_prefix(destination_cidr)
+        if prefix is not None:
+            self.fib.insert(*prefix, (next_hop, link))
+            self.invalidate_route_cache()
+
+    def compile_interface_table(self):
+        # インタフェースのアドレスを整数に変換しておく
+        self.interface_table = []
+        self.interface_routes = {}
+        for link, interface_cidr in self.interfaces.items():
+            if interface_cidr:
+                address, mask = parse_ip(interface_cidr)
+                self.interface_table.append((address, address & mask, mask))
+                self.interface_routes.setdefault(normalize_cidr(interface_cidr), ("Directly connected", link))
+
+    def get_route_prefix(self, network_cidr):
+        # FIBのキー（整数のネットワークアドレス, プレフィックス長）
+        if '/' not in network_cidr:
+            # CIDR 形式でないエントリに対するエラーハンドリング
+            print(f"Warning: Invalid CIDR format in routing table: {network_cidr}")
+            return None
+        return parse_prefix(network_cidr)
+
+    def update_fib(self):
+        # routing_tableの内容をFIBに反映する（変化した経路だけを更新する。同じプレフィックスの経路は後のものが優先）
+        routes = {}
+        for network_cidr, route_info in self.routing_table.items():
+            prefix = self.get_route_prefix(network_cidr)
+            if prefix is not None:
+                routes[prefix] = route_info
+        if self.fib.replace(routes):
+            self.invalidate_route_cache()
+
+    def invalidate_route_cache(self):
+        # 経路・ARPテーブル・default_routeを変更したら呼ぶ（キャッシュ済みの転送先をすべて無効にする）
+        self.route_generation += 1
+
+    def cache_route(self, destination_ip, next_hop, link):
+        # ユニキャストの転送先を宛先MAC・送信元MACとともにキャッシュする（NATで宛先が書き換わる場合とARP解決待ちは除く）
+        if self.nat_enabled or self.route_cache_size <= 0:
+            return
+        destination_mac = self.arp_table.get(destination_ip)
+        if destination_mac is None:
+            return
+        self.route_cache[destination_ip] = (self.route_generation, next_hop, link, destination_mac, self.get_mac_address(link))
+        self.route_cache.move_to_end(destination_ip)
+        if len(self.route_cache) > self.route_cache_size:
+            self.route_cache.popitem(last=False)
 
     def get_route(self, destination_ip):
         if destination_ip == "224.0.0.5":
             return "multicast", None
 
-        for network_cidr, route_info in self.routing_table.items():
-            if '/' in network_cidr:
-                network_address, mask_length = network_cidr.split('/')
-                subnet_mask = self.cidr_to_subnet_mask(mask_length)
-                if self.matches_subnet(destination_ip, network_address, subnet_mask):
-                    next_hop, link = route_info
-                    return next_hop, link
-            else:
-                # CIDR 形式でないエントリに対するエラーハンドリング
-                print(f"Warning: Invalid CIDR format in routing table: {network_cidr}")
-
-        return None, None
+        # 最長一致検索
+        route_info = self.fib.lookup(parse_ip(destination_ip)[0])
+        if route_info is None:
+            return None, None
+        return route_info
 
     def matches_subnet(self, ip_address, network_address, subnet_mask):
-        ip_addr_only = ip_address.split('/')[0] if '/' in ip_address else ip_address
-        ip_addr_int = self.ip_to_int(ip_addr_only)
-        network_int = self.ip_to_int(network_address)
-        mask_int = self.ip_to_int(subnet_mask)
-
-        network_subnet = network_int & mask_int
-        return ip_addr_int & mask_int == network_subnet
+        mask_int = parse_ip(subnet_mask)[0]
+        return parse_ip(ip_address)[0] & mask_int == parse_ip(network_address)[0] & mask_int
 
     def schedule_hello_packet(self):
         # 最初の Hello パケット送信をスケジュール
-        initial_delay = random.uniform(0, 0.1)
-        self.network_event_scheduler.schedule_event(
-            self.network_event_scheduler.current_time + initial_delay,
+        initial_delay = self.hello_random.uniform(0, 0.1)
+        self.hello_event = self.network_event_scheduler.schedule_event(
+            self.network_event_scheduler.current_tick + self.network_event_scheduler.to_ticks(initial_delay),
             self.send_hello_packet
         )
 
     def schedule_lsa(self):
         # LSA送信のスケジューリング
-        initial_delay = random.uniform(0.3, 0.5)
-        self.network_event_scheduler.schedule_event(
-            self.network_event_scheduler.current_time + initial_delay,
+        initial_delay = self.lsa_random.uniform(0.3, 0.5)
+        self.lsa_event = self.network_event_scheduler.schedule_event(
+            self.network_event_scheduler.current_tick + self.network_event_scheduler.to_ticks(initial_delay),
             self.send_lsa
         )
 
     def send_hello_packet(self):
+        neighbors = list(self.neighbors.keys())  # 隣接ルータのリスト
         for link, interface_cidr in self.interfaces.items():
-            network_address, mask_length = interface_cidr.split('/')
-            hello_packet = HelloPacket(
-                source_mac=self.get_mac_address(link),  # インタフェースのMACアドレス
-                source_ip=network_address,  # インタフェースのIPアドレス
-                network_mask=self.cidr_to_subnet_mask(mask_length),
-                router_id=self.node_id,
-                hello_interval=self.hello_interval,  # 適切なHelloインターバルを設定
-                neighbors=list(self.neighbors.keys()),  # 隣接ルータのリスト
-                network_event_scheduler=self.network_event_scheduler
-            )
-            link.enqueue_packet(hello_packet, self)
+            # 内容が前回と同じなら、作成済みのHelloのヘッダとペイロードを再利用する
+            content = (interface_cidr, self.get_mac_address(link), self.hello_interval, neighbors)
+            cached = self.hello_messages.get(link)
+            if cached is None or cached[0] != content:
+                network_address, mask_length = interface_cidr.split('/')
+                hello_packet = HelloPacket(
+                    source_mac=self.get_mac_address(link),  # インタフェースのMACアドレス
+                    source_ip=network_address,  # インタフェースのIPアドレス
+                    network_mask=self.cidr_to_subnet_mask(mask_length),
+                    router_id=self.node_id,
+                    hello_interval=self.hello_interval,  # 適切なHelloインターバルを設定
+                    neighbors=neighbors,
+                    network_event_scheduler=self.network_event_scheduler
+                )
+                cached = self.hello_messages[link] = (content, ControlMessage(hello_packet))
+            link.enqueue_packet(cached[1].instantiate(self.network_event_scheduler), self)
 
         # 定期的に Hello パケットを送信するためのイベントをスケジュール
-        self.network_event_scheduler.schedule_event(
-            self.network_event_scheduler.current_time + self.hello_interval,
+        self.hello_event = self.network_event_scheduler.schedule_event(
+            self.network_event_scheduler.current_tick + self.network_event_scheduler.to_ticks(self.hello_interval),
             self.send_hello_packet
         )
 
@@ -153,25 +244,46 @@ class Router:
         # リンク状態情報の取得
         link_state_info = self.get_link_state_info()
         
-        # 各インターフェースに対応する隣接ルータへLSAパケットを送信
+        # ペイロード（LSAPacketと同じ形式）は全インタフェースで共有する
+        payload = {
+            "router_id": self.node_id,
+            "sequence_number": seq_number,  # インクリメントしたシーケンス番号
+            "link_state_info": link_state_info  # リンク状態情報
+        }
+
+        # 各インターフェースに対応する隣接ルータへLSAパケットを送信（ヘッダはインタフェースごとに再利用する）
         for link, ip_address in self.interfaces.items():
             source_ip = ip_address
-            lsa_packet = LSAPacket(
-                source_mac=self.get_mac_address(link),  # インタフェースのMACアドレス
-                source_ip=source_ip,  # インタフェースのIPアドレス
-                router_id=self.node_id,
-                sequence_number=seq_number,  # インクリメントしたシーケンス番号
-                link_state_info=link_state_info,  # リンク状態情報
-                network_event_scheduler=self.network_event_scheduler
-            )
-            link.enqueue_packet(lsa_packet, self)
+            content = (source_ip, self.get_mac_address(link))
+            cached = self.lsa_messages.get(link)
+            if cached is None or cached[0] != content:
+                lsa_packet = LSAPacket(
+                    source_mac=self.get_mac_address(link),  # インタフェースのMACアドレス
+                    source_ip=source_ip,  # インタフェースのIPアドレス
+                    router_id=self.node_id,
+                    sequence_number=seq_number,
+                    link_state_info=link_state_info,
+                    network_event_scheduler=self.network_event_scheduler
+                )
+                cached = self.lsa_messages[link] = (content, ControlMessage(lsa_packet))
+            message = cached[1]
+            message.payload = payload
+            link.enqueue_packet(message.instantiate(self.network_event_scheduler), self)
 
         # 次回のLSA送信をスケジュール
-        self.network_event_scheduler.schedule_event(
-            self.network_event_scheduler.current_time + self.lsa_interval,
+        self.lsa_event = self.network_event_scheduler.schedule_event(
+            self.network_event_scheduler.current_tick + self.network_event_scheduler.to_ticks(self.lsa_interval),
             self.send_lsa
         )
 
+    def stop_periodic_messages(self):
+        # 保留中のHello/LSA送信イベントを取り消し、定期送信を停止する
+        for handle in (self.hello_event, self.lsa_event):
+            if handle is not None:
+                handle.cancel()
+        self.hello_event = None
+        self.lsa_event = None
+
     def flood_lsa(self, original_lsa_packet):
         # リンク状態情報の取得
         link_state_info = self.get_link_state_info()
@@ -183,8 +295,9 @@ class Router:
         for link, ip_address in self.interfaces.items():
             # 送信元ルータを除外
             if link.node_x.node_id != original_sender_id and link.node_y.node_id != original_sender_id:
-                lsa_packet = original_lsa_packet
-                lsa_packet.header["source_mac"] = self.get_mac_address(link)
+                # ヘッダの書き換えが他のリンクに送るパケットに影響しないよう、リンクごとに複製する
+                lsa_packet = original_lsa_packet.copy()
+                lsa_packet.header.source_mac = self.get_mac_address(link)
                 link.enqueue_packet(lsa_packet, self)
 
     def increment_lsa_sequence_number(self):
@@ -212,9 +325,9 @@ class Router:
     def on_arp_request_received(self, request_packet, received_link):
         reply_packet = ARPPacket(
             source_mac=self.get_mac_address(received_link),  # 受信インタフェースのMACアドレス
-            destination_mac=request_packet.header["source_mac"],  # ARPリクエスト送信元のMACアドレス
-            source_ip=request_packet.header["destination_ip"],  # ARPリクエストの宛先IP
-            destination_ip=request_packet.header["source_ip"],  # ARPリクエストの送信元IP
+            destination_mac=request_packet.header.source_mac,  # ARPリクエスト送信元のMACアドレス
+            source_ip=request_packet.header.destination_ip,  # ARPリクエストの宛先IP
+            destination_ip=request_packet.header.source_ip,  # ARPリクエストの送信元IP
             operation="reply",  # 操作はリプライ
             network_event_scheduler=self.network_event_scheduler
         )
@@ -223,7 +336,17 @@ class Router:
         received_link.enqueue_packet(reply_packet, self)
 
     def forward_packet(self, packet):
-        destination_ip = packet.header["destination_ip"]
+        destination_ip = packet.header.destination_ip
+        cached = self.route_cache.get(destination_ip)
+        if cached is not None and cached[0] == self.route_generation:
+            # キャッシュ済みの宛先は経路検索とARPテーブルの参照を省略して送信する
+            self.route_cache.move_to_end(destination_ip)
+            _, _, link, destination_mac, source_mac = cached
+            packet.add_mac_header(source_mac, destination_mac)
+            self.network_event_scheduler.log_packet_info(packet, "forwarded", self.node_id)
+            link.enqueue_packet(packet, self)
+            return
+
         next_hop, link = self.get_route(destination_ip)
 
         if destination_ip == "224.0.0.5":
@@ -231,16 +354,18 @@ class Router:
                 self.process_and_enqueue_packet(packet, link)
         elif link:  # unicast
             self.process_and_enqueue_packet(packet, link)
+            self.cache_route(destination_ip, next_hop, link)
         elif self.default_route:  # default route
             self.process_and_enqueue_packet(packet, self.default_route)
+            self.cache_route(destination_ip, next_hop, self.default_route)
         else:
             self.network_event_scheduler.log_packet_info(packet, "dropped", self.node_id)
 
     def process_and_enqueue_packet(self, packet, link):
         # NATが有効な場合に限り処理を行う
         if self.nat_enabled:
-            source_internal = self.is_internal_ip(packet.header["source_ip"])
-            destination_internal = self.is_internal_ip(packet.header["destination_ip"])
+            source_internal = self.is_internal_ip(packet.header.source_ip)
+            destination_internal = self.is_internal_ip(packet.header.destination_ip)
 
             if source_internal and not destination_internal:
                 # 内部ネットワークから外部ネットワークへのパケット（outbound）
@@ -250,8 +375,8 @@ class Router:
                 self.apply_nat(packet, 'inbound')
 
         source_mac = self.get_mac_address(link)
-        destination_ip = packet.header["destination_ip"]
-        destination_mac = self.get_mac_address_from_ip(packet.header["destination_ip"])
+        destination_ip = packet.header.destination_ip
+        destination_mac = self.get_mac_address_from_ip(packet.header.destination_ip)
         # ARPテーブルにエントリがなくdestination_mac == Noneの場合、ARPリクエストを送信
         if destination_mac is None:
             # ARPリクエストを送信し、パケットを待機リストに追加
@@ -265,32 +390,30 @@ class Router:
             link.enqueue_packet(packet, self)
 
     def is_internal_ip(self, ip_address):
-        # CIDRネットワーク表記からIPアドレス部分のみを抽出
-        ip_address = ip_address.split('/')[0]  # CIDR表記を分割し、IPアドレス部分を取得
-        internal_network = ipaddress.ip_network('192.168.0.0/16', strict=False)
-        return ipaddress.ip_address(ip_address) in internal_network
+        network, mask = INTERNAL_NETWORK
+        return parse_ip(ip_address)[0] & mask == network
 
     def apply_nat(self, packet, direction):
         if self.network_event_scheduler.nat_verbose:
-            original_ip = packet.header["source_ip"] if direction == 'outbound' else packet.header["destination_ip"]
-            new_ip = self.external_ip if direction == 'outbound' else self.nat_table.get(packet.header["destination_ip"], "未変換")
+            original_ip = packet.header.source_ip if direction == 'outbound' else packet.header.destination_ip
+            new_ip = self.external_ip if direction == 'outbound' else self.nat_table.get(packet.header.destination_ip, "未変換")
 
             log_message = f"NAT {direction}: {original_ip} -> {new_ip}"
             self.network_event_scheduler.log_packet_info(packet, log_message, self.node_id)
 
         if direction == 'outbound':
             # 外部ネットワークへのパケット送信時のNAT処理
-            original_src_ip = packet.header["source_ip"]
+            original_src_ip = packet.header.source_ip
             # 変換テーブルに登録し、パケットの送信元IPを外部IPに変更
             self.nat_table[original_src_ip] = self.external_ip
-            packet.header["source_ip"] = self.external_ip
+            packet.header.source_ip = self.external_ip
         elif direction == 'inbound':
             # 外部ネットワークからのパケット受信時のNAT処理
-            original_dst_ip = packet.header["destination_ip"]
+            original_dst_ip = packet.header.destination_ip
             # 変換テーブルを参照し、パケットの宛先IPを内部ネットワークのIPに変更
             internal_ip = self.nat_table.get(original_dst_ip)
             if internal_ip:
-                packet.header["destination_ip"] = internal_ip
+                packet.header.destination_ip = internal_ip
 
     def print_nat_table(self):
         if not self.nat_table:
@@ -331,12 +454,15 @@ class Router:
         return network, subnet_mask
 
     def receive_packet(self, packet, received_link):
+        if packet.arrival_time == -1:
+            self.network_event_scheduler.log_packet_info(packet, "lost", self.node_id)  # リンク上で失われたパケット
+            return
         if isinstance(packet, ARPPacket):
             if packet.payload.get("operation") == "request":
                 self.on_arp_request_received(packet, received_link)
                 return  # ARPリクエストの場合、処理を終了
             elif packet.payload.get("operation") == "reply":
-                self.on_arp_reply_received(packet.header["source_ip"], packet.header["source_mac"])
+                self.on_arp_reply_received(packet.header.source_ip, packet.header.source_mac)
                 return  # ARPリプライの場合、処理を終了
         if isinstance(packet, HelloPacket):
             self.receive_hello_packet(packet, received_link)
@@ -349,26 +475,21 @@ class Router:
             return  # BPDUの場合、処理を終了
 
         # 一般のパケットの場合、TTLを減らす
-        packet.header["ttl"] -= 1
+        packet.header.ttl -= 1
 
         # TTLが0以下になったら、パケットを破棄
-        if packet.header["ttl"] <= 0:
+        if packet.header.ttl <= 0:
             self.network_event_scheduler.log_packet_info(packet, "dropped due to TTL expired", self.node_id)
             return
         else:
-            if packet.header["destination_mac"] == self.get_mac_address(received_link):
+            if packet.header.destination_mac == self.get_mac_address(received_link):
                     self.network_event_scheduler.log_packet_info(packet, "received", self.node_id)  # パケット受信をログに記録
                     packet.remove_mac_header()  # MACヘッダを疑似的に除去
-                    destination_ip = packet.header["destination_ip"]
-                    if '/' in destination_ip:
-                        destination_ip, _ = destination_ip.split('/')
-                    for link, interface_cidr in self.interfaces.items():
-                        network_address, mask_length = interface_cidr.split('/')
-                        subnet_mask = self.cidr_to_subnet_mask(mask_length)
-                        if self.matches_subnet(destination_ip, network_address, subnet_mask):
-                            if self.is_final_destination(packet, network_address):
-                                pass
-                            else:
+                    destination = parse_ip(packet.header.destination_ip)[0]
+                    for address, network, mask in self.interface_table:
+                        if destination & mask == network:
+                            # 宛先がこのインタフェース自身でなければ転送する
+                            if destination != address:
                                 self.forward_packet(packet)
                             return
                     self.forward_packet(packet)
@@ -376,10 +497,7 @@ class Router:
                 self.network_event_scheduler.log_packet_info(packet, "dropped due to unmatched MAC address", self.node_id)
  
     def is_final_destination(self, packet, network_address):
-        destination_ip = packet.header["destination_ip"]
-        if '/' in destination_ip:
-            destination_ip, _ = destination_ip.split('/')
-        return destination_ip == network_address
+        return parse_ip(packet.header.destination_ip)[0] == parse_ip(network_address)[0]
 
     def process_packet(self, packet, received_link):
         print(f"Packet {packet.id} processed at router {self.node_id}")
@@ -450,8 +568,8 @@ class Router:
                 if self.network_event_scheduler.routing_verbose:
                     self.print_topology_database(now)
 
-                # ルーティングテーブルの再計算
-                self.update_routing_table_with_dijkstra()
+                # ルーティングテーブルの再計算（LSAが変わったルータの影響を受ける部分だけ）
+                self.request_spf(lsa_packet.payload["router_id"])
 
                 # LSAを隣接ルータに再送信
                 self.flood_lsa(lsa_packet)
@@ -490,83 +608,73 @@ class Router:
                 else:
                     print(f"    不正なデータ型: {info}")
 
-    def calculate_shortest_paths(self, start_router_id):
-        # 最短経路コストの辞書を初期化
-        shortest_paths = {router_id: float('inf') for router_id in self.topology_database}
-        shortest_paths[start_router_id] = 0
-        previous_nodes = {router_id: None for router_id in self.topology_database}
-
-        # プライオリティキューを使用して最小コストのルータを探索
-        queue = [(0, start_router_id)]
-        while queue:
-            current_cost, current_router_id = heapq.heappop(queue)
-
-            # 現在のルータから到達可能なルータに対してコストを更新
-            if current_router_id in self.topology_database:
-                for link, link_info in self.topology_database[current_router_id]['link_state_info'].items():
-                    neighbor_router_id = self.get_neighbor_router_id(link, current_router_id)
-                    if neighbor_router_id and neighbor_router_id in self.topology_database:
-                        new_cost = current_cost + link_info['cost']
-                        if new_cost < shortest_paths[neighbor_router_id]:
-                            shortest_paths[neighbor_router_id] = new_cost
-                            previous_nodes[neighbor_router_id] = current_router_id
-                            heapq.heappush(queue, (new_cost, neighbor_router_id))
-
-        return shortest_paths, previous_nodes
-
-    def find_initial_hop(self, destination, previous_nodes, start_router_id):
-        current_node = destination
-        while current_node is not None:  # Noneでないことを確認
-            if previous_nodes.get(current_node) == start_router_id:  # getメソッドを使用してKeyErrorを避ける
-                return current_node
-            current_node = previous_nodes.get(current_node)  # こちらもgetメソッドを使用
-        
-        # start_router_idに到達できなかった場合、エラーメッセージをログに記録または例外を発生
-        print(f"Error: No valid path from {start_router_id} to {destination} found.")
-        return None  # または適切なエラーハンドリング
-
-    def update_routing_table_with_dijkstra(self):
-        shortest_paths, previous_nodes = self.calculate_shortest_paths(self.node_id)
-
-        temp_routing_table = {}
+    def request_spf(self, router_id):
+        """
+        LSAが変わったルータを記録してSPF計算を行う。spf_initial_delayが設定されていれば計算を予約し、
+        予約中に届いたLSAは同じ計算にまとめる。直前の計算から間もない場合は保持時間が過ぎるまで待ち、
+        計算が続くたびに保持時間を2倍（spf_max_hold_timeまで）にする。
+        """
+        self.pending_spf_routers[router_id] = None
+        self.spf_request_count += 1
+        if self.spf_initial_delay is None:
+            self.run_spf()
+            return
+        if self.spf_event is not None:
+            return
 
-        for destination, _ in shortest_paths.items():
-            if destination != self.node_id:
-                next_hop = self.find_initial_hop(destination, previous_nodes, self.node_id)
-                link_to_next_hop = self.get_link_to_neighbor(next_hop) if next_hop else None
-                if self.network_event_scheduler.routing_verbose:
-                    print(f"From {self.node_id} to {destination}: previous_nodes: {previous_nodes.get(destination)}, next_hop:{next_hop}, link: {link_to_next_hop}")
-                
-                # 宛先ルータの全インターフェースに対するルートを個別に算出
-                for intf_info in self.topology_database[destination]['link_state_info'].values():
-                    destination_cidr = intf_info['ip_address']
-                    network = ipaddress.ip_network(destination_cidr, strict=False)
-                    network_cidr = str(network)
-                    
-                    if link_to_next_hop:
-                        # 直接接続されたネットワークかどうかを確認
-                        directly_connected = any(self.is_same_network(destination_cidr, ip_address) for _, ip_address in self.interfaces.items())
-                        if directly_connected:
-                        #if previous_nodes.get(destination) == self.node_id:
-                            connection_type = "Directly connected"
-                        else:
-                            connection_type = f"{next_hop}" if next_hop else "Unknown"
-
-                        # 一時的なルーティングテーブルにルートを追加
-                        temp_routing_table[network_cidr] = (connection_type, link_to_next_hop)
-
-        # ルータ自身のインターフェースに接続されているネットワークに対するルートを追加
-        for link, interface_cidr in self.interfaces.items():
-            network = ipaddress.ip_network(interface_cidr, strict=False)
-            network_cidr = str(network)
-            # 既存のルートがない場合、またはルートがNoneの場合のみ追加
-            if network_cidr not in temp_routing_table or temp_routing_table[network_cidr][0] is None:
-                temp_routing_table[network_cidr] = ("Directly connected", link)
+        now = self.network_event_scheduler.current_tick
+        spf_tick = now + self.network_event_scheduler.to_ticks(self.spf_initial_delay)
+        if self.last_spf_tick is not None and now - self.last_spf_tick < self.network_event_scheduler.to_ticks(self.spf_max_hold_time):
+            spf_tick = max(spf_tick, self.last_spf_tick + self.network_event_scheduler.to_ticks(self.spf_current_hold_time))
+            self.spf_current_hold_time = min(self.spf_current_hold_time * 2, self.spf_max_hold_time)
+        else:
+            # しばらくSPF計算がなかったので保持時間を初期値に戻す
+            self.spf_current_hold_time = self.spf_hold_time
+        self.spf_event = self.network_event_scheduler.schedule_event(spf_tick, self.run_spf)
+
+    def run_spf(self):
+        # 記録されたルータのLSAの変化をまとめてルーティングテーブルに反映する
+        self.spf_event = None
+        self.last_spf_tick = self.network_event_scheduler.current_tick
+        self.spf_run_count += 1
+        router_ids, self.pending_spf_routers = self.pending_spf_routers, {}
+        self.update_routing_table_with_dijkstra(router_ids)
+
+    def get_spf_statistics(self):
+        # SPF計算が必要になったLSAの数、実際の計算回数、抑制によって省略できた計算の回数
+        pending_runs = 1 if self.spf_event is not None else 0
+        return {
+            "requests": self.spf_request_count,
+            "runs": self.spf_run_count,
+            "saved": self.spf_request_count - self.spf_run_count - pending_runs
+        }
 
-        # 一時的なルーティングテーブルから最終的なルーティングテーブルへの情報転送
-        self.routing_table.clear()
-        for destination_cidr, (connection_type, link) in temp_routing_table.items():
-            self.routing_table[destination_cidr] = (connection_type, link)
+    def update_routing_table_with_dijkstra(self, router_ids=None):
+        """
+        router_idsのルータのLSAが変わったときに、最短経路木のうち影響を受ける部分だけを計算し直し、
+        最初のホップが変わった宛先ルータの経路だけをルーティングテーブルとFIBに反映する。
+        router_idsがNone（または最初の計算）のときは、トポロジデータベース全体から計算し直す。
+        """
+        if router_ids is None or self.shortest_path_tree is None:
+            self.rebuild_routing_table()
+        else:
+            updated = {}
+            for router_id in router_ids:
+                self.topology_order.setdefault(router_id, len(self.topology_order))
+                updated.update(self.shortest_path_tree.update(router_id, self.get_spf_edges(router_id)))
+                # LSAが変わったルータはインタフェースのネットワークが変わっている可能性がある
+                updated[router_id] = None
+            # Helloで隣接ルータへのリンクが変わった場合は、そのルータを最初のホップとする宛先の経路も計算し直す
+            for first_hop, link in list(self.first_hop_links.items()):
+                if self.get_link_to_neighbor(first_hop) != link:
+                    for destination, destination_first_hop in self.shortest_path_tree.first_hops.items():
+                        if destination_first_hop == first_hop:
+                            updated[destination] = None
+            changed_networks = {}
+            for destination in updated:
+                self.update_destination_routes(destination, changed_networks)
+            for network_cidr in changed_networks:
+                self.apply_network_route(network_cidr)
 
         # ルーティングテーブルの内容を出力
         if self.network_event_scheduler.routing_verbose:
@@ -577,6 +685,104 @@ class Router:
                 else:
                     print(f"  Destination: {destination_cidr}, Next hop: {connection_type.replace('via ', '')}, Link: {link}")
 
+    def rebuild_routing_table(self):
+        # 最短経路木とルーティングテーブルをトポロジデータベース全体から作り直す
+        self.topology_order = {router_id: index for index, router_id in enumerate(self.topology_database)}
+        self.shortest_path_tree = ShortestPathTree(self.node_id)
+        self.shortest_path_tree.rebuild({router_id: self.get_spf_edges(router_id) for router_id in self.topology_database})
+        self.destination_routes = {}
+        self.network_routes = {}
+        self.first_hop_links = {}
+        self.routing_table.clear()
+        self.fib = PrefixTrie()
+        self.invalidate_route_cache()
+        changed_networks = {}
+        for destination in self.topology_database:
+            self.update_destination_routes(destination, changed_networks)
+        changed_networks.update(dict.fromkeys(self.interface_routes))
+        for network_cidr in changed_networks:
+            self.apply_network_route(network_cidr)
+
+    def get_spf_edges(self, router_id):
+        # ルータのLSAのリンク情報から、隣接ルータ -> コスト（並行するリンクは最小のコスト）を作る
+        edges = {}
+        for link, link_info in self.topology_database[router_id]['link_state_info'].items():
+            neighbor_router_id = self.get_neighbor_router_id(link, router_id)
+            if neighbor_router_id and neighbor_router_id != router_id:
+                cost = link_info['cost']
+                if cost < edges.get(neighbor_router_id, float('inf')):
+                    edges[neighbor_router_id] = cost
+        return edges
+
+    def update_destination_routes(self, destination, changed_networks):
+        # 宛先ルータの各インタフェースのネットワークへの経路を計算し直し、経路が変わったネットワークをchanged_networksに加える
+        if destination == self.node_id or destination not in self.topology_database:
+            return
+        next_hop = self.shortest_path_tree.first_hops.get(destination)
+        link_to_next_hop = self.get_link_to_neighbor(next_hop) if next_hop else None
+        if next_hop:
+            self.first_hop_links[next_hop] = link_to_next_hop
+        else:
+            print(f"Error: No valid path from {self.node_id} to {destination} found.")
+        if self.network_event_scheduler.routing_verbose:
+            previous_node = self.shortest_path_tree.paths.get(destination, (None, None, None))[2]
+            print(f"From {self.node_id} to {destination}: previous_nodes: {previous_node}, next_hop:{next_hop}, link: {link_to_next_hop}")
+
+        routes = {}
+        if link_to_next_hop:
+            # 宛先ルータの全インターフェースに対するルートを個別に算出
+            for intf_info in self.topology_database[destination]['link_state_info'].values():
+                destination_cidr = intf_info['ip_address']
+                # 直接接続されたネットワークかどうかを確認
+                if self.is_directly_connected(destination_cidr):
+                    connection_type = "Directly connected"
+                else:
+                    connection_type = f"{next_hop}"
+                routes[normalize_cidr(destination_cidr)] = (connection_type, link_to_next_hop)
+
+        old_routes = self.destination_routes.pop(destination, {})
+        for network_cidr, route_info in old_routes.items():
+            if routes.get(network_cidr) != route_info:
+                if network_cidr not in routes:
+                    del self.network_routes[network_cidr][destination]
+                changed_networks[network_cidr] = None
+        for network_cidr, route_info in routes.items():
+            if old_routes.get(network_cidr) != route_info:
+                self.network_routes.setdefault(network_cidr, {})[destination] = route_info
+                changed_networks[network_cidr] = None
+        if routes:
+            self.destination_routes[destination] = routes
+
+    def apply_network_route(self, network_cidr):
+        """
+        ネットワークの経路をルーティングテーブルとFIBに反映する。
+        複数の宛先ルータが同じネットワークを持つ場合はトポロジデータベースに後から登録されたルータの経路を使い、
+        どの宛先ルータからも経路がなければ自身のインタフェースの経路を使う。
+        """
+        destination_routes = self.network_routes.get(network_cidr)
+        if destination_routes:
+            route_info = destination_routes[max(destination_routes, key=self.topology_order.get)]
+        else:
+            route_info = self.interface_routes.get(network_cidr)
+        if self.routing_table.get(network_cidr) == route_info:
+            return
+        if route_info is None:
+            del self.routing_table[network_cidr]
+            self.fib.remove(*parse_prefix(network_cidr))
+        else:
+            self.routing_table[network_cidr] = route_info
+            self.fib.insert(*parse_prefix(network_cidr), route_info)
+        self.invalidate_route_cache()
+
+    def is_directly_connected(self, cidr):
+        # CIDR表記のネットワークが自身のいずれかのインタフェースのネットワークと重なるか
+        network, mask = parse_network(cidr)
+        for _, interface_network, interface_mask in self.interface_table:
+            common_mask = mask & interface_mask
+            if network & common_mask == interface_network & common_mask:
+                return True
+        return False
+
     def get_destination_cidr(self, router_id):
         if router_id in self.topology_database:
             link_info = self.topology_database[router_id]['link_state_info']
@@ -584,12 +790,6 @@ class Router:
                 return info["ip_address"]
         return None
 
-    def is_same_network(self, cidr1, cidr2):
-        # CIDR表記のIPアドレスが同じネットワークに属するか判断
-        net1 = ipaddress.ip_network(cidr1, strict=False)
-        net2 = ipaddress.ip_network(cidr2, strict=False)
-        return net1.overlaps(net2)
-
     def get_neighbor_router_id(self, link, current_router_id):
         if link.node_x.node_id == current_router_id:
             return link.node_y.node_id
@@ -631,8 +831,7 @@ class Router:
             print(f"  宛先IPアドレス: {destination}, {connection_status}{link_description}")
 
     def ip_to_int(self, ip_address):
-        octets = ip_address.split('.')
-        return sum(int(octet) << (8 * i) for i, octet in enumerate(reversed(octets)))
+        return ip_to_int(ip_address)
 
     def subnet_mask_to_int(self, subnet_mask):
         return (0xffffffff >> (32 - int(subnet_mask))) << (32 - int(subnet_mask))
@@ -643,6 +842,4 @@ class Router:
         return mask
 
     def cidr_to_subnet_mask(self, mask_length):
-        mask_length = int(mask_length)
-        mask = (0xffffffff >> (32 - mask_length)) << (32 - mask_length)
-        return f"{(mask >> 24) & 0xff}.{(mask >> 16) & 0xff}.{(mask >> 8) & 0xff}.{mask & 0xff}"
+        return int_to_ip(mask_length_to_int(mask_length))
@@ -29,7 +29,7 @@ class Server:
             return
 
         # 宛先MACアドレスがブロードキャストアドレスまたは自身のMACアドレスの場合の処理
-        if packet.header["destination_mac"] == "FF:FF:FF:FF:FF:FF" or packet.header["destination_mac"] == self.mac_address:
+        if packet.header.destination_mac == "FF:FF:FF:FF:FF:FF" or packet.header.destination_mac == self.mac_address:
             if isinstance(packet, ARPPacket):
                 # ARPパケット処理
                 if packet.payload.get("operation") == "request" and packet.payload["destination_ip"] == self.ip_address:
@@ -40,9 +40,9 @@ class Server:
         # ARPリプライパケットを作成
         arp_reply_packet = ARPPacket(
             source_mac=self.mac_address,  # 送信元MACアドレスは自身のMACアドレス
-            destination_mac=request_packet.header["source_mac"],  # 宛先MACアドレスはARPリクエストの送信元MACアドレス
+            destination_mac=request_packet.header.source_mac,  # 宛先MACアドレスはARPリクエストの送信元MACアドレス
             source_ip=self.ip_address,  # 送信元IPアドレスは自身のIPアドレス
-            destination_ip=request_packet.header["source_ip"],  # 宛先IPアドレスはARPリクエストの送信元IPアドレス
+            destination_ip=request_packet.header.source_ip,  # 宛先IPアドレスはARPリクエストの送信元IPアドレス
             operation="reply",  # 操作は'reply'
             network_event_scheduler=self.network_event_scheduler
         )
@@ -58,7 +58,7 @@ class DNSServer(Server):
         super().__init__(node_id, ip_address, network_event_scheduler, mac_address)
         self.dns_records = {}  # ドメイン名をキーにしてIPアドレスを取得するための辞書
         label = f'DNSServer {node_id}'
-        self.network_event_scheduler.add_node(node_id, label, ip_addresses=[ip_address])
+        self.network_event_scheduler.add_node(node_id, label, ip_addresses=[ip_address], node=self)
 
     def add_dns_record(self, domain_name, ip_address):
         # 新しいDNSレコードを追加するメソッド
@@ -67,8 +67,8 @@ class DNSServer(Server):
     def receive_packet(self, packet, received_link):
         super().receive_packet(packet, received_link)  # Serverクラスの共通処理を利用
 
-        if packet.header["destination_mac"] == "FF:FF:FF:FF:FF:FF" or packet.header["destination_mac"] == self.mac_address:
-            if isinstance(packet, DNSPacket) and packet.header["destination_ip"] == self.ip_address:
+        if packet.header.destination_mac == "FF:FF:FF:FF:FF:FF" or packet.header.destination_mac == self.mac_address:
+            if isinstance(packet, DNSPacket) and packet.header.destination_ip == self.ip_address:
                 self.network_event_scheduler.log_packet_info(packet, "arrived", self.node_id)
                 packet.set_arrived(self.network_event_scheduler.current_time)
 
@@ -91,9 +91,9 @@ class DNSServer(Server):
             # DNSレスポンスパケットを生成して返す
             dns_response_packet = DNSPacket(
                 source_mac=self.mac_address,
-                destination_mac=dns_packet.header["source_mac"],
+                destination_mac=dns_packet.header.source_mac,
                 source_ip=self.ip_address,
-                destination_ip=dns_packet.header["source_ip"],
+                destination_ip=dns_packet.header.source_ip,
                 query_domain=query_domain,
                 query_type="A",  # クエリタイプは"A"（IPv4アドレス）
                 network_event_scheduler=self.network_event_scheduler
@@ -112,7 +112,7 @@ class DHCPServer(Server):
         self.used_ips = set()  # 使用中のIPアドレスを追跡するセット
         self.dns_server_ip = dns_server_ip
         label = f'DHCPServer {node_id}'
-        self.network_event_scheduler.add_node(node_id, label, ip_addresses=[ip_address])
+        self.network_event_scheduler.add_node(node_id, label, ip_addresses=[ip_address], node=self)
 
     def initialize_ip_pool(self, start_cidr):
         network = ip_network(start_cidr, strict=False)
@@ -134,7 +134,7 @@ class DHCPServer(Server):
     def receive_packet(self, packet, received_link):
         super().receive_packet(packet, received_link)  # Serverクラスの共通処理を利用
 
-        if packet.header["destination_mac"] == "FF:FF:FF:FF:FF:FF" and packet.header["destination_ip"] == "255.255.255.255/32":
+        if packet.header.destination_mac == "FF:FF:FF:FF:FF:FF" and packet.header.destination_ip == "255.255.255.255/32":
             if isinstance(packet, DHCPPacket):
                 if packet.message_type == "DISCOVER":
                     self.handle_dhcp_discover(packet)
@@ -163,7 +163,7 @@ class DHCPServer(Server):
         # DHCPOfferPacketの生成（DHCPPacketクラスを使用）
         dhcp_offer_packet = DHCPPacket(
             source_mac=self.mac_address,
-            destination_mac=discover_packet.header["source_mac"],
+            destination_mac=discover_packet.header.source_mac,
             source_ip=self.ip_address,
             destination_ip=offered_ip,
             message_type="OFFER",
@@ -177,7 +177,7 @@ class DHCPServer(Server):
         assigned_ip = request_packet.dhcp_data["requested_ip"]
         dhcp_ack_packet = DHCPPacket(
             source_mac=self.mac_address,
-            destination_mac=request_packet.header["source_mac"],
+            destination_mac=request_packet.header.source_mac,
             source_ip=self.ip_address,
             destination_ip=assigned_ip,
             message_type="ACK",
@@ -0,0 +1,131 @@
+import heapq
+
+class ShortestPathTree:
+    """
+    自ルータ（root）を根とする最短経路木。ルータごとに(コスト, 親のコスト, 親)と最初のホップを保持する。
+    1つのルータのリンク状態が変わったとき（update）は、そのルータのリンクを通る部分木だけを計算し直し、
+    最初のホップは辺を緩和して親が決まったルータの部分木にだけ付け直す。
+    コストが同じ経路は(親のコスト, 親のID)が小さい方を選ぶので、更新の順序によらず、rebuildで全体を計算し直した場合と同じ木になる。
+    トポロジに含まれるのはリンク情報が登録された（LSAを受け取った）ルータだけで、リンクのコストは正の値とする。
+    """
+    def __init__(self, root):
+        self.root = root
+        self.edges = {}  # ルータ -> {隣接ルータ: コスト}
+        self.in_edges = {}  # ルータ -> {そのルータへのリンクを持つルータ: コスト}
+        self.paths = {root: (0, 0, None)}  # 到達可能なルータ -> (コスト, 親のコスト, 親)
+        self.children = {}  # ルータ -> {最短経路木での子: None}（反復順を決めるため集合ではなく辞書を使う）
+        self.first_hops = {}  # 到達可能なルータ（rootを除く） -> 最初のホップ（rootの隣接ルータ）
+
+    def set_edges(self, router_id, edges):
+        for neighbor in self.edges.get(router_id, ()):
+            del self.in_edges[neighbor][router_id]
+        self.edges[router_id] = edges
+        for neighbor, cost in edges.items():
+            self.in_edges.setdefault(neighbor, {})[router_id] = cost
+
+    def rebuild(self, edges_by_router):
+        # すべてのルータのリンクを登録し直して最短経路木を作り、最初のホップが変わったルータを返す
+        self.edges = {}
+        self.in_edges = {}
+        for router_id, edges in edges_by_router.items():
+            self.set_edges(router_id, edges)
+        changed = dict.fromkeys(self.first_hops)
+        self.paths = {self.root: (0, 0, None)}
+        self.children = {}
+        queue = []
+        for neighbor, cost in self.edges.get(self.root, {}).items():
+            self.relax(self.root, neighbor, cost, queue, changed)
+        self.run(queue, changed)
+        return self.update_first_hops(changed)
+
+    def update(self, router_id, edges):
+        """
+        router_idのリンク（隣接ルータ -> コスト）をedgesに置き換え、最初のホップが変わった（到達不能になった場合を含む）ルータを返す。
+        削除されたリンクやコストが増えたリンクが最短経路木の辺なら、その先の部分木を外して残りの木から経路を探し直し、
+        追加されたリンクやコストが減ったリンクはそこから緩和する。
+        """
+        old_edges = self.edges.get(router_id)
+        if old_edges == edges:
+            return {}
+        self.set_edges(router_id, edges)
+        changed = {}
+        queue = []
+        if old_edges is None:
+            # 新しいルータ: そのルータへのリンクを持つ既知のルータから緩和する
+            old_edges = {}
+            self.relax_in_edges(router_id, queue, changed)
+        if router_id in self.paths:
+            detached = {}
+            for child in list(self.children.get(router_id, ())):
+                if edges.get(child, float('inf')) > old_edges[child]:
+                    self.detach(child, detached)
+            changed.update(detached)
+            for detached_router_id in detached:
+                self.relax_in_edges(detached_router_id, queue, changed)
+            for neighbor, cost in edges.items():
+                if cost < old_edges.get(neighbor, float('inf')):
+                    self.relax(router_id, neighbor, cost, queue, changed)
+        self.run(queue, changed)
+        return self.update_first_hops(changed)
+
+    def detach(self, router_id, detached):
+        # router_idを根とする部分木を最短経路木から外す
+        del self.children[self.paths[router_id][2]][router_id]
+        stack = [router_id]
+        while stack:
+            current = stack.pop()
+            detached[current] = None
+            del self.paths[current]
+            stack.extend(self.children.pop(current, ()))
+
+    def relax_in_edges(self, router_id, queue, changed):
+        for neighbor, cost in self.in_edges.get(router_id, {}).items():
+            if neighbor in self.paths:
+                self.relax(neighbor, router_id, cost, queue, changed)
+
+    def relax(self, parent, router_id, cost, queue, changed):
+        if router_id == self.root or router_id not in self.edges:
+            return
+        parent_cost = self.paths[parent][0]
+        path = (parent_cost + cost, parent_cost, parent)
+        current = self.paths.get(router_id)
+        if current is None or path < current:
+            if current is not None:
+                del self.children[current[2]][router_id]
+            self.paths[router_id] = path
+            self.children.setdefault(parent, {})[router_id] = None
+            changed[router_id] = None
+            heapq.heappush(queue, path + (router_id,))
+
+    def run(self, queue, changed):
+        # キューのルータからダイクストラ法で経路を伝える（古いエントリは読み飛ばす）
+        while queue:
+            cost, parent_cost, parent, router_id = heapq.heappop(queue)
+            if self.paths.get(router_id) != (cost, parent_cost, parent):
+                continue
+            for neighbor, link_cost in self.edges[router_id].items():
+                self.relax(router_id, neighbor, link_cost, queue, changed)
+
+    def update_first_hops(self, changed):
+        # 経路が変わったルータから部分木をたどって最初のホップを付け直す（最初のホップが変わらなければその先はたどらない）
+        updated = {}
+        for router_id in changed:
+            if router_id not in self.paths and self.first_hops.pop(router_id, None) is not None:
+                updated[router_id] = None
+        visited = set()
+        # 親を子より先に処理するため、コストの小さい順にたどる
+        for router_id in sorted((router_id for router_id in changed if router_id in self.paths), key=self.paths.get):
+            if router_id in visited:
+                continue
+            stack = [router_id]
+            while stack:
+                current = stack.pop()
+                visited.add(current)
+                parent = self.paths[current][2]
+                first_hop = current if parent == self.root else self.first_hops[parent]
+                if self.first_hops.get(current) == first_hop:
+                    continue
+                self.first_hops[current] = first_hop
+                updated[current] = None
+                stack.extend(self.children.get(current, ()))
+        return updated
@@ -1,4 +1,4 @@
-from sec11b.Packet import BPDU
+from sec11b.Packet import BPDU, ControlMessage
 
 class Switch:
     def __init__(self, node_id, network_event_scheduler, ip_address=None):
@@ -12,8 +12,10 @@ class Switch:
         self.root_path_cost = 0
         self.is_root = True
         self.timeout_delay = 0.5  # BPDU再送信のタイムアウト時間
+        self.timeout_event = None  # 保留中のタイムアウトイベントのハンドル
+        self.bpdu_message = None  # (内容, 全リンクで共有するBPDUのControlMessage)
         label = f'Switch {node_id}'
-        self.network_event_scheduler.add_node(node_id, label)
+        self.network_event_scheduler.add_node(node_id, label, node=self)
 
     def add_link(self, link, ip_address=None):
         if link not in self.links:
@@ -28,21 +30,27 @@ class Switch:
         self.link_states[link] = state
 
     def send_bpdu(self):
-        for link in self.links:
+        # ルートIDとパスコストが変わらない間は、前回と同じBPDUのヘッダとペイロードを全リンクで共有する
+        content = (self.root_id, self.node_id, self.root_path_cost)
+        if self.bpdu_message is None or self.bpdu_message[0] != content:
             bpdu = BPDU(source_mac="00:00:00:00:00:00",
                       destination_mac="FF:FF:FF:FF:FF:FF",
                       root_id=self.root_id,
                       bridge_id=self.node_id,
                       path_cost=self.root_path_cost,
                       network_event_scheduler=self.network_event_scheduler)
-            link.enqueue_packet(bpdu, self)
-        # BPDU送信後にタイムアウト処理をスケジュール
-        self.network_event_scheduler.schedule_event(
-            self.network_event_scheduler.current_time + self.timeout_delay,
-            self.timeout_and_activate_links
-        )
+            self.bpdu_message = (content, ControlMessage(bpdu))
+        for link in self.links:
+            link.enqueue_packet(self.bpdu_message[1].instantiate(self.network_event_scheduler), self)
+        # BPDU送信後にタイムアウト処理をスケジュール（保留中のタイムアウトがあればそれが先に発火するため不要）
+        if self.timeout_event is None and all(state == 'initial' for state in self.link_states.values()):
+            self.timeout_event = self.network_event_scheduler.schedule_event(
+                self.network_event_scheduler.current_tick + self.network_event_scheduler.to_ticks(self.timeout_delay),
+                self.timeout_and_activate_links
+            )
 
     def timeout_and_activate_links(self):
+        self.timeout_event = None
         # 全リンクがまだ初期状態ならアクティブ化
         if all(state == 'initial' for state in self.link_states.values()):
             for link in self.links:
@@ -61,13 +69,13 @@ class Switch:
                 return
             self.network_event_scheduler.log_packet_info(packet, "received", self.node_id)  # パケット受信をログに記録
 
-            source_address = packet.header["source_mac"]
+            source_address = packet.header.source_mac
             self.update_forwarding_table(source_address, received_link)  # フォワーディングテーブルを更新
 
             self.forward_packet(packet, received_link)
 
     def forward_packet(self, packet, received_link):
-        destination_address = packet.header["destination_mac"]
+        destination_address = packet.header.destination_mac
         if destination_address in self.forwarding_table:
             link = self.forwarding_table[destination_address]
             if self.link_states[link] == 'forwarding':
@@ -105,6 +113,11 @@ class Switch:
             self.send_bpdu()
 
     def update_link_states(self, received_link, received_bpdu_path_cost):
+        # リンク状態が決まればタイムアウトは不要になるため取り消す
+        if self.timeout_event is not None:
+            self.timeout_event.cancel()
+            self.timeout_event = None
+
         if self.is_root:
             # ルートブリッジの場合、全てのポートをフォワーディング状態に設定
             for link in self.links:
@@ -0,0 +1,261 @@
+import io
+import math
+import random
+from collections import defaultdict
+from sec11b.Partition import PartitionWorker, PartitionedEngine, PartitionObjects, PartitionPickler, PartitionUnpickler
+
+class TimeWarpPartitionWorker(PartitionWorker):
+    """
+    Time Warp方式で1つのパーティション（論理プロセス）を楽観的に実行するワーカー。
+    一定イベント数ごとに状態を保存し、実行済みの時刻以前のパケット（ストラグラー）やアンチメッセージを受け取ると
+    その時刻より前に保存した状態に戻し、その時刻までのイベントを送信を抑止して再実行（コーストフォワード）する。
+    取り消した区間で送ったパケットにはアンチメッセージを送る。
+    """
+    def __init__(self, network_event_scheduler, index, node_partitions, checkpoint_interval):
+        super().__init__(network_event_scheduler, index, node_partitions)
+        self.checkpoint_interval = checkpoint_interval  # 状態を保存する間隔（実行イベント数）
+        self.processed_events = 0  # これまでに実行したイベント数（取り消し済みイベントは数えない、ロールバックで巻き戻る）
+        self.rolled_back_events = 0  # ロールバックで取り消したイベント数の累計
+        self.coasting = False  # コーストフォワード中は送信済みのパケットを送り直さない
+        self.message_count = 0  # 送信メッセージの通し番号（巻き戻らない）
+        self.message_handles = {}  # 受信メッセージID -> 受信イベントのハンドル
+        self.received_messages = {}  # 受信メッセージID -> (受信順, 時刻, データ)
+        self.received_count = 0
+        self.annihilated_messages = {}  # アンチメッセージで打ち消したメッセージID -> 時刻
+        self.sent_messages = []  # (送信時の実行イベント数, メッセージID, 宛先, 時刻)
+        self.outbox = defaultdict(list)  # 宛先パーティション -> (メッセージID, 時刻, データ)のリスト（データがNoneならアンチメッセージ）
+        self.snapshots = []  # (LVT, 実行イベント数, 受信数, パケットログの記録位置, 保存した状態)
+        network_event_scheduler.packet_logs.enable_undo()
+
+        # 状態の保存ではスケジューラと他パーティションのノードは実体ではなく識別子として扱う
+        self.state_objects = {"scheduler": network_event_scheduler}
+        for link in network_event_scheduler.links:
+            for node in (link.node_x, link.node_y):
+                if self.is_remote(node):
+                    self.state_objects[("node", node.node_id)] = node
+        self.state_ids = {id(obj): persistent_id for persistent_id, obj in self.state_objects.items()}
+        self.save_state(-math.inf)
+
+    def send(self, event_time, event_key, node, packet, link):
+        if self.coasting:
+            return
+        message_id = (self.index, self.message_count)
+        self.message_count += 1
+        destination = self.node_partitions[node.node_id]
+        self.outbox[destination].append((message_id, event_time, self.partition_objects.dumps((event_key, node, packet, link))))
+        self.sent_messages.append((self.processed_events, message_id, destination, event_time))
+
+    def process_next_event(self):
+        # 取り消し済みのイベントは数えない（取り消されるタイミングは再実行時に変わりうるため）
+        if not self.network_event_scheduler.events.peek()[4].cancelled:
+            self.processed_events += 1
+        self.step()
+
+    def save_state(self, lvt):
+        # lvt以下の時刻のイベントをすべて実行し終えた時点の状態を保存する
+        network_event_scheduler = self.network_event_scheduler
+        state = (
+            network_event_scheduler.events,
+            network_event_scheduler.links,
+            self.message_handles,
+            network_event_scheduler.event_id,
+            network_event_scheduler.current_tick,
+            network_event_scheduler.current_time,
+            network_event_scheduler.cancelled_events,
+            network_event_scheduler.next_packet_id,
+            random.getstate()
+        )
+        buffer = io.BytesIO()
+        PartitionPickler(buffer, self.state_ids).dump(state)
+        self.snapshots.append((lvt, self.processed_events, self.received_count, network_event_scheduler.packet_logs.mark(), buffer.getvalue()))
+
+    def restore_state(self, data):
+        network_event_scheduler = self.network_event_scheduler
+        (
+            network_event_scheduler.events,
+            network_event_scheduler.links,
+            self.message_handles,
+            network_event_scheduler.event_id,
+            network_event_scheduler.current_tick,
+            network_event_scheduler.current_time,
+            network_event_scheduler.cancelled_events,
+            network_event_scheduler.next_packet_id,
+            random_state
+        ) = PartitionUnpickler(io.BytesIO(data), self.state_objects).load()
+        random.setstate(random_state)
+        # Link・ノードは復元した新しいオブジェクトに置き換わったので対応表を作り直す
+        self.partition_objects = PartitionObjects(network_event_scheduler)
+
+    def rollback(self, event_time):
+        # event_timeより前に保存した最新の状態に戻す
+        while self.snapshots[-1][0] >= event_time:
+            self.snapshots.pop()
+        _, processed_events, received_count, log_mark, data = self.snapshots[-1]
+        self.restore_state(data)
+        original_processed_events = self.processed_events
+        self.processed_events = processed_events
+
+        # 保存後に打ち消されたメッセージは復元したキューからも取り消す
+        for message_id in [message_id for message_id in self.message_handles if message_id in self.annihilated_messages]:
+            self.message_handles.pop(message_id).cancel()
+
+        # 保存後に記録したパケットログを取り除く（コーストフォワードで同じ内容が記録し直される）
+        self.network_event_scheduler.packet_logs.truncate(log_mark)
+
+        # 保存後に受信したメッセージを受信し直す
+        for message_id, (order, message_time, message_data) in self.received_messages.items():
+            if order >= received_count:
+                self.schedule_message(message_id, message_time, message_data)
+
+        # event_timeより前のイベントを再実行する（乱数とパケットIDも復元済みのため、送信済みのパケットと同じ結果になる）
+        events = self.network_event_scheduler.events
+        self.coasting = True
+        while events and events.peek()[0] < event_time:
+            self.process_next_event()
+        self.coasting = False
+        self.rolled_back_events += original_processed_events - self.processed_events
+
+        # 取り消したイベントで送ったパケットにアンチメッセージを送る
+        while self.sent_messages and self.sent_messages[-1][0] > self.processed_events:
+            _, message_id, destination, message_time = self.sent_messages.pop()
+            self.outbox[destination].append((message_id, message_time, None))
+
+    def schedule(self, creation_tick, data):
+        # 親プロセスから受け取ったイベントがロールバックで失われないよう、スケジュールした後の状態を保存する
+        super().schedule(creation_tick, data)
+        self.save_state(self.network_event_scheduler.current_tick)
+
+    def schedule_message(self, message_id, event_time, data):
+        # 送信側で割り当てたイベントキーで受信イベントをスケジュールし、同時刻のイベントと逐次実行と同じ順に並べる
+        event_key, node, packet, link = self.partition_objects.loads(data)
+        self.message_handles[message_id] = self.push_event(event_time, event_key, node.receive_packet, (packet, link))
+
+    def receive(self, message_id, event_time, data):
+        if data is None:
+            self.annihilate(message_id)
+            return
+        if event_time <= self.network_event_scheduler.current_tick:
+            self.rollback(event_time)  # ストラグラー（同時刻のイベントも受信メッセージとともにキーの順に実行し直す）
+        order = self.received_count
+        self.received_messages[message_id] = (order, event_time, data)
+        self.received_count += 1
+        self.schedule_message(message_id, event_time, data)
+
+    def annihilate(self, message_id):
+        # アンチメッセージと対応するメッセージを打ち消す（実行済みの場合はその時刻の前までロールバックする）
+        self.received_messages.pop(message_id, None)
+        handle = self.message_handles.pop(message_id)
+        self.annihilated_messages[message_id] = handle.event_time
+        if handle.fired:
+            self.rollback(handle.event_time)
+        else:
+            handle.cancel()
+
+    def fossil_collect(self, gvt):
+        # GVTより前の最後の保存状態より古い情報はロールバックで使われないので捨てる
+        keep = 0
+        for index, snapshot in enumerate(self.snapshots):
+            if snapshot[0] < gvt:
+                keep = index
+        del self.snapshots[:keep]
+
+        lvt, processed_events, received_count, log_mark, _ = self.snapshots[0]
+        self.sent_messages = [message for message in self.sent_messages if message[0] > processed_events]
+        self.network_event_scheduler.packet_logs.discard_undo_log(log_mark)
+        self.received_messages = {message_id: message for message_id, message in self.received_messages.items() if message[0] >= received_count}
+        self.message_handles = {message_id: handle for message_id, handle in self.message_handles.items() if handle.pending or handle.event_time >= gvt}
+        # lvt以下の時刻のメッセージは残っている保存状態に未実行のまま含まれることはない
+        self.annihilated_messages = {message_id: message_time for message_id, message_time in self.annihilated_messages.items() if message_time > lvt}
+
+    def advance(self, gvt, end_time, inbox, max_events, optimism_window):
+        self.fossil_collect(gvt)
+        for messages in inbox:
+            for message in messages:
+                self.receive(*message)
+
+        # end_time以下（楽観実行の幅が指定されていればGVT + 幅以下）のイベントを最大max_events個実行する
+        network_event_scheduler = self.network_event_scheduler
+        events = network_event_scheduler.events
+        limit = end_time if optimism_window is None else min(end_time, gvt + optimism_window)
+        for _ in range(max_events):
+            if not events or events.peek()[0] > limit:
+                break
+            if events.peek()[0] > network_event_scheduler.current_tick and self.processed_events - self.snapshots[-1][1] >= self.checkpoint_interval:
+                self.save_state(network_event_scheduler.current_tick)
+            self.process_next_event()
+
+        outgoing = dict(self.outbox)
+        self.outbox.clear()
+        next_event_time = events.peek()[0] if events else None
+        return next_event_time, network_event_scheduler.current_tick, outgoing, self.rolled_back_events
+
+    def collect(self):
+        # 実行済みのイベントはすべて確定しているので、ログを渡した後の状態を保存してそれより古い情報を捨てる
+        collected = super().collect()
+        self.network_event_scheduler.packet_logs.enable_undo()
+        self.save_state(self.network_event_scheduler.current_tick)
+        self.fossil_collect(math.inf)
+        return collected
+
+class TimeWarpEngine(PartitionedEngine):
+    """
+    楽観的並列離散イベントシミュレーション（Time Warp方式）。
+    各パーティションはGVT（全体で最小の未処理時刻）を待たずにイベントを実行し、因果関係の誤りはロールバックで修正する。
+    リンク遅延が小さくルックアヘッドが取れないトポロジでも並列に実行できる。
+    パーティション間のパケットはラウンドごとにまとめて交換し、その際にGVTを計算して古い保存状態を回収する。
+
+    NetworkEventScheduler(parallel_engine=TimeWarpEngine(...))として使う。
+    checkpoint_intervalは状態を保存する間隔（実行イベント数）、events_per_roundは1ラウンドで各ワーカーが実行する最大イベント数、
+    optimism_windowは楽観実行を許すGVTからの時間幅（秒、Noneの場合は無制限）。
+    """
+    def __init__(self, num_partitions=None, partitions=None, seed=0, checkpoint_interval=100, events_per_round=1000, optimism_window=None):
+        super().__init__(num_partitions, partitions, seed)
+        self.checkpoint_interval = checkpoint_interval
+        self.events_per_round = events_per_round
+        self.optimism_window = optimism_window
+        self.inboxes = []  # パーティションごとの未配送メッセージ
+        self.gvt = None
+        self.rounds = 0
+        self.rolled_back_events = 0  # 全ワーカーでロールバックにより取り消したイベント数
+
+    def create_worker(self, network_event_scheduler, index, node_partitions):
+        return TimeWarpPartitionWorker(network_event_scheduler, index, node_partitions, self.checkpoint_interval)
+
+    def start(self, network_event_scheduler):
+        super().start(network_event_scheduler)
+        self.inboxes = [[] for _ in self.workers]
+        self.gvt = network_event_scheduler.current_tick
+
+    def dispatch_events(self, network_event_scheduler):
+        # 親プロセスから送ったイベントの時刻はGVTの計算に含める
+        earliest = super().dispatch_events(network_event_scheduler)
+        if earliest is not None:
+            self.gvt = min(self.gvt, earliest)
+        return earliest
+
+    def advance_until_tick(self, network_event_scheduler, end_time):
+        if self.optimism_window is None:
+            optimism_window = None
+        else:
+            optimism_window = network_event_scheduler.to_ticks(self.optimism_window)
+
+        while True:
+            results = self.broadcast("advance", [(self.gvt, end_time, inbox, self.events_per_round, optimism_window) for inbox in self.inboxes])
+            self.inboxes = [[] for _ in self.workers]
+            self.rounds += 1
+
+            # 未処理イベントと配送中のメッセージ（アンチメッセージを含む）の最小時刻がGVT
+            times = []
+            for next_event_time, _, outgoing, _ in results:
+                if next_event_time is not None:
+                    times.append(next_event_time)
+                for destination, messages in outgoing.items():
+                    self.inboxes[destination].append(messages)
+                    times.extend(message[1] for message in messages)
+            self.gvt = min(times, default=math.inf)
+            if self.gvt > end_time:
+                break
+
+        # end_time以下のイベントはすべて確定した
+        self.rolled_back_events = sum(result[3] for result in results)
+        network_event_scheduler.current_tick = max(network_event_scheduler.current_tick, max(result[1] for result in results))